@@ -1,13 +1,14 @@
 import os
 from typing import List
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
-from app.core.security import get_current_active_user
+from app.core.security import get_current_active_superuser, get_current_active_user
 from app.models.report import FileUploadResponse
 from app.models.user import User
-from app.services.file_service import get_file_path, list_files, save_uploaded_file
+from app.services.download_service import file_download_response
+from app.services.file_service import delete_file, get_file_entry, get_file_path, list_files, save_uploaded_file
 
 router = APIRouter()
 
@@ -15,12 +16,15 @@ router = APIRouter()
 @router.post("/upload/{file_type}", response_model=FileUploadResponse)
 async def upload_file(
     file_type: str,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user)
 ) -> FileUploadResponse:
     """
     Upload a file (input or reference).
     
+    The file is profiled in the background after the response is sent.
+    
     Args:
         file_type: The type of file (input or reference)
         file: The file to upload
@@ -28,56 +32,90 @@ async def upload_file(
     Returns:
         FileUploadResponse: Metadata about the uploaded file
     """
-    return await save_uploaded_file(file, file_type)
+    return await save_uploaded_file(file, file_type, background_tasks)
 
 
 @router.get("/download/{filename}")
 async def download_file(
     filename: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user)
-) -> FileResponse:
+) -> Response:
     """
     Download a file by filename.
     
+    Supports byte ranges (``Range``/``If-Range``), ETag revalidation and,
+    for CSV and JSON files, gzip or zstd encoding.
+    
     Args:
         filename: The name of the file to download
     
     Returns:
-        FileResponse: The file content
+        Response: The file content, or the requested part of it
     """
     file_path = get_file_path(filename)
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type="application/octet-stream"
-    )
+    return await run_in_threadpool(file_download_response, request, file_path, get_file_entry(filename))
+
+
+@router.delete("/{filename}", status_code=204)
+async def delete_file_by_name(
+    filename: str,
+    current_user: User = Depends(get_current_active_superuser)
+) -> None:
+    """
+    Delete an uploaded file or a generated report file.
+    
+    Args:
+        filename: The name of the file to delete
+    """
+    await run_in_threadpool(delete_file, filename)
 
 
 @router.get("/list/{file_type}", response_model=List[dict])
 async def list_files_by_type(
     file_type: str,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_active_user)
 ) -> List[dict]:
     """
-    List all files of a specific type.
+    List files of a specific type, newest first.
+    
+    The total number of files is returned in the X-Total-Count header.
     
     Args:
         file_type: The type of file to list (input, reference, or report)
+        skip: Number of files to skip
+        limit: Maximum number of files to return
     
     Returns:
         List[dict]: A list of file metadata
     """
-    return list_files(file_type)
+    files, total = await run_in_threadpool(list_files, file_type, skip, limit)
+    response.headers["X-Total-Count"] = str(total)
+    return files
 
 
 @router.get("/list", response_model=List[dict])
 async def list_all_files(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_active_user)
 ) -> List[dict]:
     """
-    List all files.
+    List all files, newest first.
+    
+    The total number of files is returned in the X-Total-Count header.
+    
+    Args:
+        skip: Number of files to skip
+        limit: Maximum number of files to return
     
     Returns:
         List[dict]: A list of file metadata
     """
-    return list_files()
+    files, total = await run_in_threadpool(list_files, None, skip, limit)
+    response.headers["X-Total-Count"] = str(total)
+    return files
@@ -1,37 +1,91 @@
 import os
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 
 from app.core.config import settings
 from app.core.security import get_current_active_user
-from app.models.report import ReportGenerationRequest, ReportMetadata, ReportStatus
+from app.models.report import ReportGenerationRequest, ReportListResponse, ReportMetadata, ReportStatus
 from app.models.user import User
-from app.services.report_service import generate_report, get_report_metadata
+from app.services.download_service import file_download_response
+from app.services.file_service import get_file_entry
+from app.services.job_service import QueueClosedError, QueueFullError, report_queue
+from app.services.metadata_service import report_store
+from app.services.report_service import create_report_metadata, find_cached_report, get_report_metadata
 
 router = APIRouter()
 
 
-@router.post("/generate", response_model=ReportMetadata)
+@router.post("/generate", response_model=ReportMetadata, status_code=202)
 async def create_report(
     request: ReportGenerationRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user)
 ) -> ReportMetadata:
     """
-    Generate a new report.
+    Queue a new report for generation.
+    
+    The report is generated by a worker process; poll the report metadata
+    until its status is completed or failed. An identical earlier report is
+    served from the result cache and returned already completed.
     
     Args:
         request: The report generation request
-        background_tasks: FastAPI background tasks
         current_user: The current user
     
     Returns:
-        ReportMetadata: Metadata about the generated report
+        ReportMetadata: Metadata about the pending report
+    """
+    report_metadata = await run_in_threadpool(create_report_metadata, request, current_user.username)
+    
+    cached = await run_in_threadpool(find_cached_report, report_metadata)
+    if cached is not None:
+        await run_in_threadpool(report_store.save, cached)
+        return cached
+    
+    try:
+        return await report_queue.submit(report_metadata)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except QueueClosedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("", response_model=ReportListResponse)
+async def list_reports(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[ReportStatus] = None,
+    created_by: Optional[str] = None,
+    start_after: Optional[datetime] = None,
+    start_before: Optional[datetime] = None,
+    current_user: User = Depends(get_current_active_user)
+) -> ReportListResponse:
+    """
+    List reports, newest first.
+    
+    Args:
+        skip: Number of reports to skip
+        limit: Maximum number of reports to return
+        status: Only return reports with this status
+        created_by: Only return reports created by this user
+        start_after: Only return reports started at or after this time
+        start_before: Only return reports started before this time
+        current_user: The current user
+    
+    Returns:
+        ReportListResponse: The page of reports and the total number of matches
     """
-    report_metadata = generate_report(request, current_user.username)
-    return report_metadata
+    reports, total = report_store.list(
+        skip=skip,
+        limit=limit,
+        status=status,
+        created_by=created_by,
+        start_after=start_after,
+        start_before=start_before
+    )
+    return ReportListResponse(reports=reports, total=total)
 
 
 @router.get("/{report_id}", response_model=ReportMetadata)
@@ -58,17 +112,22 @@ async def get_report(
 @router.get("/{report_id}/download")
 async def download_report(
     report_id: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user)
-) -> FileResponse:
+) -> Response:
     """
     Download a specific report.
     
+    Supports byte ranges (``Range``/``If-Range``) so large reports can be
+    resumed or fetched in parallel parts, ETag revalidation and, for CSV
+    and JSON reports, gzip or zstd encoding.
+    
     Args:
         report_id: The ID of the report
         current_user: The current user
     
     Returns:
-        FileResponse: The report file
+        Response: The report file, or the requested part of it
     """
     report = get_report_metadata(report_id)
     if not report:
@@ -84,8 +143,4 @@ async def download_report(
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Report file not found")
     
-    return FileResponse(
-        path=file_path,
-        filename=report.output_file,
-        media_type="application/octet-stream"
-    )
+    return await run_in_threadpool(file_download_response, request, file_path, get_file_entry(report.output_file))
@@ -1,10 +1,13 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 
 from app.core.security import get_current_active_user
 from app.models.report import TransformationRule, TransformationRuleSet
 from app.models.user import User
+from app.services.expression_service import ExpressionError, validate_expression
+from app.services.file_service import get_file_path, get_latest_file
+from app.services.profile_service import joined_fields, profiled_columns
 from app.services.rule_service import get_rule_set, update_rule_set
 
 router = APIRouter()
@@ -50,6 +53,8 @@ async def update_rules(
     """
     try:
         return update_rule_set(rule_set)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update rules: {str(e)}")
 
@@ -57,25 +62,46 @@ async def update_rules(
 @router.post("/validate", response_model=dict)
 async def validate_rule(
     rule: TransformationRule,
+    input_file: Optional[str] = None,
+    reference_file: Optional[str] = None,
     current_user: User = Depends(get_current_active_user)
 ) -> dict:
     """
     Validate a transformation rule.
     
+    When an input or reference file is named, field references are also
+    checked against the columns of the joined files, taken from their
+    upload profiles. The other file defaults to the latest upload.
+    
     Args:
         rule: The rule to validate
+        input_file: The input file the rule will run on
+        reference_file: The reference file the rule will run on
         current_user: The current user
     
     Returns:
         dict: Validation result
     """
+    fields = None
+    if input_file or reference_file:
+        input_path = get_file_path(input_file) if input_file else get_latest_file("input")
+        reference_path = get_file_path(reference_file) if reference_file else get_latest_file("reference")
+        input_columns = profiled_columns(input_path) if input_path else None
+        reference_columns = profiled_columns(reference_path) if reference_path else None
+        if input_columns is not None and reference_columns is not None:
+            fields = joined_fields(input_columns, reference_columns)
+    
     try:
-        valid_operators = ["+", "-", "*", "/", "max", "min"]
-        valid = any(op in rule.expression for op in valid_operators)
-        
+        expression = validate_expression(rule.expression, fields)
         return {
-            "valid": valid,
-            "message": "Rule is valid" if valid else "Rule expression is not valid"
+            "valid": True,
+            "message": "Rule is valid",
+            "fields": sorted(expression.fields)
+        }
+    except ExpressionError as e:
+        return {
+            "valid": False,
+            "message": f"Rule expression is not valid: {str(e)}"
         }
     except Exception as e:
         return {
@@ -1,13 +1,18 @@
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 
-from app.core.security import get_current_active_user
-from app.models.report import ReportGenerationRequest, Schedule, ScheduleType
+from app.core.security import get_current_active_superuser, get_current_active_user
+from app.models.report import MisfirePolicy, ReportGenerationRequest, Schedule, ScheduleType, UpcomingRun
 from app.models.user import User
 from app.services.schedule_service import (create_schedule, delete_schedule,
-                                          get_schedule, get_schedules,
-                                          update_schedule)
+                                          export_schedules, get_schedule,
+                                          get_schedules, import_schedules,
+                                          update_schedule, upcoming_runs)
+from app.services.scheduler_service import report_scheduler
 
 router = APIRouter()
 
@@ -28,6 +33,72 @@ async def list_schedules(
     return get_schedules()
 
 
+@router.get("/upcoming", response_model=List[UpcomingRun])
+async def list_upcoming_runs(
+    limit: int = Query(100, ge=1, le=10000),
+    until: Optional[datetime] = None,
+    current_user: User = Depends(get_current_active_user)
+) -> List[UpcomingRun]:
+    """
+    List the next runs across all enabled schedules, soonest first.
+    
+    Args:
+        limit: The maximum number of runs to return
+        until: Only return runs due up to this time
+        current_user: The current user
+    
+    Returns:
+        List[UpcomingRun]: The upcoming runs
+    """
+    runs = await run_in_threadpool(upcoming_runs, limit, until)
+    return [
+        UpcomingRun(schedule_id=schedule.id, name=schedule.name, run_at=run_at)
+        for run_at, schedule in runs
+    ]
+
+
+@router.get("/export", response_class=PlainTextResponse)
+async def export_all_schedules(
+    current_user: User = Depends(get_current_active_user)
+) -> PlainTextResponse:
+    """
+    Export all schedules as YAML, in the format of the legacy schedules file.
+    
+    Args:
+        current_user: The current user
+    
+    Returns:
+        PlainTextResponse: The schedules YAML
+    """
+    content = await run_in_threadpool(export_schedules)
+    return PlainTextResponse(content, media_type="application/x-yaml")
+
+
+@router.post("/import", response_model=List[Schedule])
+async def import_all_schedules(
+    request: Request,
+    current_user: User = Depends(get_current_active_superuser)
+) -> List[Schedule]:
+    """
+    Add or replace schedules from a YAML request body in the format of the
+    legacy schedules file.
+    
+    Args:
+        request: The request, whose body is the schedules YAML
+        current_user: The current user
+    
+    Returns:
+        List[Schedule]: The imported schedules
+    """
+    content = (await request.body()).decode("utf-8")
+    try:
+        schedules = await run_in_threadpool(import_schedules, content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid schedules YAML: {str(e)}")
+    await report_scheduler.reload()
+    return schedules
+
+
 @router.get("/{schedule_id}", response_model=Schedule)
 async def get_schedule_by_id(
     schedule_id: str,
@@ -54,7 +125,9 @@ async def create_new_schedule(
     name: str,
     schedule_type: ScheduleType,
     expression: str,
-    report_request: ReportGenerationRequest,
+    report_request: Optional[ReportGenerationRequest] = Body(None),
+    misfire_policy: MisfirePolicy = MisfirePolicy.RUN_ONCE,
+    max_concurrent_runs: int = Query(1, ge=1),
     current_user: User = Depends(get_current_active_user)
 ) -> Schedule:
     """
@@ -64,18 +137,31 @@ async def create_new_schedule(
         name: The name of the schedule
         schedule_type: The type of schedule (cron, interval, or one_time)
         expression: The schedule expression
-        report_request: The report generation request
+        report_request: The report generation request; the latest uploads and rule set if omitted
+        misfire_policy: What to do with runs missed while the service was down;
+            run_all needs max_concurrent_runs of at least 2
+        max_concurrent_runs: How many of the schedule's reports may run at once
         current_user: The current user
     
     Returns:
         Schedule: The created schedule
     """
     try:
-        return create_schedule(name, schedule_type, expression, report_request)
+        schedule = create_schedule(
+            name,
+            schedule_type,
+            expression,
+            report_request or ReportGenerationRequest(),
+            created_by=current_user.username,
+            misfire_policy=misfire_policy,
+            max_concurrent_runs=max_concurrent_runs
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create schedule: {str(e)}")
+    report_scheduler.reschedule(schedule)
+    return schedule
 
 
 @router.put("/{schedule_id}", response_model=Schedule)
@@ -85,7 +171,9 @@ async def update_existing_schedule(
     schedule_type: Optional[ScheduleType] = None,
     expression: Optional[str] = None,
     enabled: Optional[bool] = None,
-    report_request: Optional[ReportGenerationRequest] = None,
+    report_request: Optional[ReportGenerationRequest] = Body(None),
+    misfire_policy: Optional[MisfirePolicy] = None,
+    max_concurrent_runs: Optional[int] = Query(None, ge=1),
     current_user: User = Depends(get_current_active_user)
 ) -> Schedule:
     """
@@ -98,21 +186,30 @@ async def update_existing_schedule(
         expression: The schedule expression
         enabled: Whether the schedule is enabled
         report_request: The report generation request
+        misfire_policy: What to do with runs missed while the service was down;
+            run_all needs max_concurrent_runs of at least 2
+        max_concurrent_runs: How many of the schedule's reports may run at once
         current_user: The current user
     
     Returns:
         Schedule: The updated schedule
     """
-    schedule = update_schedule(
-        schedule_id,
-        name,
-        schedule_type,
-        expression,
-        enabled,
-        report_request
-    )
+    try:
+        schedule = update_schedule(
+            schedule_id,
+            name,
+            schedule_type,
+            expression,
+            enabled,
+            report_request,
+            misfire_policy,
+            max_concurrent_runs
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not schedule:
         raise HTTPException(status_code=404, detail=f"Schedule not found: {schedule_id}")
+    report_scheduler.reschedule(schedule)
     return schedule
 
 
@@ -134,4 +231,5 @@ async def delete_existing_schedule(
     success = delete_schedule(schedule_id)
     if not success:
         raise HTTPException(status_code=404, detail=f"Schedule not found: {schedule_id}")
+    report_scheduler.unschedule(schedule_id)
     return {"message": "Schedule deleted successfully"}
@@ -38,7 +38,60 @@ class Settings(BaseSettings):
     
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./report_generator.db")
     
+    # UPLOADS
+    MAX_UPLOAD_BYTES: int = 5 * 1024 * 1024 * 1024
+    UPLOAD_READ_BYTES: int = 8 * 1024 * 1024
+    
+    # UPLOAD PROFILING (column dtypes, null counts and key cardinalities per upload)
+    PROFILE_UPLOADS: bool = True
+    PROFILE_MAX_DISTINCT_KEYS: int = 1000000
+    
+    # DOWNLOADS (byte ranges are always served; compression is negotiated for CSV and JSON)
+    DOWNLOAD_COMPRESSION: bool = True
+    DOWNLOAD_BLOCK_BYTES: int = 1024 * 1024
+    
     CHUNK_SIZE: int = 100000 
+    DTYPE_SAMPLE_ROWS: int = 1000
+    
+    # PARALLEL CHUNK PROCESSING (workers <= 1 processes chunks serially)
+    PARALLEL_CHUNK_WORKERS: int = 0
+    PARALLEL_MAX_INFLIGHT_CHUNKS: int = 0
+    PARALLEL_MIN_FILE_BYTES: int = 64 * 1024 * 1024
+    
+    # REPORT JOBS
+    REPORT_WORKERS: int = 2
+    REPORT_QUEUE_MAX_DEPTH: int = 100
+    REPORT_SHUTDOWN_TIMEOUT_SECONDS: float = 30.0
+    
+    # SCHEDULER (fires due schedules onto the report queue)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_MAX_CATCH_UP_RUNS: int = 10
+    # Runs due together that read the same input and reference share one pass
+    SCHEDULER_BATCH_SHARED_SCANS: bool = True
+    
+    # MULTI-NODE COORDINATION (replicas or workers sharing one SQLite database)
+    COORDINATION_ENABLED: bool = False
+    # Defaults to "<hostname>-<pid>"
+    NODE_ID: str = ""
+    LEADER_LEASE_SECONDS: float = 30.0
+    COORDINATION_HEARTBEAT_SECONDS: float = 10.0
+    # A job whose node has not heartbeated for this long is re-queued
+    JOB_CLAIM_TIMEOUT_SECONDS: float = 60.0
+    JOB_MAX_ATTEMPTS: int = 3
+    
+    # REFERENCE DATA CACHE
+    REFERENCE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # "stat" keys entries on path, mtime and size; "hash" on a SHA-256 of the content
+    REFERENCE_CACHE_KEY: str = "stat"
+    
+    # REPORT RESULT CACHE (identical requests reuse an earlier output)
+    REPORT_CACHE_ENABLED: bool = True
+    REPORT_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    REPORT_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    
+    # REPORT METADATA
+    METADATA_BATCH_SIZE: int = 50
+    METADATA_FLUSH_INTERVAL_SECONDS: float = 1.0
     
     model_config = SettingsConfigDict(case_sensitive=True)
 
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import threading
+from typing import Set
+
+from app.core.config import settings
+
+_local = threading.local()
+
+
+def get_database_path() -> str:
+    """
+    Resolve the SQLite file path from settings.DATABASE_URL.
+    """
+    url = settings.DATABASE_URL
+    prefix = "sqlite:///"
+    if not url.startswith(prefix):
+        raise ValueError(f"Only sqlite:/// database URLs are supported: {url}")
+    return url[len(prefix):]
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Get the SQLite connection for the current thread.
+
+    Connections are opened in autocommit mode with WAL journaling so readers
+    never block the writer. They are cached per thread and per process, so a
+    forked worker never reuses its parent's connection.
+    """
+    path = get_database_path()
+    key = (os.getpid(), path)
+    if getattr(_local, "key", None) != key:
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        _local.key = key
+        _local.connection = connection
+        _local.schemas = set()
+    return _local.connection
+
+
+def ensure_schema(name: str, ddl: str) -> sqlite3.Connection:
+    """
+    Get the current thread's connection, creating the named schema on first use.
+    """
+    connection = get_connection()
+    schemas: Set[str] = _local.schemas
+    if name not in schemas:
+        connection.executescript(ddl)
+        schemas.add(name)
+    return connection
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -5,13 +7,30 @@ from app.api.routes import api_router
 from app.core.config import settings
 from app.core.security import get_current_active_user
 from app.middleware.logging_middleware import LoggingMiddleware
-from app.middleware.metrics_middleware import MetricsMiddleware
+from app.middleware.metrics_middleware import MetricsMiddleware, metrics_response
+from app.services.cluster_service import cluster_coordinator
+from app.services.job_service import report_queue
+from app.services.scheduler_service import report_scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await report_queue.start()
+    await cluster_coordinator.start()
+    if settings.SCHEDULER_ENABLED:
+        await report_scheduler.start()
+    yield
+    await report_scheduler.shutdown()
+    await report_queue.shutdown(settings.REPORT_SHUTDOWN_TIMEOUT_SECONDS)
+    await cluster_coordinator.shutdown()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="Report Generator Microservice",
     version="1.0.0",
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -31,6 +50,10 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 async def root():
     return {"message": "Welcome to Report Generator API. See /docs for documentation."}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
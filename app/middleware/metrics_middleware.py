@@ -1,8 +1,16 @@
+import os
 import time
 from typing import Callable
 
 from fastapi import Request, Response
-from prometheus_client import Counter, Histogram
+
+# In multiprocess mode every process writes its metrics to files in this
+# directory, which must exist before the first metric is created
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Gauge, Histogram, generate_latest)
 from starlette.middleware.base import BaseHTTPMiddleware
 
 REQUEST_COUNT = Counter(
@@ -28,6 +36,76 @@ REPORT_GENERATION_LATENCY = Histogram(
     "Report Generation Latency"
 )
 
+REFERENCE_CACHE_HITS = Counter(
+    "reference_cache_hits_total",
+    "Reference Data Cache Hits"
+)
+
+REFERENCE_CACHE_MISSES = Counter(
+    "reference_cache_misses_total",
+    "Reference Data Cache Misses"
+)
+
+REFERENCE_CACHE_EVICTIONS = Counter(
+    "reference_cache_evictions_total",
+    "Reference Data Cache Evictions"
+)
+
+REPORT_CACHE_HITS = Counter(
+    "report_cache_hits_total",
+    "Report Result Cache Hits"
+)
+
+REPORT_CACHE_MISSES = Counter(
+    "report_cache_misses_total",
+    "Report Result Cache Misses"
+)
+
+REPORT_CACHE_EVICTIONS = Counter(
+    "report_cache_evictions_total",
+    "Report Result Cache Evictions"
+)
+
+SCHEDULE_RUNS = Counter(
+    "schedule_runs_total",
+    "Scheduled Report Runs",
+    ["outcome"]
+)
+
+SCHEDULER_LEADER = Gauge(
+    "scheduler_leader",
+    "Whether This Node Holds the Scheduler Lease",
+    multiprocess_mode="livesum"
+)
+
+REAPED_JOBS = Counter(
+    "reaped_jobs_total",
+    "Jobs Taken Over From Nodes That Stopped Heartbeating",
+    ["outcome"]
+)
+
+REFERENCE_CACHE_BYTES = Gauge(
+    "reference_cache_bytes",
+    "Reference Data Cache Size In Bytes",
+    multiprocess_mode="livesum"
+)
+
+
+def metrics_response() -> Response:
+    """
+    Render all metrics in the Prometheus text format.
+    
+    Report jobs run in worker processes, so when PROMETHEUS_MULTIPROC_DIR is
+    set the metrics of every process are aggregated from that directory.
+    """
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
 
 class MetricsMiddleware(BaseHTTPMiddleware):
     """
@@ -9,6 +9,8 @@ class FileFormat(str, Enum):
     CSV = "csv"
     EXCEL = "xlsx"
     JSON = "json"
+    PARQUET = "parquet"
+    FEATHER = "feather"
 
 
 class FileUploadResponse(BaseModel):
@@ -17,6 +19,34 @@ class FileUploadResponse(BaseModel):
     file_size: int
     upload_time: datetime
     status: str = "success"
+    sha256: Optional[str] = None
+    row_count_estimate: Optional[int] = None
+
+
+class FileCatalogEntry(BaseModel):
+    filename: str
+    file_type: str
+    file_size: int
+    uploaded_at: datetime
+    sha256: Optional[str] = None
+    # mtime of the file when sha256 was taken, to tell whether it still holds
+    modified_ns: Optional[int] = None
+    row_count: Optional[int] = None
+    columns: Optional[List[str]] = None
+    profiled: bool = False
+
+
+class FileProfile(BaseModel):
+    file_size: int
+    modified_ns: int
+    columns: List[str]
+    dtypes: Dict[str, str]
+    row_count: int
+    null_counts: Dict[str, int]
+    # Distinct values of each join key and of the keys together; None once
+    # there are more than PROFILE_MAX_DISTINCT_KEYS
+    key_cardinality: Dict[str, Optional[int]] = {}
+    profiled_at: datetime = Field(default_factory=datetime.now)
 
 
 class TransformationRule(BaseModel):
@@ -37,6 +67,23 @@ class ScheduleType(str, Enum):
     ONE_TIME = "one_time"
 
 
+class ReportGenerationRequest(BaseModel):
+    input_file: Optional[str] = None 
+    reference_file: Optional[str] = None  
+    output_format: FileFormat = FileFormat.CSV
+    rule_set_id: Optional[str] = None 
+    join_keys: List[str] = Field(default=["refkey1", "refkey2"], min_length=1)
+    reference_unique: bool = False
+    incremental: bool = False
+
+
+class MisfirePolicy(str, Enum):
+    # What to do with runs missed while the service was down or busy
+    RUN_ONCE = "run_once"
+    RUN_ALL = "run_all"
+    SKIP = "skip"
+
+
 class Schedule(BaseModel):
     id: str
     name: str
@@ -47,13 +94,19 @@ class Schedule(BaseModel):
     next_run: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
+    report_request: Optional[ReportGenerationRequest] = None
+    created_by: Optional[str] = None
+    misfire_policy: MisfirePolicy = MisfirePolicy.RUN_ONCE
+    # A run that starts later than this after its due time counts as missed
+    misfire_grace_seconds: int = Field(default=60, ge=0)
+    max_concurrent_runs: int = Field(default=1, ge=1)
+    last_report_id: Optional[str] = None
 
 
-class ReportGenerationRequest(BaseModel):
-    input_file: Optional[str] = None 
-    reference_file: Optional[str] = None  
-    output_format: FileFormat = FileFormat.CSV
-    rule_set_id: Optional[str] = None 
+class UpcomingRun(BaseModel):
+    schedule_id: str
+    name: str
+    run_at: datetime
 
 
 class ReportStatus(str, Enum):
@@ -63,6 +116,33 @@ class ReportStatus(str, Enum):
     FAILED = "failed"
 
 
+class ProjectionStats(BaseModel):
+    input_columns_read: List[str] = []
+    input_columns_skipped: List[str] = []
+    reference_columns_read: List[str] = []
+    reference_columns_skipped: List[str] = []
+    bytes_skipped: int = 0
+
+
+class IncrementalStats(BaseModel):
+    rows_reused: int = 0
+    input_offset: int = 0
+    base_report_id: Optional[str] = None
+    full_rebuild_reason: Optional[str] = None
+
+
+class IncrementalState(BaseModel):
+    report_id: str
+    output_file: str
+    input_offset: int
+    input_rows: int
+    ends_with_newline: bool
+    prefix_hash: str
+    rules_hash: str
+    reference_hash: str
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
 class ReportMetadata(BaseModel):
     id: str
     input_file: str
@@ -77,6 +157,13 @@ class ReportMetadata(BaseModel):
     end_time: Optional[datetime] = None
     processing_time_seconds: Optional[float] = None
     created_by: str
+    join_keys: List[str] = ["refkey1", "refkey2"]
+    reference_unique: bool = False
+    projection: Optional[ProjectionStats] = None
+    incremental: bool = False
+    incremental_stats: Optional[IncrementalStats] = None
+    cache_key: Optional[str] = None
+    cached_from: Optional[str] = None
     
     class Config:
         orm_mode = True
@@ -0,0 +1,137 @@
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.database import ensure_schema, get_database_path
+from app.models.report import FileCatalogEntry
+
+FILE_TYPES = ("input", "reference", "report")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    file_type TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_files_type ON files (file_type, uploaded_at);
+CREATE INDEX IF NOT EXISTS ix_files_uploaded_at ON files (uploaded_at);
+"""
+
+_UPSERT = """
+INSERT INTO files (filename, file_type, uploaded_at, data)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (filename) DO UPDATE SET
+    file_type = excluded.file_type,
+    uploaded_at = excluded.uploaded_at,
+    data = excluded.data
+"""
+
+
+class FileCatalog:
+    """
+    SQLite index of uploaded files and generated reports.
+
+    Entries are added on upload and report completion and removed on
+    delete, so listing files and finding the latest upload are index
+    lookups instead of a directory scan. Files already on disk when the
+    catalog is first used are indexed once per process.
+    """
+
+    def __init__(self):
+        self._backfilled: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+
+    def add(self, entry: FileCatalogEntry) -> None:
+        """Add or replace a catalog entry."""
+        connection = self._connection()
+        connection.execute(_UPSERT, (
+            entry.filename,
+            entry.file_type,
+            entry.uploaded_at.isoformat(),
+            entry.model_dump_json()
+        ))
+
+    def get(self, filename: str) -> Optional[FileCatalogEntry]:
+        """Get the entry for a file name."""
+        row = self._connection().execute("SELECT data FROM files WHERE filename = ?", (filename,)).fetchone()
+        return FileCatalogEntry.model_validate_json(row["data"]) if row else None
+
+    def latest(self, file_type: str) -> Optional[FileCatalogEntry]:
+        """Get the most recently uploaded file of a type."""
+        row = self._connection().execute(
+            "SELECT data FROM files WHERE file_type = ? ORDER BY uploaded_at DESC LIMIT 1",
+            (file_type,)
+        ).fetchone()
+        return FileCatalogEntry.model_validate_json(row["data"]) if row else None
+
+    def list(
+        self,
+        file_type: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> Tuple[List[FileCatalogEntry], int]:
+        """List files, newest first, with the total number of matches."""
+        where, params = ("WHERE file_type = ?", [file_type]) if file_type else ("", [])
+        connection = self._connection()
+        total = connection.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT data FROM files {where} ORDER BY uploaded_at DESC LIMIT ? OFFSET ?",
+            params + [limit, skip]
+        ).fetchall()
+        return [FileCatalogEntry.model_validate_json(row["data"]) for row in rows], total
+
+    def remove(self, filename: str) -> None:
+        """Remove a file's entry."""
+        self._connection().execute("DELETE FROM files WHERE filename = ?", (filename,))
+
+    def _connection(self):
+        connection = ensure_schema("files", _SCHEMA)
+        key = (get_database_path(), os.path.realpath(settings.UPLOAD_DIR), os.path.realpath(settings.REPORTS_DIR))
+        if key not in self._backfilled:
+            with self._lock:
+                if key not in self._backfilled:
+                    self._backfill(connection)
+                    self._backfilled.add(key)
+        return connection
+
+    def _backfill(self, connection) -> None:
+        # Index files written before the catalog existed; entries that are
+        # already there are left alone
+        entries = []
+        for file_type in FILE_TYPES:
+            directory = file_directory(file_type)
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                if not filename.startswith(f"{file_type}_") or filename.endswith(".part"):
+                    continue
+                stat = os.stat(os.path.join(directory, filename))
+                entries.append(FileCatalogEntry(
+                    filename=filename,
+                    file_type=file_type,
+                    file_size=stat.st_size,
+                    uploaded_at=datetime.fromtimestamp(stat.st_mtime)
+                ))
+        connection.executemany(
+            "INSERT OR IGNORE INTO files (filename, file_type, uploaded_at, data) VALUES (?, ?, ?, ?)",
+            [(e.filename, e.file_type, e.uploaded_at.isoformat(), e.model_dump_json()) for e in entries]
+        )
+
+
+file_catalog = FileCatalog()
+
+
+def file_directory(file_type: str) -> str:
+    """Get the directory files of a type are stored in."""
+    return settings.REPORTS_DIR if file_type == "report" else settings.UPLOAD_DIR
+
+
+def file_type_of(filename: str) -> Optional[str]:
+    """Get the file type from a file name's prefix."""
+    for file_type in FILE_TYPES:
+        if filename.startswith(f"{file_type}_"):
+            return file_type
+    return None
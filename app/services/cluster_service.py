@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+import structlog
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.middleware.metrics_middleware import REAPED_JOBS, SCHEDULER_LEADER
+from app.models.report import ReportStatus
+from app.services.coordination_service import SCHEDULER_LEASE, coordination_store, node_id
+from app.services.job_service import QueueClosedError, QueueFullError, ReportJobQueue, report_queue
+from app.services.metadata_service import report_store
+from app.services.scheduler_service import ReportScheduler, report_scheduler
+
+logger = structlog.get_logger()
+
+# Claimed firings are kept this long; a firing is only contested around its due time
+FIRING_RETENTION_SECONDS = 24 * 60 * 60
+
+
+class ClusterCoordinator:
+    """
+    Heartbeat loop that lets several nodes share one SQLite database.
+
+    Every COORDINATION_HEARTBEAT_SECONDS the node tries to take or renew the
+    scheduler lease and renews the claims of the jobs it is running. Only
+    the lease holder runs the scheduler; it also re-queues the jobs of nodes
+    that stopped heartbeating for JOB_CLAIM_TIMEOUT_SECONDS, up to
+    JOB_MAX_ATTEMPTS attempts per job. Does nothing unless
+    COORDINATION_ENABLED is set.
+    """
+
+    def __init__(self, queue: ReportJobQueue, scheduler: ReportScheduler):
+        self.queue = queue
+        self.scheduler = scheduler
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """
+        Take part in leader election. Call before starting the scheduler, so
+        it never fires before this node knows whether it leads.
+        """
+        if not settings.COORDINATION_ENABLED:
+            return
+        await self.scheduler.set_leader(False)
+        await self.heartbeat()
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """Stop heartbeating and hand the lease over; call after the queue has drained."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.scheduler.set_leader(False)
+        SCHEDULER_LEADER.set(0)
+        await run_in_threadpool(coordination_store.release_lease, SCHEDULER_LEASE, node_id())
+
+    async def heartbeat(self) -> None:
+        """Renew the lease and job claims, and reap stale jobs when leading."""
+        node = node_id()
+        leader = await run_in_threadpool(
+            coordination_store.acquire_lease, SCHEDULER_LEASE, node, settings.LEADER_LEASE_SECONDS
+        )
+        await run_in_threadpool(coordination_store.heartbeat_jobs, node)
+        if leader != self.scheduler.leader:
+            logger.info("scheduler_leadership_changed", node=node, leader=leader)
+        SCHEDULER_LEADER.set(1 if leader else 0)
+        await self.scheduler.set_leader(leader)
+        if leader:
+            await self.reap(node)
+            await run_in_threadpool(coordination_store.prune_firings, FIRING_RETENTION_SECONDS)
+
+    async def reap(self, node: str) -> None:
+        """Take over the jobs of nodes that stopped heartbeating."""
+        stale = await run_in_threadpool(coordination_store.stale_jobs, settings.JOB_CLAIM_TIMEOUT_SECONDS)
+        for report_id, owner, heartbeat_at in stale:
+            taken = await run_in_threadpool(coordination_store.take_over_job, report_id, owner, heartbeat_at, node)
+            if taken is None:
+                continue
+            report_metadata, attempts = taken
+
+            stored = await run_in_threadpool(report_store.get, report_id)
+            if stored is not None and stored.status in (ReportStatus.COMPLETED, ReportStatus.FAILED):
+                # Finished, but the node died before dropping the claim
+                await run_in_threadpool(coordination_store.release_job, report_id)
+                continue
+
+            if attempts > settings.JOB_MAX_ATTEMPTS:
+                report_metadata.status = ReportStatus.FAILED
+                report_metadata.end_time = datetime.now()
+                report_metadata.error_message = f"Report job abandoned after {attempts - 1} attempts"
+                await run_in_threadpool(report_store.save, report_metadata)
+                await run_in_threadpool(coordination_store.release_job, report_id)
+                REAPED_JOBS.labels(outcome="failed").inc()
+                logger.warning("report_job_abandoned", report_id=report_id, node=owner, attempts=attempts - 1)
+                continue
+
+            try:
+                await self.queue.submit(report_metadata)
+            except (QueueFullError, QueueClosedError) as e:
+                # Leave it for the next heartbeat
+                await run_in_threadpool(coordination_store.expire_job, report_id)
+                logger.warning("report_job_requeue_failed", report_id=report_id, error=str(e))
+                continue
+            REAPED_JOBS.labels(outcome="requeued").inc()
+            logger.info("report_job_requeued", report_id=report_id, node=owner, attempt=attempts)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.COORDINATION_HEARTBEAT_SECONDS)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                # Without a renewed lease this node can no longer be sure it leads
+                logger.error("coordination_heartbeat_failed", error=str(e))
+                SCHEDULER_LEADER.set(0)
+                await self.scheduler.set_leader(False)
+
+
+cluster_coordinator = ClusterCoordinator(report_queue, report_scheduler)
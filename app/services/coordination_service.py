@@ -0,0 +1,190 @@
+import os
+import socket
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import ensure_schema
+from app.models.report import ReportMetadata
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedule_firings (
+    schedule_id TEXT NOT NULL,
+    due TEXT NOT NULL,
+    node TEXT NOT NULL,
+    fired_at REAL NOT NULL,
+    PRIMARY KEY (schedule_id, due)
+);
+CREATE INDEX IF NOT EXISTS ix_schedule_firings_fired_at ON schedule_firings (fired_at);
+CREATE TABLE IF NOT EXISTS job_claims (
+    report_id TEXT PRIMARY KEY,
+    node TEXT NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_job_claims_node ON job_claims (node);
+CREATE INDEX IF NOT EXISTS ix_job_claims_heartbeat ON job_claims (heartbeat_at);
+"""
+
+# The lease whose holder runs the scheduler and reaps stale jobs
+SCHEDULER_LEASE = "scheduler"
+
+
+def node_id() -> str:
+    """
+    Get the name this process uses in leases and claims.
+
+    Worked out on each call rather than at import, so forked workers do not
+    share their parent's name.
+    """
+    return settings.NODE_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class CoordinationStore:
+    """
+    Shared state that lets several processes or replicas using the same
+    SQLite database work as one service.
+
+    - Leases: a named lease belongs to one holder until it expires; the
+      holder renews it to keep it.
+    - Schedule firings: each (schedule, due time) can be claimed once, so a
+      firing is dispatched by a single node even while leadership moves. A
+      claim that is not followed by the run being recorded expires, so a
+      node dying mid-firing does not stop the schedule.
+    - Job claims: every queued report is claimed by the node that runs it,
+      which heartbeats its claims. Claims that stop heartbeating belong to a
+      node that died and can be taken over.
+
+    Times are wall-clock seconds, so all nodes must share a clock (one
+    machine, or NTP-synchronised hosts).
+    """
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """Take or renew a lease; returns whether ``holder`` now has it."""
+        now = time.time()
+        cursor = self._connection().execute(
+            """
+            INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+            """,
+            (name, holder, now + ttl, now)
+        )
+        return cursor.rowcount > 0
+
+    def release_lease(self, name: str, holder: str) -> None:
+        """Give up a lease, if ``holder`` has it."""
+        self._connection().execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def lease_holder(self, name: str) -> Optional[str]:
+        """Get the current holder of a lease, or None if it is free."""
+        row = self._connection().execute(
+            "SELECT holder FROM leases WHERE name = ? AND expires_at > ?", (name, time.time())
+        ).fetchone()
+        return row["holder"] if row else None
+
+    def claim_firing(self, schedule_id: str, due: datetime, node: str, ttl: float) -> bool:
+        """
+        Claim a schedule's firing at ``due``; returns False if another node
+        claimed it less than ``ttl`` seconds ago. An older claim belongs to a
+        node that died before recording the run, and is taken over.
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            """
+            INSERT INTO schedule_firings (schedule_id, due, node, fired_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (schedule_id, due) DO UPDATE SET node = excluded.node, fired_at = excluded.fired_at
+            WHERE schedule_firings.fired_at <= ?
+            """,
+            (schedule_id, due.isoformat(), node, now, now - ttl)
+        )
+        return cursor.rowcount > 0
+
+    def prune_firings(self, older_than: float) -> int:
+        """Forget firings claimed more than ``older_than`` seconds ago."""
+        return self._connection().execute(
+            "DELETE FROM schedule_firings WHERE fired_at < ?", (time.time() - older_than,)
+        ).rowcount
+
+    def claim_job(self, report_metadata: ReportMetadata, node: str) -> None:
+        """Record that ``node`` is running a report job, keeping its attempt count."""
+        self._connection().execute(
+            """
+            INSERT INTO job_claims (report_id, node, heartbeat_at, attempts, data) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (report_id) DO UPDATE SET
+                node = excluded.node,
+                heartbeat_at = excluded.heartbeat_at,
+                data = excluded.data
+            """,
+            (report_metadata.id, node, time.time(), report_metadata.model_dump_json())
+        )
+
+    def release_job(self, report_id: str) -> None:
+        """Drop the claim of a job that has finished."""
+        self._connection().execute("DELETE FROM job_claims WHERE report_id = ?", (report_id,))
+
+    def expire_job(self, report_id: str) -> None:
+        """Make a claim stale at once, so the next reaper pass retries it."""
+        self._connection().execute("UPDATE job_claims SET heartbeat_at = 0 WHERE report_id = ?", (report_id,))
+
+    def heartbeat_jobs(self, node: str) -> int:
+        """Renew all of a node's job claims; returns how many it has."""
+        return self._connection().execute(
+            "UPDATE job_claims SET heartbeat_at = ? WHERE node = ?", (time.time(), node)
+        ).rowcount
+
+    def stale_jobs(self, timeout: float) -> List[Tuple[str, str, float]]:
+        """Get (report ID, node, heartbeat) of the claims not renewed for ``timeout`` seconds."""
+        rows = self._connection().execute(
+            "SELECT report_id, node, heartbeat_at FROM job_claims WHERE heartbeat_at < ? ORDER BY heartbeat_at",
+            (time.time() - timeout,)
+        ).fetchall()
+        return [(row["report_id"], row["node"], row["heartbeat_at"]) for row in rows]
+
+    def take_over_job(
+        self,
+        report_id: str,
+        node: str,
+        heartbeat_at: float,
+        new_node: str
+    ) -> Optional[Tuple[ReportMetadata, int]]:
+        """
+        Move a stale claim to ``new_node`` and count the attempt.
+
+        The claim only moves if it still has the node and heartbeat it was
+        seen with, so two reapers never both take the same job. Returns the
+        job's report and attempt count, or None if the claim moved on.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            moved = connection.execute(
+                """
+                UPDATE job_claims SET node = ?, heartbeat_at = ?, attempts = attempts + 1
+                WHERE report_id = ? AND node = ? AND heartbeat_at = ?
+                """,
+                (new_node, time.time(), report_id, node, heartbeat_at)
+            ).rowcount
+            row = connection.execute(
+                "SELECT attempts, data FROM job_claims WHERE report_id = ?", (report_id,)
+            ).fetchone() if moved else None
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return ReportMetadata.model_validate_json(row["data"]), row["attempts"]
+
+    def _connection(self):
+        return ensure_schema("coordination", _SCHEMA)
+
+
+coordination_store = CoordinationStore()
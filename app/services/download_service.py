@@ -0,0 +1,235 @@
+import os
+import zlib
+from email.utils import formatdate
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.core.config import settings
+from app.models.report import FileCatalogEntry, FileFormat
+from app.services.catalog_service import file_catalog
+from app.services.file_service import compute_file_hash
+
+MEDIA_TYPES: Dict[str, str] = {
+    FileFormat.CSV.value: "text/csv",
+    FileFormat.EXCEL.value: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    FileFormat.JSON.value: "application/json",
+    FileFormat.PARQUET.value: "application/vnd.apache.parquet",
+    FileFormat.FEATHER.value: "application/vnd.apache.arrow.file",
+    "jsonl": "application/x-ndjson",
+    "ndjson": "application/x-ndjson",
+    "gz": "application/gzip",
+    "bz2": "application/x-bzip2",
+    "zst": "application/zstd",
+    "xz": "application/x-xz",
+}
+
+# Text formats that are worth compressing on the way out
+COMPRESSIBLE_EXTENSIONS = (FileFormat.CSV.value, FileFormat.JSON.value, "jsonl", "ndjson")
+
+
+def media_type_for(filename: str) -> str:
+    """Get the content type of a file from its extension."""
+    extension = os.path.splitext(filename)[1].lstrip(".").lower()
+    return MEDIA_TYPES.get(extension, "application/octet-stream")
+
+
+def file_download_response(request: Request, file_path: str, entry: FileCatalogEntry) -> Response:
+    """
+    Build the response for downloading a stored file.
+
+    The ETag is the file's SHA-256, as recorded in the catalog when the file
+    was uploaded or written (or computed on first download). A single ``Range`` (optionally guarded by ``If-Range``) is
+    answered with 206 Partial Content, so interrupted downloads can resume
+    and parallel downloaders can split the file. Whole CSV and JSON files
+    are compressed on the fly when the client accepts gzip or zstd.
+    """
+    stat = os.stat(file_path)
+    content_hash = _content_hash(entry, file_path, stat)
+    etag = f'"{content_hash}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    media_type = media_type_for(entry.filename)
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Accept-Ranges": "bytes"}
+    compressible = os.path.splitext(entry.filename)[1].lstrip(".").lower() in COMPRESSIBLE_EXTENSIONS
+    if compressible:
+        headers["Vary"] = "Accept-Encoding"
+
+    # A client may hold the identity or any compressed representation
+    etags = [etag] + ([f'"{content_hash}-{encoding}"' for encoding in _available_encodings()] if compressible else [])
+    matched = _matching_etag(request.headers.get("if-none-match"), etags)
+    if matched is not None:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            headers["Content-Disposition"] = _content_disposition(entry.filename)
+            return StreamingResponse(
+                _iter_file(file_path, start, end + 1),
+                status_code=206,
+                media_type=media_type,
+                headers=headers
+            )
+
+    encoding = _negotiate_encoding(request.headers.get("accept-encoding")) if compressible else None
+    if encoding is not None:
+        # The encoded body is a different representation: it gets its own
+        # ETag and cannot be addressed by byte ranges
+        headers.update({
+            "ETag": f'"{content_hash}-{encoding}"',
+            "Accept-Ranges": "none",
+            "Content-Encoding": encoding,
+            "Content-Disposition": _content_disposition(entry.filename)
+        })
+        return StreamingResponse(_iter_compressed(file_path, encoding), media_type=media_type, headers=headers)
+
+    return FileResponse(path=file_path, filename=entry.filename, media_type=media_type, headers=headers)
+
+
+def _content_hash(entry: FileCatalogEntry, file_path: str, stat: os.stat_result) -> str:
+    # The recorded hash holds while the size, and the mtime if recorded, are unchanged
+    if (entry.sha256 is not None and entry.file_size == stat.st_size
+            and entry.modified_ns in (None, stat.st_mtime_ns)):
+        return entry.sha256
+    sha256 = compute_file_hash(file_path)
+    file_catalog.add(entry.model_copy(
+        update={"sha256": sha256, "file_size": stat.st_size, "modified_ns": stat.st_mtime_ns}
+    ))
+    return sha256
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes`` range into inclusive offsets.
+
+    Returns None for headers that should be ignored (other units, several
+    ranges, bad syntax), which serves the whole file; raises 416 for a
+    range outside the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise _range_not_satisfiable(size)
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise _range_not_satisfiable(size)
+    return start, min(end, size - 1)
+
+
+def _range_not_satisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=416,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"}
+    )
+
+
+def _if_range_matches(if_range: Optional[str], etag: str, last_modified: str) -> bool:
+    # Without If-Range the range always applies; with it, only while the
+    # file is the one the client started from (weak ETags never match)
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', "W/")):
+        return if_range == etag
+    return if_range == last_modified
+
+
+def _matching_etag(if_none_match: Optional[str], etags: List[str]) -> Optional[str]:
+    """Get the first of ``etags`` that ``If-None-Match`` names (weakly compared), or None."""
+    if if_none_match is None:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return etags[0]
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    return next((etag for etag in etags if etag in tags), None)
+
+
+def _negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the preferred encoding the client accepts, or None for identity."""
+    if not accept_encoding or not settings.DOWNLOAD_COMPRESSION:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in _available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def _available_encodings() -> List[str]:
+    # In order of preference; zstd needs the optional zstandard package
+    encodings = []
+    if _import_zstandard() is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def _iter_file(file_path: str, start: int, end: int) -> Iterator[bytes]:
+    """Read the bytes from ``start`` up to ``end`` in blocks."""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(settings.DOWNLOAD_BLOCK_BYTES, remaining))
+            if not block:
+                return
+            remaining -= len(block)
+            yield block
+
+
+def _iter_compressed(file_path: str, encoding: str) -> Iterator[bytes]:
+    if encoding == "zstd":
+        compressor = _import_zstandard().ZstdCompressor().compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in _iter_file(file_path, 0, os.path.getsize(file_path)):
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _import_zstandard() -> Any:
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def _content_disposition(filename: str) -> str:
+    return f'attachment; filename="{filename}"'
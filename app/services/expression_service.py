@@ -0,0 +1,287 @@
+import ast
+import operator
+from functools import lru_cache, reduce
+from typing import Any, Callable, Collection, Dict, FrozenSet, Hashable, List, Mapping, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression is invalid or cannot be evaluated."""
+
+
+def _is_numeric(value: Any) -> bool:
+    if isinstance(value, pd.Series):
+        return pd.api.types.is_numeric_dtype(value.dtype)
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def _as_str(value: Any) -> Any:
+    if isinstance(value, pd.Series):
+        return value.astype(str)
+    return str(value)
+
+
+def _vector_add(left: Any, right: Any) -> Any:
+    """
+    Numeric addition for numeric operands, string concatenation otherwise.
+
+    A missing operand gives a missing result rather than ``"nan"`` text.
+    Works on columns and on single values alike.
+    """
+    if _is_numeric(left) and _is_numeric(right):
+        return left + right
+    if not isinstance(left, pd.Series) and not isinstance(right, pd.Series):
+        return np.nan if pd.isna(left) or pd.isna(right) else str(left) + str(right)
+    result = _as_str(left) + _as_str(right)
+    missing = pd.isna(left) | pd.isna(right)
+    if np.any(missing):
+        result = result.mask(missing)
+    return result
+
+
+def _divide(left: Any, right: Any) -> Any:
+    """True division with NumPy semantics: ``x / 0`` is ``inf`` (or NaN), not an error."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.true_divide(left, right)
+
+
+def _scalar_extreme(pick: Callable[[Any], Any]) -> Callable[..., Any]:
+    """``max``/``min`` over single values, giving NaN if any argument is missing like ``np.maximum``."""
+    def extreme(*args: Any) -> Any:
+        if any(pd.isna(arg) for arg in args):
+            return np.nan
+        return pick(args)
+    return extreme
+
+
+def _vector_len(value: Any) -> Any:
+    if isinstance(value, pd.Series):
+        return value.str.len()
+    return len(value)
+
+
+def _vector_cast(dtype: type) -> Callable[[Any], Any]:
+    def cast(value: Any) -> Any:
+        if isinstance(value, pd.Series):
+            return value.astype(dtype)
+        return dtype(value)
+    return cast
+
+
+# Operators and functions an expression may use, with their scalar (one row)
+# and vectorized (whole column) implementations. Both must give the same
+# values, since a chunk falls back to the scalar form when the vectorized one
+# fails.
+_BINARY_OPS: Dict[type, Dict[str, Callable[[Any, Any], Any]]] = {
+    ast.Add: {"scalar": _vector_add, "vector": _vector_add},
+    ast.Sub: {"scalar": operator.sub, "vector": operator.sub},
+    ast.Mult: {"scalar": operator.mul, "vector": operator.mul},
+    ast.Div: {"scalar": _divide, "vector": _divide},
+}
+
+_UNARY_OPS: Dict[type, Dict[str, Callable[[Any], Any]]] = {
+    ast.USub: {"scalar": operator.neg, "vector": operator.neg},
+    ast.UAdd: {"scalar": operator.pos, "vector": operator.pos},
+}
+
+_FUNCTIONS: Dict[str, Dict[str, Callable[..., Any]]] = {
+    "max": {"scalar": _scalar_extreme(max), "vector": lambda *args: reduce(np.maximum, args)},
+    "min": {"scalar": _scalar_extreme(min), "vector": lambda *args: reduce(np.minimum, args)},
+    "len": {"scalar": len, "vector": _vector_len},
+    "str": {"scalar": str, "vector": _vector_cast(str)},
+    "int": {"scalar": int, "vector": _vector_cast(int)},
+    "float": {"scalar": float, "vector": _vector_cast(float)},
+}
+
+_CONSTANT_TYPES = (str, int, float)
+
+
+class Expression:
+    """
+    A transformation rule expression parsed once into a validated AST.
+
+    Only field identifiers, string and numeric constants, ``+ - * /``, unary
+    ``+``/``-`` and calls to the whitelisted functions are accepted. The tree
+    is compiled into two evaluators: ``evaluate_row`` works on one row
+    mapping and ``evaluate`` on a whole DataFrame chunk, column-wise.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        try:
+            self.tree = ast.parse(source.strip(), mode="eval").body
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid syntax: {e.msg}")
+        fields: Set[str] = set()
+        self._scalar = _compile(self.tree, "scalar", fields)
+        self._vector = _compile(self.tree, "vector", set())
+        self.fields: FrozenSet[str] = frozenset(fields)
+
+    def evaluate_row(self, row: Mapping[str, Any]) -> Any:
+        """Evaluate the expression for a single row of field values."""
+        return _guard(self._scalar, row, None)
+
+    def evaluate(self, df: pd.DataFrame) -> Any:
+        """
+        Evaluate the expression over every row of a chunk at once.
+
+        Returns a Series, or a scalar for expressions without field references.
+        """
+        return _guard(self._vector, df, None)
+
+    def subexpression_keys(self, outputs: Optional[Mapping[str, Hashable]] = None) -> List[Hashable]:
+        """
+        Get a structural key for every operator and function call in the tree.
+
+        Identical sub-expressions get equal keys, so they can be found across
+        the rules of a rule set. ``outputs`` is as for ``compile_shared``.
+        """
+        outputs = outputs or {}
+        return [
+            _node_key(node, outputs) for node in ast.walk(self.tree)
+            if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Call))
+        ]
+
+    def compile_shared(
+        self,
+        shared: Collection[Hashable],
+        outputs: Optional[Mapping[str, Hashable]] = None
+    ) -> Callable[[pd.DataFrame, Dict[Hashable, Any]], Any]:
+        """
+        Compile a vectorized evaluator that takes a chunk and a memo dict.
+
+        Sub-expressions whose key is in ``shared`` are computed once per memo
+        and reused by every evaluator given the same memo. Fields named in
+        ``outputs`` are read from ``memo[outputs[field]]`` instead of the chunk,
+        which lets a rule use the result of another rule.
+        """
+        vector = _compile(self.tree, "vector", set(), frozenset(shared), outputs or {})
+        return lambda df, memo: _guard(vector, df, memo)
+
+
+def _guard(evaluator: Callable[[Any, Any], Any], data: Any, memo: Optional[Dict[Hashable, Any]]) -> Any:
+    try:
+        return evaluator(data, memo)
+    except ExpressionError:
+        raise
+    except Exception as e:
+        raise ExpressionError(str(e))
+
+
+@lru_cache(maxsize=1024)
+def parse(expression: str) -> Expression:
+    """
+    Parse an expression, raising ExpressionError if it is not valid.
+
+    Parsed expressions are cached by their source text.
+    """
+    return Expression(expression)
+
+
+def validate_expression(expression: str, fields: Optional[Collection[str]] = None) -> Expression:
+    """
+    Parse an expression and, when ``fields`` is given, check that it only
+    references those fields.
+    """
+    parsed = parse(expression)
+    if fields is not None:
+        unknown = sorted(parsed.fields - set(fields))
+        if unknown:
+            raise ExpressionError(f"Unknown field(s): {', '.join(unknown)}")
+    return parsed
+
+
+def _node_key(node: ast.AST, outputs: Mapping[str, Hashable]) -> Hashable:
+    # Names read from other rules are part of the key, since the same text can
+    # mean an input column in one rule and a rule output in another
+    names = {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+    return ast.dump(node), tuple(sorted((name, outputs[name]) for name in names if name in outputs))
+
+
+def _compile(
+    node: ast.AST,
+    mode: str,
+    fields: Set[str],
+    shared: FrozenSet[Hashable] = frozenset(),
+    outputs: Optional[Mapping[str, Hashable]] = None
+) -> Callable[[Any, Optional[Dict[Hashable, Any]]], Any]:
+    """
+    Turn a validated AST node into a function over a row mapping (``scalar``)
+    or a DataFrame chunk (``vector``) and an optional memo dict.
+    """
+    outputs = outputs or {}
+    compiled = _compile_node(node, mode, fields, shared, outputs)
+    if not shared or not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Call)):
+        return compiled
+    key = _node_key(node, outputs)
+    if key not in shared:
+        return compiled
+
+    def memoized(data: Any, memo: Optional[Dict[Hashable, Any]]) -> Any:
+        if memo is None:
+            return compiled(data, memo)
+        if key not in memo:
+            memo[key] = compiled(data, memo)
+        return memo[key]
+    return memoized
+
+
+def _compile_node(
+    node: ast.AST,
+    mode: str,
+    fields: Set[str],
+    shared: FrozenSet[Hashable],
+    outputs: Mapping[str, Hashable]
+) -> Callable[[Any, Optional[Dict[Hashable, Any]]], Any]:
+    if isinstance(node, ast.Name):
+        if node.id in _FUNCTIONS:
+            raise ExpressionError(f"Function used without a call: {node.id}")
+        field = node.id
+        fields.add(field)
+        if field in outputs:
+            output_key = outputs[field]
+            return lambda data, memo: memo[output_key]
+
+        def lookup(data: Any, memo: Optional[Dict[Hashable, Any]]) -> Any:
+            try:
+                return data[field]
+            except KeyError:
+                raise ExpressionError(f"Unknown field: {field}")
+        return lookup
+
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, _CONSTANT_TYPES) or isinstance(node.value, bool):
+            raise ExpressionError(f"Unsupported constant: {node.value!r}")
+        value = node.value
+        return lambda data, memo: value
+
+    if isinstance(node, ast.BinOp):
+        if type(node.op) not in _BINARY_OPS:
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        op = _BINARY_OPS[type(node.op)][mode]
+        left = _compile(node.left, mode, fields, shared, outputs)
+        right = _compile(node.right, mode, fields, shared, outputs)
+        return lambda data, memo: op(left(data, memo), right(data, memo))
+
+    if isinstance(node, ast.UnaryOp):
+        if type(node.op) not in _UNARY_OPS:
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        op = _UNARY_OPS[type(node.op)][mode]
+        operand = _compile(node.operand, mode, fields, shared, outputs)
+        return lambda data, memo: op(operand(data, memo))
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else ast.unparse(node.func)
+            raise ExpressionError(f"Unsupported function: {name}")
+        if node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args):
+            raise ExpressionError(f"Unsupported arguments to {node.func.id}()")
+        if not node.args:
+            raise ExpressionError(f"{node.func.id}() needs at least one argument")
+        func = _FUNCTIONS[node.func.id][mode]
+        args = [_compile(arg, mode, fields, shared, outputs) for arg in node.args]
+        return lambda data, memo: func(*(arg(data, memo) for arg in args))
+
+    raise ExpressionError(f"Unsupported expression element: {type(node).__name__}")
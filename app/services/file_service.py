@@ -1,24 +1,36 @@
+import hashlib
 import os
-import shutil
+import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, BinaryIO, List, Optional, Tuple
 
-from fastapi import HTTPException, UploadFile
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
 from app.core.config import settings
-from app.models.report import FileFormat, FileUploadResponse
+from app.models.report import FileCatalogEntry, FileFormat, FileUploadResponse
+from app.services.catalog_service import FILE_TYPES, file_catalog, file_directory, file_type_of
+from app.services.profile_service import profile_upload, remove_profile
+from app.services.reader_service import (COMPRESSION_EXTENSIONS, STREAMABLE_EXTENSIONS, SUPPORTED_EXTENSIONS,
+                                         get_reader, split_extension)
 
 
 async def save_uploaded_file(
     file: UploadFile, 
-    file_type: str
+    file_type: str,
+    background_tasks: Optional[BackgroundTasks] = None
 ) -> FileUploadResponse:
     """
     Save an uploaded file to the upload directory.
     
+    With ``background_tasks`` the file is profiled once the response has
+    been sent; the profile's dtypes and columns are used by report runs and
+    rule validation.
+    
     Args:
         file: The uploaded file
         file_type: The type of file (input or reference)
+        background_tasks: Tasks to run after the response
     
     Returns:
         FileUploadResponse: Metadata about the uploaded file
@@ -27,32 +39,133 @@ async def save_uploaded_file(
     if file_type not in ["input", "reference"]:
         raise HTTPException(status_code=400, detail="Invalid file type. Must be 'input' or 'reference'")
     
-    # Validate file extension
-    file_ext = file.filename.split(".")[-1].lower()
-    if file_ext not in ["csv", "xlsx", "json"]:
-        raise HTTPException(status_code=400, detail="Invalid file format. Must be CSV, XLSX, or JSON")
+    # Validate file extension; text formats may also be compressed
+    # (data.csv.gz) and are stored as uploaded
+    file_ext, compression = split_extension(file.filename)
+    if file_ext not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file format. Must be one of: {', '.join(SUPPORTED_EXTENSIONS)}"
+        )
+    if compression is not None and file_ext not in STREAMABLE_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Only {', '.join(STREAMABLE_EXTENSIONS)} files can be uploaded compressed "
+                   f"({', '.join(COMPRESSION_EXTENSIONS)})"
+        )
+    suffix = f"{file_ext}.{compression}" if compression else file_ext
+    
+    # Reject oversized uploads before copying anything
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise _upload_too_large()
     
     # Create a unique filename
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = f"{file_type}_{timestamp}.{file_ext}"
+    filename = f"{file_type}_{timestamp}_{uuid.uuid4().hex[:8]}.{suffix}"
     file_path = os.path.join(settings.UPLOAD_DIR, filename)
     
     # Ensure upload directory exists
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     
-    # Save the file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Stream the upload to a temporary file, hashing it on the way, and move
+    # it into place only once it is complete. Blocking file I/O runs in the
+    # thread pool so large uploads do not stall the event loop.
+    temp_path = f"{file_path}.part"
+    digest = hashlib.sha256()
+    file_size = 0
+    newlines = 0
+    last_byte = b""
+    buffer = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        while True:
+            block = await file.read(settings.UPLOAD_READ_BYTES)
+            if not block:
+                break
+            file_size += len(block)
+            if file_size > settings.MAX_UPLOAD_BYTES:
+                raise _upload_too_large()
+            newlines += await run_in_threadpool(_write_block, buffer, digest, block)
+            last_byte = block[-1:]
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(os.replace, temp_path, file_path)
+    except BaseException:
+        buffer.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    # Newline-delimited formats get a row estimate from the line count;
+    # compressed uploads get their row count from profiling
+    if last_byte and last_byte != b"\n":
+        newlines += 1
+    row_count_estimate = _estimate_rows(file_path, file_ext, newlines) if compression is None else None
+    upload_time = datetime.now()
+    
+    # Index the file in the catalog
+    await run_in_threadpool(_catalog_upload, file_path, FileCatalogEntry(
+        filename=filename,
+        file_type=file_type,
+        file_size=file_size,
+        uploaded_at=upload_time,
+        sha256=digest.hexdigest(),
+        row_count=row_count_estimate
+    ))
     
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    # Profile the file off the request path
+    if background_tasks is not None and settings.PROFILE_UPLOADS:
+        background_tasks.add_task(profile_upload, file_path)
     
     return FileUploadResponse(
         filename=filename,
         file_type=file_type,
         file_size=file_size,
-        upload_time=datetime.now(),
-        status="success"
+        upload_time=upload_time,
+        status="success",
+        sha256=digest.hexdigest(),
+        row_count_estimate=row_count_estimate
+    )
+
+
+def _write_block(buffer: BinaryIO, digest: Any, block: bytes) -> int:
+    """Write a block of an upload and hash it; returns the number of newlines in it."""
+    buffer.write(block)
+    digest.update(block)
+    return block.count(b"\n")
+
+
+def _estimate_rows(file_path: str, file_ext: str, lines: int) -> Optional[int]:
+    if file_ext == "csv":
+        return max(lines - 1, 0)
+    if file_ext in ("jsonl", "ndjson"):
+        return lines
+    if file_ext == "parquet":
+        try:
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(file_path).metadata.num_rows
+        except Exception:
+            return None
+    return None
+
+
+def _catalog_upload(file_path: str, entry: FileCatalogEntry) -> None:
+    """Add an upload to the catalog with its mtime and columns; reading the columns can load the whole file."""
+    entry.modified_ns = os.stat(file_path).st_mtime_ns
+    entry.columns = _read_columns(file_path)
+    file_catalog.add(entry)
+
+
+def _read_columns(file_path: str) -> Optional[List[str]]:
+    try:
+        return get_reader(file_path).columns(file_path)
+    except Exception:
+        # A file that cannot be parsed is still stored; the report will fail on it
+        return None
+
+
+def _upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. The maximum upload size is {settings.MAX_UPLOAD_BYTES} bytes"
     )
 
 
@@ -66,60 +179,125 @@ def get_file_path(filename: str) -> str:
     Returns:
         str: The full path to the file
     """
-    # Determine the directory based on the filename prefix
-    if filename.startswith("input_") or filename.startswith("reference_"):
-        file_path = os.path.join(settings.UPLOAD_DIR, filename)
-    elif filename.startswith("report_"):
-        file_path = os.path.join(settings.REPORTS_DIR, filename)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid filename")
+    entry = get_file_entry(filename)
+    file_path = os.path.join(file_directory(entry.file_type), entry.filename)
     
     # Check if the file exists
     if not os.path.exists(file_path):
+        file_catalog.remove(filename)
         raise HTTPException(status_code=404, detail=f"File not found: {filename}")
     
     return file_path
 
 
-def list_files(file_type: Optional[str] = None) -> List[dict]:
+def get_file_entry(filename: str) -> FileCatalogEntry:
+    """
+    Get the catalog entry of a file.
+    
+    Files written to the upload or reports directory outside the API are
+    indexed the first time they are looked up.
+    
+    Args:
+        filename: The name of the file
+    
+    Returns:
+        FileCatalogEntry: The catalog entry
+    """
+    entry = file_catalog.get(filename)
+    if entry is not None:
+        return entry
+    
+    file_type = file_type_of(filename)
+    file_path = os.path.join(file_directory(file_type), filename) if file_type else None
+    if file_path is None or os.path.basename(filename) != filename or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+    
+    stat = os.stat(file_path)
+    entry = FileCatalogEntry(
+        filename=filename,
+        file_type=file_type,
+        file_size=stat.st_size,
+        uploaded_at=datetime.fromtimestamp(stat.st_mtime)
+    )
+    file_catalog.add(entry)
+    return entry
+
+
+def get_latest_file(file_type: str) -> Optional[str]:
+    """
+    Get the path of the most recently uploaded file of a type.
+    
+    Args:
+        file_type: The type of file (input or reference)
+    
+    Returns:
+        Optional[str]: The full path to the file, or None if there is none
+    """
+    entry = file_catalog.latest(file_type)
+    if entry is None:
+        return None
+    return os.path.join(file_directory(file_type), entry.filename)
+
+
+def delete_file(filename: str) -> None:
+    """
+    Delete a file and remove it from the catalog.
+    
+    Args:
+        filename: The name of the file
+    """
+    file_path = get_file_path(filename)
+    os.remove(file_path)
+    remove_profile(file_path)
+    file_catalog.remove(filename)
+
+
+def list_files(file_type: Optional[str] = None, skip: int = 0, limit: int = 100) -> Tuple[List[dict], int]:
+    """
+    List files of a specific type, newest first.
+    
+    Args:
+        file_type: The type of file to list (input, reference, or report); all files if None
+        skip: Number of files to skip
+        limit: Maximum number of files to return
+    
+    Returns:
+        Tuple[List[dict], int]: A page of file metadata and the total number of matches
+    """
+    if file_type is not None and file_type not in FILE_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Must be 'input', 'reference' or 'report'")
+    
+    entries, total = file_catalog.list(file_type, skip=skip, limit=limit)
+    files = [
+        {
+            "filename": entry.filename,
+            "file_type": entry.file_type,
+            "file_size": entry.file_size,
+            "created_at": entry.uploaded_at.isoformat(),
+            "updated_at": entry.uploaded_at.isoformat(),
+            "sha256": entry.sha256,
+            "row_count": entry.row_count,
+            "columns": entry.columns,
+            "profiled": entry.profiled
+        }
+        for entry in entries
+    ]
+    return files, total
+
+
+def compute_file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
     """
-    List all files of a specific type.
+    Compute the SHA-256 of a file's content.
     
     Args:
-        file_type: The type of file to list (input, reference, or report)
+        file_path: The path to the file
+        block_size: The number of bytes to read at a time
     
     Returns:
-        List[dict]: A list of file metadata
+        str: The hex digest
     """
-    files = []
-    
-    # Determine the directory to scan
-    if file_type in ["input", "reference"]:
-        directory = settings.UPLOAD_DIR
-        prefix = f"{file_type}_"
-    elif file_type == "report":
-        directory = settings.REPORTS_DIR
-        prefix = "report_"
-    else:
-        # List all files
-        input_files = list_files("input")
-        reference_files = list_files("reference")
-        report_files = list_files("report")
-        return input_files + reference_files + report_files
-    
-    # Scan the directory
-    for filename in os.listdir(directory):
-        if filename.startswith(prefix):
-            file_path = os.path.join(directory, filename)
-            files.append({
-                "filename": filename,
-                "file_type": file_type,
-                "file_size": os.path.getsize(file_path),
-                "created_at": datetime.fromtimestamp(os.path.getctime(file_path)).isoformat(),
-                "updated_at": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
-            })
-    
-    # Sort by creation time (newest first)
-    files.sort(key=lambda f: f["created_at"], reverse=True)
-    
-    return files
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
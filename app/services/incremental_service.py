@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.database import ensure_schema
+from app.models.report import FileFormat, IncrementalState, IncrementalStats, ReportMetadata, TransformationRule
+from app.services.file_service import compute_file_hash
+from app.services.output_service import APPENDABLE_FORMATS
+
+# Only CSV inputs can be read from a byte offset
+INCREMENTAL_INPUT_EXTENSIONS = ("csv",)
+
+# Bytes hashed at the start of the input and just before the recorded offset
+# to check that the part already processed has not been rewritten
+PREFIX_CHECK_BYTES = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS incremental_state (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+_UPSERT = """
+INSERT INTO incremental_state (key, data) VALUES (?, ?)
+ON CONFLICT (key) DO UPDATE SET data = excluded.data
+"""
+
+
+class IncrementalStateStore:
+    """
+    SQLite-backed record of the last successful incremental run of each
+    input/reference/rule-set combination.
+    """
+
+    def get(self, key: str) -> Optional[IncrementalState]:
+        connection = ensure_schema("incremental_state", _SCHEMA)
+        row = connection.execute("SELECT data FROM incremental_state WHERE key = ?", (key,)).fetchone()
+        return IncrementalState.model_validate_json(row["data"]) if row else None
+
+    def save(self, key: str, state: IncrementalState) -> None:
+        connection = ensure_schema("incremental_state", _SCHEMA)
+        connection.execute(_UPSERT, (key, state.model_dump_json()))
+
+
+incremental_store = IncrementalStateStore()
+
+
+class IncrementalPlan:
+    """
+    What an incremental run has to do: read the input from ``start_offset``
+    to ``end_offset`` and, when ``base`` is set, append to its output.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        end_offset: int,
+        rules_hash: str,
+        reference_hash: str,
+        base: Optional[IncrementalState] = None,
+        full_rebuild_reason: Optional[str] = None
+    ):
+        self.key = key
+        self.end_offset = end_offset
+        self.rules_hash = rules_hash
+        self.reference_hash = reference_hash
+        self.base = base
+        self.full_rebuild_reason = full_rebuild_reason
+
+    @property
+    def start_offset(self) -> int:
+        return self.base.input_offset if self.base else 0
+
+    @property
+    def byte_range(self) -> Tuple[int, int]:
+        return self.start_offset, self.end_offset
+
+    def stats(self) -> IncrementalStats:
+        return IncrementalStats(
+            rows_reused=self.base.input_rows if self.base else 0,
+            input_offset=self.start_offset,
+            base_report_id=self.base.report_id if self.base else None,
+            full_rebuild_reason=self.full_rebuild_reason
+        )
+
+    def state(self, report_metadata: ReportMetadata, input_file_path: str, rows_processed: int) -> IncrementalState:
+        """Build the state to record after the run succeeds."""
+        return IncrementalState(
+            report_id=report_metadata.id,
+            output_file=report_metadata.output_file,
+            input_offset=self.end_offset,
+            input_rows=(self.base.input_rows if self.base else 0) + rows_processed,
+            ends_with_newline=_ends_with_newline(input_file_path, self.end_offset),
+            prefix_hash=_prefix_hash(input_file_path, self.end_offset),
+            rules_hash=self.rules_hash,
+            reference_hash=self.reference_hash
+        )
+
+
+def plan_incremental_run(
+    report_metadata: ReportMetadata,
+    input_file_path: str,
+    reference_file_path: str,
+    rules: List[TransformationRule]
+) -> IncrementalPlan:
+    """
+    Decide whether a report can extend the output of the previous run or
+    needs a full rebuild.
+
+    The previous output is reused only when the rules and reference file are
+    unchanged and the input has only been appended to since.
+    """
+    key = state_key(report_metadata)
+    plan = IncrementalPlan(
+        key=key,
+        end_offset=os.path.getsize(input_file_path),
+        rules_hash=rules_hash(rules, report_metadata.join_keys, report_metadata.reference_unique),
+        reference_hash=compute_file_hash(reference_file_path)
+    )
+    previous = incremental_store.get(key)
+    plan.full_rebuild_reason = _full_rebuild_reason(previous, plan, report_metadata.output_format, input_file_path)
+    if plan.full_rebuild_reason is None:
+        plan.base = previous
+    return plan
+
+
+def state_key(report_metadata: ReportMetadata) -> str:
+    return json.dumps([
+        report_metadata.input_file,
+        report_metadata.reference_file,
+        report_metadata.rule_set_id,
+        report_metadata.output_format.value,
+    ])
+
+
+def rules_hash(rules: List[TransformationRule], join_keys: Sequence[str], reference_unique: bool) -> str:
+    content = json.dumps({
+        "rules": [[rule.output_field, rule.expression] for rule in rules],
+        "join_keys": list(join_keys),
+        "reference_unique": reference_unique,
+    })
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _full_rebuild_reason(
+    previous: Optional[IncrementalState],
+    plan: IncrementalPlan,
+    output_format: FileFormat,
+    input_file_path: str
+) -> Optional[str]:
+    if os.path.splitext(input_file_path)[1].lstrip(".").lower() not in INCREMENTAL_INPUT_EXTENSIONS:
+        return "input format cannot be read incrementally"
+    if output_format not in APPENDABLE_FORMATS:
+        return "output format cannot be appended to"
+    if previous is None:
+        return "no previous run"
+    if previous.rules_hash != plan.rules_hash:
+        return "rules changed"
+    if previous.reference_hash != plan.reference_hash:
+        return "reference file changed"
+    if plan.end_offset < previous.input_offset:
+        return "input file shrank"
+    if plan.end_offset > previous.input_offset and not previous.ends_with_newline:
+        return "previous run ended mid-line"
+    if _prefix_hash(input_file_path, previous.input_offset) != previous.prefix_hash:
+        return "input file was rewritten"
+    if not os.path.exists(os.path.join(settings.REPORTS_DIR, previous.output_file)):
+        return "previous output is missing"
+    return None
+
+
+def _prefix_hash(file_path: str, offset: int) -> str:
+    """Hash the head of the file and the bytes just before ``offset``."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        digest.update(f.read(min(offset, PREFIX_CHECK_BYTES)))
+        tail_start = max(offset - PREFIX_CHECK_BYTES, 0)
+        f.seek(tail_start)
+        digest.update(f.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+def _ends_with_newline(file_path: str, offset: int) -> bool:
+    if offset == 0:
+        return True
+    with open(file_path, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
@@ -0,0 +1,210 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+import structlog
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.middleware.metrics_middleware import REPORT_GENERATION_COUNT, REPORT_GENERATION_LATENCY
+from app.models.report import ReportMetadata, ReportStatus
+from app.services.coordination_service import coordination_store, node_id
+from app.services.metadata_service import report_store
+from app.services.report_service import run_report_batch, shared_scan_key
+
+logger = structlog.get_logger()
+
+
+class QueueFullError(Exception):
+    """Raised when the report queue has reached its maximum depth."""
+
+
+class QueueClosedError(Exception):
+    """Raised when a job is submitted while the report queue is not running."""
+
+
+class ReportJobQueue:
+    """
+    Bounded queue of report jobs executed by a pool of worker processes.
+
+    Jobs move PENDING -> PROCESSING -> COMPLETED/FAILED, and every transition
+    is recorded in the report metadata store. One dispatcher task per worker
+    takes the next job off the queue and hands it to the process pool, so the
+    event loop is never blocked by report generation. Metadata and claim
+    writes run in the thread pool for the same reason.
+
+    Workers are started by a fork server rather than forked from the API
+    process, which has threads (and their locks) of its own.
+
+    With COORDINATION_ENABLED every job is also claimed in the shared
+    coordination store until it finishes, so if this node dies its jobs are
+    re-queued on another one.
+    """
+
+    def __init__(self, workers: int, max_depth: int):
+        self.workers = workers
+        self.max_depth = max_depth
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._dispatchers: List[asyncio.Task] = []
+        self._accepting = False
+        # Submissions that have a slot but are still being recorded
+        self._reserved = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self) -> None:
+        """Start the worker pool and the dispatcher tasks."""
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+        self._dispatchers = [
+            asyncio.create_task(self._dispatch()) for _ in range(self.workers)
+        ]
+        self._accepting = True
+
+    async def submit(self, report_metadata: ReportMetadata) -> ReportMetadata:
+        """
+        Enqueue a pending report job and return its metadata without waiting
+        for it to run.
+
+        Raises QueueFullError when max_depth jobs are already waiting.
+        """
+        return (await self.submit_batch([report_metadata]))[0]
+
+    async def submit_batch(self, reports: List[ReportMetadata]) -> List[ReportMetadata]:
+        """
+        Enqueue reports that share a scan as one job, run by a single worker
+        in one pass over their input (see ``run_report_batch``).
+
+        Raises QueueFullError when max_depth jobs are already waiting, and
+        ValueError if the reports do not share a scan.
+        """
+        if not self._accepting:
+            raise QueueClosedError("Report queue is not accepting jobs")
+        if len(reports) > 1 and (
+            shared_scan_key(reports[0]) is None
+            or any(shared_scan_key(report) != shared_scan_key(reports[0]) for report in reports)
+        ):
+            raise ValueError("Only reports with the same input, reference and join can be batched")
+
+        if self.depth + self._reserved >= self.max_depth:
+            raise QueueFullError(f"Report queue is full ({self.max_depth} jobs waiting)")
+
+        # The slot is reserved while the jobs are recorded, so a worker never
+        # sees a job before it is stored as pending
+        self._reserved += 1
+        try:
+            for report_metadata in reports:
+                report_metadata.status = ReportStatus.PENDING
+            await run_in_threadpool(self._record, reports)
+            if self._queue is None:
+                raise QueueClosedError("Report queue is not accepting jobs")
+            self._queue.put_nowait(reports)
+        finally:
+            self._reserved -= 1
+        return reports
+
+    def _record(self, reports: List[ReportMetadata]) -> None:
+        for report_metadata in reports:
+            report_store.save(report_metadata)
+            if settings.COORDINATION_ENABLED:
+                coordination_store.claim_job(report_metadata, node_id())
+
+    async def shutdown(self, timeout: float) -> None:
+        """
+        Stop accepting jobs and drain the queue.
+
+        Queued and running jobs get up to ``timeout`` seconds to finish;
+        anything still waiting after that is marked as failed.
+        """
+        if self._queue is None:
+            return
+
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("report_queue_drain_timeout", pending=self.depth)
+
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+
+        while not self._queue.empty():
+            reports = self._queue.get_nowait()
+            await run_in_threadpool(self._fail, reports, "Report queue shut down before the job ran")
+
+        executor = self._executor
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+        )
+        self._queue = None
+        self._executor = None
+        self._dispatchers = []
+        await run_in_threadpool(report_store.flush)
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            reports = await self._queue.get()
+            try:
+                for report_metadata in reports:
+                    report_metadata.status = ReportStatus.PROCESSING
+                    report_metadata.start_time = datetime.now()
+                await run_in_threadpool(self._save, reports)
+
+                results = await loop.run_in_executor(self._executor, run_report_batch, reports)
+                await run_in_threadpool(self._save, results, release=True)
+                for result in results:
+                    REPORT_GENERATION_COUNT.labels(status=result.status.value).inc()
+                    if result.processing_time_seconds is not None:
+                        REPORT_GENERATION_LATENCY.observe(result.processing_time_seconds)
+            except asyncio.CancelledError:
+                await run_in_threadpool(self._fail, reports, "Report queue shut down while the job was running")
+                raise
+            except Exception as e:
+                logger.error("report_job_failed", report_ids=[report.id for report in reports], error=str(e))
+                await run_in_threadpool(self._fail, reports, str(e))
+            finally:
+                self._queue.task_done()
+
+    def _save(self, reports: List[ReportMetadata], release: bool = False) -> None:
+        for report_metadata in reports:
+            report_store.save(report_metadata)
+        if release:
+            self._release(reports)
+
+    def _release(self, reports: List[ReportMetadata]) -> None:
+        if not settings.COORDINATION_ENABLED:
+            return
+        try:
+            # Make the outcome visible to other nodes before the claims go
+            report_store.flush()
+            for report_metadata in reports:
+                coordination_store.release_job(report_metadata.id)
+        except Exception as e:
+            # The claims go stale and are cleaned up by the reaper
+            logger.warning("job_claim_release_failed", report_ids=[report.id for report in reports], error=str(e))
+
+    def _fail(self, reports: List[ReportMetadata], message: str) -> None:
+        for report_metadata in reports:
+            report_metadata.status = ReportStatus.FAILED
+            report_metadata.end_time = datetime.now()
+            report_metadata.error_message = message
+            report_store.save(report_metadata)
+            REPORT_GENERATION_COUNT.labels(status=ReportStatus.FAILED.value).inc()
+        self._release(reports)
+
+
+report_queue = ReportJobQueue(
+    workers=settings.REPORT_WORKERS,
+    max_depth=settings.REPORT_QUEUE_MAX_DEPTH
+)
@@ -0,0 +1,151 @@
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import ensure_schema
+from app.models.report import ReportMetadata, ReportStatus
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_by TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_reports_status ON reports (status, start_time);
+CREATE INDEX IF NOT EXISTS ix_reports_created_by ON reports (created_by, start_time);
+CREATE INDEX IF NOT EXISTS ix_reports_start_time ON reports (start_time);
+"""
+
+_UPSERT = """
+INSERT INTO reports (id, status, created_by, start_time, data)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    status = excluded.status,
+    created_by = excluded.created_by,
+    start_time = excluded.start_time,
+    data = excluded.data
+"""
+
+
+class ReportMetadataStore:
+    """
+    SQLite-backed store of report metadata.
+
+    Writes are buffered and flushed in a single transaction once
+    METADATA_BATCH_SIZE reports are pending or METADATA_FLUSH_INTERVAL_SECONDS
+    have passed. Lookups check the buffer first, so callers always read their
+    own writes.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, ReportMetadata] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def save(self, report_metadata: ReportMetadata) -> None:
+        """Queue a report for writing."""
+        with self._lock:
+            self._pending[report_metadata.id] = report_metadata.model_copy()
+            flush_now = len(self._pending) >= self.batch_size
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def save_many(self, reports: List[ReportMetadata]) -> None:
+        """Write several reports in one transaction."""
+        for report_metadata in reports:
+            with self._lock:
+                self._pending[report_metadata.id] = report_metadata.model_copy()
+        self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered reports."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending = list(self._pending.values())
+            if not pending:
+                return
+
+            connection = ensure_schema("reports", _SCHEMA)
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(_UPSERT, [
+                    (
+                        report.id,
+                        report.status.value,
+                        report.created_by,
+                        report.start_time.isoformat(),
+                        report.model_dump_json()
+                    )
+                    for report in pending
+                ])
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            self._pending.clear()
+
+    def get(self, report_id: str) -> Optional[ReportMetadata]:
+        """Get a report by ID."""
+        with self._lock:
+            pending = self._pending.get(report_id)
+        if pending is not None:
+            return pending.model_copy()
+
+        connection = ensure_schema("reports", _SCHEMA)
+        row = connection.execute("SELECT data FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return ReportMetadata.model_validate_json(row["data"]) if row else None
+
+    def list(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        status: Optional[ReportStatus] = None,
+        created_by: Optional[str] = None,
+        start_after: Optional[datetime] = None,
+        start_before: Optional[datetime] = None
+    ) -> Tuple[List[ReportMetadata], int]:
+        """
+        List reports, newest first, with the total number of matches.
+        """
+        self.flush()
+
+        conditions = []
+        params: list = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status.value)
+        if created_by is not None:
+            conditions.append("created_by = ?")
+            params.append(created_by)
+        if start_after is not None:
+            conditions.append("start_time >= ?")
+            params.append(start_after.isoformat())
+        if start_before is not None:
+            conditions.append("start_time < ?")
+            params.append(start_before.isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = ensure_schema("reports", _SCHEMA)
+        total = connection.execute(f"SELECT COUNT(*) FROM reports {where}", params).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT data FROM reports {where} ORDER BY start_time DESC LIMIT ? OFFSET ?",
+            params + [limit, skip]
+        ).fetchall()
+        return [ReportMetadata.model_validate_json(row["data"]) for row in rows], total
+
+
+report_store = ReportMetadataStore(
+    batch_size=settings.METADATA_BATCH_SIZE,
+    flush_interval=settings.METADATA_FLUSH_INTERVAL_SECONDS
+)
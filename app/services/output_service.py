@@ -0,0 +1,237 @@
+import os
+import shutil
+from typing import Dict, List, Optional, Type
+
+import pandas as pd
+
+from app.models.report import FileFormat
+
+# Excel worksheets hold at most 1,048,576 rows including the header
+XLSX_MAX_DATA_ROWS = 1048575
+
+
+class ReportWriter:
+    """
+    Streaming sink that appends transformed chunks straight to disk.
+
+    Chunks are written to a temporary ``.part`` file as they arrive and the
+    file is moved into place on ``close``, so peak memory is bounded by one
+    chunk and a failed report never leaves a truncated output behind.
+
+    With ``resume_from``, the new file starts as a copy of an earlier output
+    with the same columns and chunks are appended after its rows.
+    """
+
+    def __init__(self, path: str, columns: List[str], resume_from: Optional[str] = None):
+        self.path = path
+        self.columns = columns
+        self.temp_path = f"{path}.part"
+        self.rows_written = 0
+        if resume_from is None:
+            self._open()
+        else:
+            shutil.copyfile(resume_from, self.temp_path)
+            self._resume()
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        """Append a chunk of output rows."""
+        self._write_chunk(chunk[self.columns])
+        self.rows_written += len(chunk)
+
+    def close(self) -> None:
+        """Finish the file and move it to its final path."""
+        self._finish()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard everything written so far."""
+        try:
+            self._finish()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _open(self) -> None:
+        raise NotImplementedError
+
+    def _resume(self) -> None:
+        raise ValueError(f"{type(self).__name__} cannot append to an existing report")
+
+    def _write_chunk(self, chunk: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def _finish(self) -> None:
+        raise NotImplementedError
+
+
+class CsvReportWriter(ReportWriter):
+    """Writes the header once and appends every chunk below it."""
+
+    def _open(self) -> None:
+        self._file = open(self.temp_path, "w", newline="")
+        pd.DataFrame(columns=self.columns).to_csv(self._file, index=False)
+
+    def _resume(self) -> None:
+        self._file = open(self.temp_path, "a", newline="")
+
+    def _write_chunk(self, chunk: pd.DataFrame) -> None:
+        chunk.to_csv(self._file, header=False, index=False)
+
+    def _finish(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+class JsonReportWriter(ReportWriter):
+    """Streams a JSON array of records, one chunk of records at a time."""
+
+    def _open(self) -> None:
+        self._file = open(self.temp_path, "w")
+        self._file.write("[")
+        self._empty = True
+
+    def _resume(self) -> None:
+        # Reopen the array by dropping its closing bracket
+        with open(self.temp_path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - 2, 0))
+            tail = f.read()
+            if not tail.endswith(b"]"):
+                raise ValueError(f"Not a complete JSON report: {self.temp_path}")
+            f.truncate(size - 1)
+        self._file = open(self.temp_path, "a")
+        self._empty = tail.startswith(b"[")
+
+    def _write_chunk(self, chunk: pd.DataFrame) -> None:
+        records = chunk.to_json(orient="records")[1:-1]
+        if not records:
+            return
+        if not self._empty:
+            self._file.write(",")
+        self._file.write(records)
+        self._empty = False
+
+    def _finish(self) -> None:
+        if not self._file.closed:
+            self._file.write("]")
+            self._file.close()
+
+
+class ExcelReportWriter(ReportWriter):
+    """Appends rows to a write-only openpyxl workbook."""
+
+    def _open(self) -> None:
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(self.columns)
+        self._saved = False
+
+    def _write_chunk(self, chunk: pd.DataFrame) -> None:
+        if self.rows_written + len(chunk) > XLSX_MAX_DATA_ROWS:
+            raise ValueError(f"XLSX output is limited to {XLSX_MAX_DATA_ROWS} rows")
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            self._sheet.append(row)
+
+    def _finish(self) -> None:
+        if not self._saved:
+            self._saved = True
+            self._workbook.save(self.temp_path)
+
+
+class ArrowReportWriter(ReportWriter):
+    """
+    Base for columnar writers: each chunk becomes one Arrow table appended to
+    the file. The schema is taken from the first chunk, with all-null columns
+    widened to strings so later chunks can still fill them.
+    """
+
+    def _open(self) -> None:
+        try:
+            import pyarrow
+        except ImportError:
+            raise ValueError("Parquet and Feather output requires the pyarrow package")
+        self._pa = pyarrow
+        self._writer = None
+        self._closed = False
+
+    def _write_chunk(self, chunk: pd.DataFrame) -> None:
+        pa = self._pa
+        if self._writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            schema = pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ]).remove_metadata()
+            self._schema = schema
+            self._writer = self._open_writer(schema)
+        table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def _finish(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is None:
+            self._write_chunk(pd.DataFrame({column: pd.Series(dtype=object) for column in self.columns}))
+        self._writer.close()
+
+    def _open_writer(self, schema):
+        raise NotImplementedError
+
+
+class ParquetReportWriter(ArrowReportWriter):
+    """Writes one Parquet row group per chunk."""
+
+    def _open_writer(self, schema):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(self.temp_path, schema)
+
+
+class FeatherReportWriter(ArrowReportWriter):
+    """Writes an Arrow IPC (Feather v2) file with one record batch per chunk."""
+
+    def _open_writer(self, schema):
+        pa = self._pa
+        compression = "lz4" if pa.Codec.is_available("lz4") else None
+        return pa.ipc.new_file(self.temp_path, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+
+
+# Formats whose writers can append to an existing report
+APPENDABLE_FORMATS = (FileFormat.CSV, FileFormat.JSON)
+
+_WRITERS: Dict[FileFormat, Type[ReportWriter]] = {
+    FileFormat.CSV: CsvReportWriter,
+    FileFormat.EXCEL: ExcelReportWriter,
+    FileFormat.JSON: JsonReportWriter,
+    FileFormat.PARQUET: ParquetReportWriter,
+    FileFormat.FEATHER: FeatherReportWriter,
+}
+
+
+def open_report_writer(
+    path: str,
+    output_format: FileFormat,
+    columns: List[str],
+    resume_from: Optional[str] = None
+) -> ReportWriter:
+    """
+    Open a streaming writer for the requested output format, optionally
+    continuing the report at ``resume_from`` (see APPENDABLE_FORMATS).
+    """
+    writer_class = _WRITERS.get(output_format)
+    if writer_class is None:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    return writer_class(path, columns, resume_from=resume_from)
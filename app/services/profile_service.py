@@ -0,0 +1,178 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import structlog
+
+from app.core.config import settings
+from app.models.report import FileProfile
+from app.services.catalog_service import file_catalog
+from app.services.reader_service import get_reader
+
+logger = structlog.get_logger()
+
+# Sidecars live in a hidden directory next to the file so they are never
+# mistaken for uploads
+PROFILE_DIR = ".profiles"
+
+# Columns whose cardinality is recorded; the default report join keys
+PROFILED_KEYS = ("refkey1", "refkey2")
+
+
+def profile_path(file_path: str) -> str:
+    """Get the path of a file's profile sidecar."""
+    directory, filename = os.path.split(file_path)
+    return os.path.join(directory, PROFILE_DIR, f"{filename}.json")
+
+
+def profile_file(file_path: str, join_keys: Sequence[str] = PROFILED_KEYS) -> FileProfile:
+    """
+    Stream a file once and collect its columns, dtypes, row count, null
+    counts and the cardinality of its join keys.
+
+    Dtypes are those pandas infers for the whole file, widened across
+    chunks the same way a single read would (int + float is float, anything
+    mixed with text is object).
+    """
+    stat = os.stat(file_path)
+    reader = get_reader(file_path)
+    columns = reader.columns(file_path)
+    keys = [key for key in join_keys if key in columns]
+    dtypes: Dict[str, str] = {}
+    null_counts = {column: 0 for column in columns}
+    distinct: Dict[str, Optional[Set[Any]]] = {key: set() for key in keys}
+    if len(keys) > 1:
+        distinct["+".join(keys)] = set()
+    row_count = 0
+
+    for chunk in reader.iter_chunks(file_path, settings.CHUNK_SIZE):
+        row_count += len(chunk)
+        for column, dtype in chunk.dtypes.items():
+            dtypes[column] = _widen(dtypes.get(column), str(dtype))
+        for column, count in chunk.isna().sum().items():
+            null_counts[column] = null_counts.get(column, 0) + int(count)
+        for key in keys:
+            _add_distinct(distinct, key, chunk[key].dropna().unique())
+        if len(keys) > 1:
+            combined = chunk[keys].dropna().drop_duplicates().itertuples(index=False, name=None)
+            _add_distinct(distinct, "+".join(keys), combined)
+
+    return FileProfile(
+        file_size=stat.st_size,
+        modified_ns=stat.st_mtime_ns,
+        columns=columns,
+        dtypes={column: dtypes.get(column, "object") for column in columns},
+        row_count=row_count,
+        null_counts=null_counts,
+        key_cardinality={key: len(values) if values is not None else None for key, values in distinct.items()}
+    )
+
+
+def profile_upload(file_path: str) -> Optional[FileProfile]:
+    """
+    Profile an uploaded file, write its sidecar and update its catalog entry.
+
+    Runs as a background task after the upload response is sent; a file that
+    cannot be parsed is left without a profile.
+    """
+    try:
+        profile = profile_file(file_path)
+    except Exception as e:
+        logger.warning("Upload profiling failed", file=os.path.basename(file_path), error=str(e))
+        return None
+
+    sidecar = profile_path(file_path)
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    temp_path = f"{sidecar}.part"
+    with open(temp_path, "w") as f:
+        f.write(profile.model_dump_json())
+    os.replace(temp_path, sidecar)
+
+    entry = file_catalog.get(os.path.basename(file_path))
+    if entry is not None:
+        file_catalog.add(entry.model_copy(update={
+            "row_count": profile.row_count,
+            "columns": profile.columns,
+            "profiled": True
+        }))
+    return profile
+
+
+def load_profile(file_path: str) -> Optional[FileProfile]:
+    """
+    Get the profile of a file, or None if it has none or the file has
+    changed since it was profiled.
+    """
+    try:
+        with open(profile_path(file_path)) as f:
+            profile = FileProfile.model_validate_json(f.read())
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+    if (profile.file_size, profile.modified_ns) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    return profile
+
+
+def remove_profile(file_path: str) -> None:
+    try:
+        os.remove(profile_path(file_path))
+    except FileNotFoundError:
+        pass
+
+
+def profiled_dtypes(file_path: str, columns: Optional[List[str]] = None) -> Optional[Dict[str, str]]:
+    """Get the profiled dtypes of a file's columns, or None if it has no current profile."""
+    profile = load_profile(file_path)
+    if profile is None:
+        return None
+    wanted = profile.columns if columns is None else columns
+    return {column: profile.dtypes[column] for column in wanted if column in profile.dtypes}
+
+
+def profiled_columns(file_path: str) -> Optional[List[str]]:
+    """
+    Get a file's columns from its profile, or from its catalog entry while
+    it has not been profiled, without reading the file.
+    """
+    profile = load_profile(file_path)
+    if profile is not None:
+        return profile.columns
+    entry = file_catalog.get(os.path.basename(file_path))
+    return entry.columns if entry is not None else None
+
+
+def joined_fields(
+    input_columns: Iterable[str],
+    reference_columns: Iterable[str],
+    join_keys: Sequence[str] = PROFILED_KEYS
+) -> Set[str]:
+    """
+    Get the fields of the joined rows a rule can reference.
+
+    Columns both files have, other than the join keys, appear with the
+    ``_x`` (input) and ``_y`` (reference) suffixes of the merge.
+    """
+    input_columns, reference_columns = set(input_columns), set(reference_columns)
+    overlap = (input_columns & reference_columns) - set(join_keys)
+    fields = (input_columns | reference_columns) - overlap
+    for column in overlap:
+        fields.update((f"{column}_x", f"{column}_y"))
+    return fields
+
+
+def _widen(current: Optional[str], dtype: str) -> str:
+    if current is None or current == dtype:
+        return dtype
+    if {current, dtype} <= {"int64", "float64"}:
+        return "float64"
+    return "object"
+
+
+def _add_distinct(distinct: Dict[str, Optional[Set[Any]]], key: str, values: Iterable[Any]) -> None:
+    # Stop counting once a key has too many values to hold in memory
+    seen = distinct[key]
+    if seen is None:
+        return
+    seen.update(values)
+    if len(seen) > settings.PROFILE_MAX_DISTINCT_KEYS:
+        distinct[key] = None
@@ -0,0 +1,467 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import re
+from itertools import islice
+from typing import IO, Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import settings
+
+
+class InputReader:
+    """
+    Reads an uploaded input or reference file, either whole or in chunks.
+
+    When ``columns`` is given only those columns are loaded (names missing
+    from the file are ignored). ``dtype`` maps column names to the pandas
+    dtype to use.
+    """
+
+    def columns(self, file_path: str) -> List[str]:
+        """Get the column names without reading any rows."""
+        raise NotImplementedError
+
+    def column_bytes(self, file_path: str) -> Dict[str, int]:
+        """Estimate how many bytes of the file each column takes up."""
+        columns = self.columns(file_path)
+        share = os.path.getsize(file_path) // max(len(columns), 1)
+        return {column: share for column in columns}
+
+    def sample_dtypes(self, file_path: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Get dtypes to pass explicitly so the reader can skip type inference."""
+        return {}
+
+    def read(
+        self,
+        file_path: str,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> pd.DataFrame:
+        chunks = list(self.iter_chunks(file_path, settings.CHUNK_SIZE, columns=columns, dtype=dtype))
+        if not chunks:
+            return pd.DataFrame(columns=_present(columns, self.columns(file_path)) or self.columns(file_path))
+        return pd.concat(chunks, ignore_index=True)
+
+    def iter_chunks(
+        self,
+        file_path: str,
+        chunk_size: int,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> Iterator[pd.DataFrame]:
+        raise NotImplementedError
+
+
+class CsvReader(InputReader):
+    """Parses CSV text with the pandas C parser."""
+
+    def columns(self, file_path: str) -> List[str]:
+        return list(pd.read_csv(file_path, nrows=0).columns)
+
+    def column_bytes(self, file_path: str) -> Dict[str, int]:
+        # Scale the text width of each column in a sample up to the file size
+        sample = pd.read_csv(
+            file_path,
+            nrows=settings.DTYPE_SAMPLE_ROWS,
+            dtype=str,
+            keep_default_na=False
+        )
+        widths = {column: int(sample[column].str.len().sum()) + len(sample) for column in sample.columns}
+        total = sum(widths.values()) or 1
+        file_size = os.path.getsize(file_path)
+        return {column: file_size * width // total for column, width in widths.items()}
+
+    def sample_dtypes(self, file_path: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        # Text columns are pinned to object so pandas does not try to parse
+        # them as numbers in every chunk. Numeric columns are left to
+        # inference, since a later chunk may hold values the sample did not.
+        sample = pd.read_csv(file_path, usecols=self._usecols(file_path, columns), nrows=settings.DTYPE_SAMPLE_ROWS)
+        return {column: object for column, dtype in sample.dtypes.items() if dtype == object}
+
+    def read(
+        self,
+        file_path: str,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> pd.DataFrame:
+        return pd.read_csv(file_path, usecols=self._usecols(file_path, columns), dtype=dtype)
+
+    def iter_chunks(
+        self,
+        file_path: str,
+        chunk_size: int,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> Iterator[pd.DataFrame]:
+        return iter(pd.read_csv(
+            file_path,
+            usecols=self._usecols(file_path, columns),
+            chunksize=chunk_size,
+            dtype=dtype
+        ))
+
+    def iter_chunks_in_range(
+        self,
+        file_path: str,
+        start: int,
+        end: int,
+        chunk_size: int,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Read the rows between two byte offsets in chunks.
+
+        ``start`` is 0 or the offset of the start of a line after the header,
+        and nothing past ``end`` is read even if the file grows meanwhile.
+        """
+        if start >= end:
+            return
+        header = self.columns(file_path)
+        with open(file_path, "rb") as f:
+            source = io.BufferedReader(_ByteRange(f, start, end))
+            yield from pd.read_csv(
+                source,
+                header=0 if start == 0 else None,
+                names=None if start == 0 else header,
+                usecols=self._usecols(file_path, columns),
+                chunksize=chunk_size,
+                dtype=dtype
+            )
+
+    def _usecols(self, file_path: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+        return _present(columns, self.columns(file_path))
+
+
+class ParquetReader(InputReader):
+    """Streams Parquet row groups as record batches of at most chunk_size rows."""
+
+    def columns(self, file_path: str) -> List[str]:
+        pq = _import_pyarrow("parquet")
+        return pq.ParquetFile(file_path).schema_arrow.names
+
+    def column_bytes(self, file_path: str) -> Dict[str, int]:
+        pq = _import_pyarrow("parquet")
+        metadata = pq.ParquetFile(file_path).metadata
+        sizes: Dict[str, int] = {}
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                name = column.path_in_schema.split(".")[0]
+                sizes[name] = sizes.get(name, 0) + column.total_compressed_size
+        return sizes
+
+    def read(
+        self,
+        file_path: str,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> pd.DataFrame:
+        pq = _import_pyarrow("parquet")
+        parquet_file = pq.ParquetFile(file_path)
+        table = parquet_file.read(columns=_present(columns, parquet_file.schema_arrow.names))
+        return _cast(table.to_pandas(), dtype)
+
+    def iter_chunks(
+        self,
+        file_path: str,
+        chunk_size: int,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> Iterator[pd.DataFrame]:
+        pq = _import_pyarrow("parquet")
+        parquet_file = pq.ParquetFile(file_path)
+        selected = _present(columns, parquet_file.schema_arrow.names)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=selected):
+            yield _cast(batch.to_pandas(), dtype)
+
+
+class FeatherReader(InputReader):
+    """Reads Arrow IPC (Feather v2) files through a memory map, one record batch at a time."""
+
+    def columns(self, file_path: str) -> List[str]:
+        pa = _import_pyarrow()
+        with pa.memory_map(file_path) as source:
+            return pa.ipc.open_file(source).schema.names
+
+    def read(
+        self,
+        file_path: str,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> pd.DataFrame:
+        pa = _import_pyarrow()
+        with pa.memory_map(file_path) as source:
+            reader = pa.ipc.open_file(source)
+            table = reader.read_all()
+            selected = _present(columns, reader.schema.names)
+            if selected is not None:
+                table = table.select(selected)
+            return _cast(table.to_pandas(), dtype)
+
+    def iter_chunks(
+        self,
+        file_path: str,
+        chunk_size: int,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> Iterator[pd.DataFrame]:
+        pa = _import_pyarrow()
+        with pa.memory_map(file_path) as source:
+            reader = pa.ipc.open_file(source)
+            selected = _present(columns, reader.schema.names)
+            for i in range(reader.num_record_batches):
+                table = pa.Table.from_batches([reader.get_batch(i)])
+                if selected is not None:
+                    table = table.select(selected)
+                for offset in range(0, table.num_rows, chunk_size):
+                    yield _cast(table.slice(offset, chunk_size).to_pandas(), dtype)
+
+
+class JsonReader(InputReader):
+    """
+    Streams JSON records. Newline-delimited files go through pandas'
+    ``lines=True, chunksize`` reader; a top-level array of records is
+    decoded one record at a time, so neither form is loaded whole.
+    """
+
+    def columns(self, file_path: str) -> List[str]:
+        for record in self._records(file_path):
+            return list(record)
+        return []
+
+    def iter_chunks(
+        self,
+        file_path: str,
+        chunk_size: int,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> Iterator[pd.DataFrame]:
+        if _is_json_array(file_path):
+            chunks = _record_chunks(self._records(file_path), chunk_size)
+        else:
+            chunks = pd.read_json(file_path, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+        for chunk in chunks:
+            selected = _present(columns, list(chunk.columns))
+            yield _cast(chunk[selected] if selected is not None else chunk, dtype)
+
+    def _records(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        if _is_json_array(file_path):
+            yield from _iter_json_array(file_path)
+            return
+        with open_input(file_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class ExcelReader(InputReader):
+    """Streams rows of the first worksheet through a read-only openpyxl workbook."""
+
+    def columns(self, file_path: str) -> List[str]:
+        with _open_worksheet_rows(file_path) as rows:
+            return [str(name) for name in next(rows, ())]
+
+    def iter_chunks(
+        self,
+        file_path: str,
+        chunk_size: int,
+        columns: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None
+    ) -> Iterator[pd.DataFrame]:
+        with _open_worksheet_rows(file_path) as rows:
+            header = [str(name) for name in next(rows, ())]
+            selected = _present(columns, header)
+            if selected is None:
+                selected = header
+            positions = [header.index(column) for column in selected]
+            while True:
+                batch = list(islice(rows, chunk_size))
+                if not batch:
+                    return
+                data = [[row[i] if i < len(row) else None for i in positions] for row in batch]
+                yield _cast(pd.DataFrame(data, columns=selected), dtype)
+
+
+_READERS: Dict[str, InputReader] = {
+    "csv": CsvReader(),
+    "json": JsonReader(),
+    "jsonl": JsonReader(),
+    "ndjson": JsonReader(),
+    "xlsx": ExcelReader(),
+    "parquet": ParquetReader(),
+    "feather": FeatherReader(),
+    "arrow": FeatherReader(),
+}
+
+SUPPORTED_EXTENSIONS = list(_READERS)
+
+# Compression suffixes an input may carry on top of its format extension
+# (data.csv.gz). Only formats that are read front to back can be streamed
+# through a decompressor; the others need random access.
+COMPRESSION_EXTENSIONS = ("gz", "bz2", "zst", "xz")
+STREAMABLE_EXTENSIONS = ("csv", "json", "jsonl", "ndjson")
+
+
+def split_extension(file_path: str) -> Tuple[str, Optional[str]]:
+    """
+    Get a file's format extension and compression suffix, e.g.
+    ``("csv", "gz")`` for ``data.csv.gz`` and ``("csv", None)`` for ``data.csv``.
+    """
+    root, extension = os.path.splitext(file_path)
+    extension = extension.lstrip(".").lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return os.path.splitext(root)[1].lstrip(".").lower(), extension
+    return extension, None
+
+
+def get_reader(file_path: str) -> InputReader:
+    """
+    Get the reader for a file based on its extension.
+    """
+    extension, compression = split_extension(file_path)
+    reader = _READERS.get(extension)
+    if reader is None:
+        raise ValueError(f"Unsupported input file format: {extension or file_path}")
+    if compression is not None and extension not in STREAMABLE_EXTENSIONS:
+        raise ValueError(f"Compressed {extension} inputs are not supported")
+    return reader
+
+
+def open_input(file_path: str, encoding: Optional[str] = None) -> IO:
+    """
+    Open an input file for reading, decompressing it on the fly if its name
+    has a compression suffix. Returns a text stream when ``encoding`` is given.
+    """
+    compression = split_extension(file_path)[1]
+    if compression == "gz":
+        raw = gzip.open(file_path, "rb")
+    elif compression == "bz2":
+        raw = bz2.open(file_path, "rb")
+    elif compression == "xz":
+        raw = lzma.open(file_path, "rb")
+    elif compression == "zst":
+        raw = _import_zstandard().open(file_path, "rb")
+    else:
+        raw = open(file_path, "rb")
+    return io.TextIOWrapper(raw, encoding=encoding) if encoding else raw
+
+
+def _present(columns: Optional[List[str]], available: List[str]) -> Optional[List[str]]:
+    if columns is None:
+        return None
+    wanted = set(columns)
+    return [column for column in available if column in wanted]
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of the bytes of an open file between two offsets."""
+
+    def __init__(self, file: BinaryIO, start: int, end: int):
+        self._file = file
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+
+class _open_worksheet_rows:
+    """Context manager yielding the value rows of a workbook's first sheet."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def __enter__(self) -> Iterator[tuple]:
+        from openpyxl import load_workbook
+
+        self._workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+        return self._workbook.worksheets[0].iter_rows(values_only=True)
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._workbook.close()
+
+
+_JSON_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def _is_json_array(file_path: str) -> bool:
+    with open_input(file_path, encoding="utf-8") as f:
+        while True:
+            char = f.read(1)
+            if not char or not char.isspace():
+                return char == "["
+
+
+def _iter_json_array(file_path: str, block_size: int = 1024 * 1024) -> Iterator[Dict[str, Any]]:
+    """Decode the records of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open_input(file_path, encoding="utf-8") as f:
+        buffer = f.read(block_size)
+        position = buffer.index("[") + 1
+        eof = False
+        while True:
+            position = _JSON_SEPARATOR.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                if position == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(block_size)
+                eof = not more
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield record
+
+
+def _record_chunks(records: Iterable[Dict[str, Any]], chunk_size: int) -> Iterator[pd.DataFrame]:
+    records = iter(records)
+    while True:
+        batch = list(islice(records, chunk_size))
+        if not batch:
+            return
+        yield pd.DataFrame.from_records(batch)
+
+
+def _cast(df: pd.DataFrame, dtype: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    if not dtype:
+        return df
+    return df.astype({column: value for column, value in dtype.items() if column in df.columns})
+
+
+def _import_pyarrow(module: Optional[str] = None) -> Any:
+    try:
+        import pyarrow
+        if module == "parquet":
+            import pyarrow.parquet
+            return pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ValueError("Parquet and Feather support requires the pyarrow package")
+
+
+def _import_zstandard() -> Any:
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise ValueError("Zstandard-compressed inputs require the zstandard package")
@@ -0,0 +1,173 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from pandas.api.extensions import ExtensionDtype, take
+
+from app.core.config import settings
+from app.middleware.metrics_middleware import (REFERENCE_CACHE_BYTES, REFERENCE_CACHE_EVICTIONS,
+                                               REFERENCE_CACHE_HITS, REFERENCE_CACHE_MISSES)
+from app.services.file_service import compute_file_hash
+from app.services.reader_service import get_reader
+
+DEFAULT_JOIN_KEYS = ("refkey1", "refkey2")
+
+
+class ReferenceCache:
+    """
+    In-process LRU cache of parsed reference data with a byte budget.
+
+    Entries are evicted least-recently-used first until the cache fits in
+    ``max_bytes``. An entry larger than the whole budget is never cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                REFERENCE_CACHE_MISSES.inc()
+                return None
+            self._entries.move_to_end(key)
+            REFERENCE_CACHE_HITS.inc()
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                REFERENCE_CACHE_EVICTIONS.inc()
+            REFERENCE_CACHE_BYTES.set(self.current_bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            REFERENCE_CACHE_BYTES.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+reference_cache = ReferenceCache(max_bytes=settings.REFERENCE_CACHE_MAX_BYTES)
+
+
+class ReferenceIndex:
+    """
+    Join index over reference data, built once per reference file.
+
+    The composite join key is hashed into a (Multi)Index mapped to row
+    positions, so joining a chunk is a single vectorized ``get_indexer``
+    lookup followed by a ``take`` per reference column. References with
+    duplicate keys fall back to a merge that expands the matching rows.
+    """
+
+    def __init__(self, reference_df: pd.DataFrame, join_keys: Sequence[str], unique: bool = False):
+        missing = [key for key in join_keys if key not in reference_df.columns]
+        if missing:
+            raise ValueError(f"Join key(s) missing from reference file: {', '.join(missing)}")
+
+        self.join_keys = list(join_keys)
+        self.index = _key_index(reference_df, self.join_keys)
+        self.payload = reference_df.drop(columns=self.join_keys).set_axis(self.index)
+        self.unique = unique or self.index.is_unique
+        if unique and not self.index.is_unique:
+            raise ValueError(f"Reference file has duplicate values for join keys: {', '.join(self.join_keys)}")
+
+        self._values = {
+            column: series.array if isinstance(series.dtype, ExtensionDtype) else series.to_numpy()
+            for column, series in self.payload.items()
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return _frame_size(self.payload)
+
+    def join(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Left-join a chunk of input rows with the reference data.
+
+        Matches the output of ``pd.merge(..., how="left")``: unmatched rows get
+        missing values and overlapping column names get ``_x``/``_y`` suffixes.
+        """
+        missing = [key for key in self.join_keys if key not in chunk.columns]
+        if missing:
+            raise ValueError(f"Join key(s) missing from input file: {', '.join(missing)}")
+
+        if not self.unique:
+            return pd.merge(chunk, self.payload, left_on=self.join_keys, right_index=True, how="left")
+
+        positions = self.index.get_indexer(_key_index(chunk, self.join_keys))
+        looked_up = pd.DataFrame(
+            {column: take(values, positions, allow_fill=True) for column, values in self._values.items()},
+            index=chunk.index
+        )
+
+        overlap = [column for column in looked_up.columns if column in chunk.columns]
+        if overlap:
+            chunk = chunk.rename(columns={column: f"{column}_x" for column in overlap})
+            looked_up = looked_up.rename(columns={column: f"{column}_y" for column in overlap})
+        return pd.concat([chunk, looked_up], axis=1)
+
+
+def _key_index(df: pd.DataFrame, join_keys: List[str]) -> pd.Index:
+    if len(join_keys) == 1:
+        return pd.Index(df[join_keys[0]])
+    return pd.MultiIndex.from_frame(df[join_keys])
+
+
+def load_reference(
+    reference_file_path: str,
+    join_keys: Sequence[str] = DEFAULT_JOIN_KEYS,
+    unique: bool = False,
+    columns: Optional[Sequence[str]] = None,
+    dtype: Optional[Dict[str, Any]] = None
+) -> ReferenceIndex:
+    """
+    Load the join index for a reference file, reusing a cached copy when the
+    file has not changed.
+
+    When ``columns`` is given only those columns (plus the join keys) are
+    read. The returned index is shared between reports and must not be
+    modified.
+    """
+    key = (
+        os.path.realpath(reference_file_path),
+        _file_fingerprint(reference_file_path),
+        tuple(join_keys),
+        unique,
+        tuple(sorted(columns)) if columns is not None else None,
+        tuple(sorted((dtype or {}).items(), key=lambda item: item[0])),
+    )
+    reference_index = reference_cache.get(key)
+    if reference_index is None:
+        if columns is not None:
+            columns = sorted(set(columns) | set(join_keys))
+        reference_df = get_reader(reference_file_path).read(reference_file_path, columns=columns, dtype=dtype)
+        reference_index = ReferenceIndex(reference_df, join_keys, unique)
+        reference_cache.put(key, reference_index, reference_index.nbytes)
+    return reference_index
+
+
+def _file_fingerprint(file_path: str) -> Hashable:
+    if settings.REFERENCE_CACHE_KEY == "hash":
+        return compute_file_hash(file_path)
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _frame_size(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
@@ -1,15 +1,37 @@
+import multiprocessing
 import os
 import time
 import uuid
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 import pandas as pd
+import structlog
 from fastapi import HTTPException
 
 from app.core.config import settings
-from app.models.report import FileFormat, ReportGenerationRequest, ReportMetadata, ReportStatus
-from app.services.rule_service import get_rule_set, parse_expression
+from app.models.report import (FileCatalogEntry, FileFormat, ProjectionStats, ReportGenerationRequest,
+                               ReportMetadata, ReportStatus)
+from app.services.catalog_service import file_catalog
+from app.services.file_service import compute_file_hash, get_latest_file
+from app.services.incremental_service import incremental_store, plan_incremental_run
+from app.services.metadata_service import report_store
+from app.services.output_service import open_report_writer
+from app.services.profile_service import profiled_dtypes
+from app.services.reader_service import CsvReader, InputReader, get_reader
+from app.services.reference_service import DEFAULT_JOIN_KEYS, ReferenceIndex, load_reference
+from app.services.result_cache_service import result_cache, result_cache_key
+from app.services.rule_service import CompiledRuleSet, compile_rules, get_compiled_rule_set, get_rule_set
+
+logger = structlog.get_logger()
+
+# Reference index and compiled rule sets for parallel chunk workers. They are set
+# before the worker pool forks, so workers inherit them instead of receiving
+# a pickled copy with every chunk.
+_chunk_worker_state: Dict[str, Any] = {}
 
 
 def generate_report(
@@ -19,11 +41,27 @@ def generate_report(
     """
     Generate a report by processing input and reference files with transformation rules.
     
-    This function handles the core report generation logic:
-    1. Load input and reference files
-    2. Apply transformation rules
-    3. Save the output file
-    4. Return metadata about the report
+    This is the synchronous path: it validates the request with
+    ``create_report_metadata`` and runs the job inline with ``run_report``.
+    The API enqueues the same job on the report queue instead.
+    """
+    report_metadata = create_report_metadata(request, username)
+    report_metadata = find_cached_report(report_metadata) or run_report(report_metadata)
+    report_store.save(report_metadata)
+    if report_metadata.status == ReportStatus.FAILED:
+        raise HTTPException(status_code=500, detail=f"Report generation failed: {report_metadata.error_message}")
+    return report_metadata
+
+
+def create_report_metadata(
+    request: ReportGenerationRequest,
+    username: str
+) -> ReportMetadata:
+    """
+    Validate a report request and build the metadata for a pending report job.
+    
+    Resolves the input and reference files and the rule set up front so a
+    bad request is rejected before anything is queued.
     """
     # Validate input files
     input_file_path = _get_latest_file("input") if not request.input_file else os.path.join(settings.UPLOAD_DIR, request.input_file)
@@ -40,60 +78,276 @@ def generate_report(
     # Create report metadata
     report_id = str(uuid.uuid4())
     output_filename = f"report_{report_id}.{request.output_format.value}"
-    output_file_path = os.path.join(settings.REPORTS_DIR, output_filename)
     
-    report_metadata = ReportMetadata(
+    return ReportMetadata(
         id=report_id,
         input_file=os.path.basename(input_file_path),
         reference_file=os.path.basename(reference_file_path),
         output_file=output_filename,
         output_format=request.output_format,
         rule_set_id=rule_set.version,
-        status=ReportStatus.PROCESSING,
+        status=ReportStatus.PENDING,
         start_time=datetime.now(),
         created_by=username,
-        rows_processed=0
+        rows_processed=0,
+        join_keys=request.join_keys,
+        reference_unique=request.reference_unique,
+        incremental=request.incremental
     )
+
+
+def find_cached_report(report_metadata: ReportMetadata) -> Optional[ReportMetadata]:
+    """
+    Complete a pending report from the result cache, if an identical report
+    was generated before.
+    
+    Returns the completed metadata on a hit and None otherwise.
+    """
+    if not settings.REPORT_CACHE_ENABLED or report_metadata.incremental:
+        return None
+    
+    start_time = time.time()
+    report_metadata.cache_key = result_cache_key(
+        report_metadata,
+        os.path.join(settings.UPLOAD_DIR, report_metadata.input_file),
+        os.path.join(settings.UPLOAD_DIR, report_metadata.reference_file),
+        get_rule_set(report_metadata.rule_set_id).rules
+    )
+    entry = result_cache.lookup(
+        report_metadata.cache_key,
+        os.path.join(settings.REPORTS_DIR, report_metadata.output_file)
+    )
+    if entry is None:
+        return None
+    
+    cached = report_metadata.model_copy()
+    cached.status = ReportStatus.COMPLETED
+    cached.end_time = datetime.now()
+    cached.processing_time_seconds = time.time() - start_time
+    cached.rows_processed = entry["rows_processed"]
+    cached.cached_from = entry["report_id"]
+    # The output is a link to the original report's file, so it has the same hash
+    original = file_catalog.get(f"report_{entry['report_id']}.{cached.output_format.value}")
+    _catalog_report(cached, sha256=original.sha256 if original else None)
+    return cached
+
+
+def run_report(report_metadata: ReportMetadata) -> ReportMetadata:
+    """
+    Run a report job described by its metadata.
+    
+    This is the CPU-bound part of report generation and runs in a report
+    queue worker process. Failures are recorded on the returned metadata
+    rather than raised, so the caller always gets the final job state.
+    """
+    report_metadata = report_metadata.model_copy()
+    report_metadata.status = ReportStatus.PROCESSING
+    report_metadata.start_time = datetime.now()
     
     try:
+        input_file_path = os.path.join(settings.UPLOAD_DIR, report_metadata.input_file)
+        reference_file_path = os.path.join(settings.UPLOAD_DIR, report_metadata.reference_file)
+        
+        # In incremental mode, only the input appended since the last run is processed
+        plan = None
+        if report_metadata.incremental:
+            plan = plan_incremental_run(
+                report_metadata,
+                input_file_path,
+                reference_file_path,
+                get_rule_set(report_metadata.rule_set_id).rules
+            )
+        
         # Process the files
+        output_file_path = os.path.join(settings.REPORTS_DIR, report_metadata.output_file)
         start_time = time.time()
-        rows_processed = _process_files(
+        rows_processed, projection = _process_files(
             input_file_path=input_file_path,
             reference_file_path=reference_file_path,
             output_file_path=output_file_path,
-            output_format=request.output_format,
-            rule_set=rule_set.rules
+            output_format=report_metadata.output_format,
+            rule_set=get_compiled_rule_set(report_metadata.rule_set_id),
+            join_keys=report_metadata.join_keys,
+            reference_unique=report_metadata.reference_unique,
+            input_byte_range=plan.byte_range if plan else None,
+            resume_from=os.path.join(settings.REPORTS_DIR, plan.base.output_file) if plan and plan.base else None
         )
         end_time = time.time()
         
+        # The output of an incremental run holds the earlier runs' rows too
+        row_count = rows_processed
+        if plan:
+            state = plan.state(report_metadata, input_file_path, rows_processed)
+            incremental_store.save(plan.key, state)
+            report_metadata.incremental_stats = plan.stats()
+            row_count = state.input_rows
+        
         # Update report metadata
         report_metadata.status = ReportStatus.COMPLETED
         report_metadata.end_time = datetime.now()
         report_metadata.processing_time_seconds = end_time - start_time
         report_metadata.rows_processed = rows_processed
+        report_metadata.projection = projection
+        _catalog_report(report_metadata, row_count, compute_file_hash(output_file_path))
         
-        return report_metadata
+        if settings.REPORT_CACHE_ENABLED and not report_metadata.incremental:
+            _cache_result(report_metadata, input_file_path, reference_file_path)
     
     except Exception as e:
         # Update report metadata with error
         report_metadata.status = ReportStatus.FAILED
         report_metadata.end_time = datetime.now()
-        report_metadata.error_message = str(e)
-        
-        # Re-raise the exception
-        raise HTTPException(status_code=500, detail=f"Report generation failed: {str(e)}")
+        report_metadata.error_message = str(e.detail) if isinstance(e, HTTPException) else str(e)
+    
+    return report_metadata
+
+
+def run_report_batch(reports: List[ReportMetadata]) -> List[ReportMetadata]:
+    """
+    Run report jobs that share a scan (see ``shared_scan_key``) in one pass.
+    
+    The input is read and joined with the reference once, and every
+    report's rule set is evaluated and written in its own output format
+    from that pass. Each report still gets its own metadata, output file,
+    catalog entry and result cache entry; if the pass fails, every report
+    fails with the same error.
+    """
+    if len(reports) == 1:
+        return [run_report(reports[0])]
+    
+    reports = [report_metadata.model_copy() for report_metadata in reports]
+    for report_metadata in reports:
+        report_metadata.status = ReportStatus.PROCESSING
+        report_metadata.start_time = datetime.now()
+    
+    first = reports[0]
+    input_file_path = os.path.join(settings.UPLOAD_DIR, first.input_file)
+    reference_file_path = os.path.join(settings.UPLOAD_DIR, first.reference_file)
+    try:
+        start_time = time.time()
+        rows_processed, projection = _process_shared_scan(
+            input_file_path,
+            reference_file_path,
+            [
+                (
+                    os.path.join(settings.REPORTS_DIR, report_metadata.output_file),
+                    report_metadata.output_format,
+                    get_compiled_rule_set(report_metadata.rule_set_id)
+                )
+                for report_metadata in reports
+            ],
+            join_keys=first.join_keys,
+            reference_unique=first.reference_unique
+        )
+        end_time = time.time()
+    except Exception as e:
+        error_message = str(e.detail) if isinstance(e, HTTPException) else str(e)
+        for report_metadata in reports:
+            report_metadata.status = ReportStatus.FAILED
+            report_metadata.end_time = datetime.now()
+            report_metadata.error_message = error_message
+        return reports
+    
+    for report_metadata in reports:
+        report_metadata.status = ReportStatus.COMPLETED
+        report_metadata.end_time = datetime.now()
+        report_metadata.processing_time_seconds = end_time - start_time
+        report_metadata.rows_processed = rows_processed
+        report_metadata.projection = projection
+        try:
+            output_file_path = os.path.join(settings.REPORTS_DIR, report_metadata.output_file)
+            _catalog_report(report_metadata, sha256=compute_file_hash(output_file_path))
+        except Exception as e:
+            logger.warning("report_catalog_failed", report_id=report_metadata.id, error=str(e))
+        if settings.REPORT_CACHE_ENABLED:
+            _cache_result(report_metadata, input_file_path, reference_file_path)
+    return reports
+
+
+def shared_scan_key(report_metadata: ReportMetadata) -> Optional[Tuple]:
+    """
+    Get what a report's scan depends on: reports with the same key read and
+    join the same data, whatever their rule sets and output formats.
+    Incremental reports resume their own earlier output, so they get None.
+    """
+    if report_metadata.incremental:
+        return None
+    return (
+        report_metadata.input_file,
+        report_metadata.reference_file,
+        tuple(report_metadata.join_keys),
+        report_metadata.reference_unique
+    )
+
+
+def group_shared_scans(reports: List[ReportMetadata]) -> List[List[ReportMetadata]]:
+    """Group reports that can run in one pass, keeping them in order."""
+    groups: Dict[Tuple, List[ReportMetadata]] = {}
+    batches = []
+    for report_metadata in reports:
+        key = shared_scan_key(report_metadata)
+        if key is None:
+            batches.append([report_metadata])
+        elif key in groups:
+            groups[key].append(report_metadata)
+        else:
+            groups[key] = [report_metadata]
+            batches.append(groups[key])
+    return batches
+
+
+def _cache_result(report_metadata: ReportMetadata, input_file_path: str, reference_file_path: str) -> None:
+    """Add a completed report to the result cache; a failure here does not fail the report."""
+    try:
+        # Keyed on the files as they are now, in case they changed while the job was queued
+        report_metadata.cache_key = result_cache_key(
+            report_metadata,
+            input_file_path,
+            reference_file_path,
+            get_rule_set(report_metadata.rule_set_id).rules
+        )
+        result_cache.store(
+            report_metadata.cache_key,
+            report_metadata,
+            os.path.join(settings.REPORTS_DIR, report_metadata.output_file)
+        )
+    except Exception as e:
+        logger.warning("report_cache_store_failed", report_id=report_metadata.id, error=str(e))
 
 
 def _get_latest_file(file_type: str) -> str:
     """Get the latest uploaded file of a specific type."""
-    files = [f for f in os.listdir(settings.UPLOAD_DIR) if f.startswith(file_type)]
-    if not files:
+    file_path = get_latest_file(file_type)
+    if file_path is None:
         raise HTTPException(status_code=404, detail=f"No {file_type} files found")
+    return file_path
+
+
+def _catalog_report(
+    report_metadata: ReportMetadata,
+    row_count: Optional[int] = None,
+    sha256: Optional[str] = None
+) -> None:
+    """
+    Index a completed report's output file in the file catalog.
     
-    # Sort by modification time (newest first)
-    files.sort(key=lambda f: os.path.getmtime(os.path.join(settings.UPLOAD_DIR, f)), reverse=True)
-    return os.path.join(settings.UPLOAD_DIR, files[0])
+    ``row_count`` is the number of rows in the file, if it is not the
+    report's ``rows_processed``. ``sha256`` is the output's hash, which
+    downloads use as the ETag; the worker that wrote the file hashes it so
+    the first download does not have to.
+    """
+    output_path = os.path.join(settings.REPORTS_DIR, report_metadata.output_file)
+    stat = os.stat(output_path)
+    file_catalog.add(FileCatalogEntry(
+        filename=report_metadata.output_file,
+        file_type="report",
+        file_size=stat.st_size,
+        uploaded_at=report_metadata.end_time or datetime.now(),
+        sha256=sha256,
+        modified_ns=stat.st_mtime_ns,
+        row_count=report_metadata.rows_processed if row_count is None else row_count,
+        columns=[rule.output_field for rule in get_rule_set(report_metadata.rule_set_id).rules]
+    ))
 
 
 def _process_files(
@@ -101,8 +355,12 @@ def _process_files(
     reference_file_path: str,
     output_file_path: str,
     output_format: FileFormat,
-    rule_set: List
-) -> int:
+    rule_set: Union[List, CompiledRuleSet],
+    join_keys: Sequence[str] = DEFAULT_JOIN_KEYS,
+    reference_unique: bool = False,
+    input_byte_range: Optional[Tuple[int, int]] = None,
+    resume_from: Optional[str] = None
+) -> Tuple[int, ProjectionStats]:
     """
     Process the input and reference files to generate the output file.
     
@@ -110,82 +368,219 @@ def _process_files(
     1. Reads input data in chunks to handle large files
     2. Merges with reference data
     3. Applies transformation rules
-    4. Writes output in the requested format
+    4. Streams each output chunk to disk in the requested format
+    
+    Only the columns the rules and the join reference are read from either
+    file. With ``input_byte_range`` only that part of a CSV input is read,
+    and with ``resume_from`` the output is appended to a copy of that report.
     
-    Returns the number of rows processed.
+    Returns the number of rows processed and the projection statistics.
     """
-    # Read reference data (assuming it fits in memory)
-    reference_df = pd.read_csv(reference_file_path)
+    return _process_shared_scan(
+        input_file_path,
+        reference_file_path,
+        [(output_file_path, output_format, rule_set)],
+        join_keys=join_keys,
+        reference_unique=reference_unique,
+        input_byte_range=input_byte_range,
+        resume_from=resume_from
+    )
+
+
+def _process_shared_scan(
+    input_file_path: str,
+    reference_file_path: str,
+    outputs: List[Tuple[str, FileFormat, Union[List, CompiledRuleSet]]],
+    join_keys: Sequence[str] = DEFAULT_JOIN_KEYS,
+    reference_unique: bool = False,
+    input_byte_range: Optional[Tuple[int, int]] = None,
+    resume_from: Optional[str] = None
+) -> Tuple[int, ProjectionStats]:
+    """
+    Write several outputs, each a (path, format, rule set), from one pass
+    over the input and reference files.
+    
+    The columns every rule set needs are read once, the reference index is
+    built once and each chunk is joined once; every distinct rule set is
+    then evaluated on the joined chunk and written to its outputs.
+    ``resume_from`` only makes sense with a single output.
+    """
+    # Compile the rules once so each chunk is transformed column-wise
+    # (outputs sharing a compiled rule set share its evaluation)
+    rule_sets: List[CompiledRuleSet] = []
+    positions: Dict[int, int] = {}
+    targets = []
+    for output_file_path, output_format, rule_set in outputs:
+        compiled_rules = rule_set if isinstance(rule_set, CompiledRuleSet) else compile_rules(rule_set)
+        if id(compiled_rules) not in positions:
+            positions[id(compiled_rules)] = len(rule_sets)
+            rule_sets.append(compiled_rules)
+        targets.append((output_file_path, output_format, positions[id(compiled_rules)]))
     
-    # Create an empty output dataframe for appending results
-    output_columns = [rule.output_field for rule in rule_set]
-    output_df = pd.DataFrame(columns=output_columns)
+    # Work out which columns of each file the rules and the join need
+    columns = sorted({column for compiled_rules in rule_sets for column in _referenced_columns(compiled_rules, join_keys)})
+    input_reader = get_reader(input_file_path)
+    projection = _projection_stats(input_file_path, reference_file_path, columns)
+    
+    # Build the reference join index once (assuming it fits in memory)
+    reference_index = load_reference(
+        reference_file_path,
+        join_keys,
+        unique=reference_unique,
+        columns=columns,
+        dtype=_profiled_csv_dtypes(get_reader(reference_file_path), reference_file_path, projection.reference_columns_read)
+    )
     
     # Process input file in chunks
     chunk_size = settings.CHUNK_SIZE
     total_rows = 0
     
-    # Read input file in chunks
-    for chunk in pd.read_csv(input_file_path, chunksize=chunk_size):
-        # Merge with reference data
-        merged_df = pd.merge(
-            chunk,
-            reference_df,
-            left_on=["refkey1", "refkey2"],
-            right_on=["refkey1", "refkey2"],
-            how="left"
-        )
-        
-        # Create output dataframe for this chunk
-        chunk_output = pd.DataFrame(columns=output_columns)
+    # Large inputs are transformed by a pool of chunk workers
+    workers = settings.PARALLEL_CHUNK_WORKERS
+    if os.path.getsize(input_file_path) < settings.PARALLEL_MIN_FILE_BYTES:
+        workers = 1
+    
+    with ExitStack() as stack:
+        # Output columns follow rule order
+        writers = [
+            (stack.enter_context(open_report_writer(
+                output_file_path,
+                output_format,
+                rule_sets[position].output_fields,
+                resume_from=resume_from
+            )), position)
+            for output_file_path, output_format, position in targets
+        ]
         
-        # Apply transformation rules
-        for rule in rule_set:
-            chunk_output[rule.output_field] = merged_df.apply(
-                lambda row: parse_expression(rule.expression, row),
-                axis=1
+        # Read the projected input columns in chunks
+        dtype = _profiled_csv_dtypes(input_reader, input_file_path, projection.input_columns_read)
+        if dtype is None:
+            dtype = input_reader.sample_dtypes(input_file_path, projection.input_columns_read)
+        if input_byte_range is not None:
+            chunks = input_reader.iter_chunks_in_range(
+                input_file_path,
+                *input_byte_range,
+                chunk_size,
+                columns=projection.input_columns_read,
+                dtype=dtype
+            )
+        else:
+            chunks = input_reader.iter_chunks(
+                input_file_path,
+                chunk_size,
+                columns=projection.input_columns_read,
+                dtype=dtype
             )
         
-        # Append to output
-        output_df = pd.concat([output_df, chunk_output])
-        
-        # Update row count
-        total_rows += len(chunk)
-    
-    # Write output file based on format
-    if output_format == FileFormat.CSV:
-        output_df.to_csv(output_file_path, index=False)
-    elif output_format == FileFormat.EXCEL:
-        output_df.to_excel(output_file_path, index=False)
-    elif output_format == FileFormat.JSON:
-        output_df.to_json(output_file_path, orient="records")
+        # Join with reference data, apply the rules and append to the outputs in input order
+        for rows, chunk_outputs in _transform_chunks(chunks, reference_index, rule_sets, workers):
+            for writer, position in writers:
+                writer.write(chunk_outputs[position])
+            
+            # Update row count
+            total_rows += rows
     
-    return total_rows
+    return total_rows, projection
 
 
-def get_report_metadata(report_id: str) -> Optional[ReportMetadata]:
-    """Get metadata for a specific report."""
-    # In a real implementation, this would retrieve from a database
-    # For now, we'll just check if the file exists
-    report_file = f"report_{report_id}.csv"
-    report_path = os.path.join(settings.REPORTS_DIR, report_file)
+def _profiled_csv_dtypes(reader: InputReader, file_path: str, columns: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Get the dtypes an upload profile recorded for a CSV file, so chunks are
+    parsed straight into them instead of being inferred one by one.
     
-    if not os.path.exists(report_path):
+    Other formats carry their own types, so they get None, as do files
+    without a current profile.
+    """
+    if not isinstance(reader, CsvReader):
         return None
+    return profiled_dtypes(file_path, columns)
+
+
+def _projection_stats(input_file_path: str, reference_file_path: str, columns: List[str]) -> ProjectionStats:
+    """
+    Split the columns of both files into read and skipped, and estimate how
+    many bytes of the files the skipped columns account for.
+    """
+    wanted = set(columns)
+    projection = ProjectionStats()
+    for file_path, side in ((input_file_path, "input"), (reference_file_path, "reference")):
+        reader = get_reader(file_path)
+        file_columns = reader.columns(file_path)
+        skipped = [column for column in file_columns if column not in wanted]
+        setattr(projection, f"{side}_columns_read", [column for column in file_columns if column in wanted])
+        setattr(projection, f"{side}_columns_skipped", skipped)
+        if skipped:
+            sizes = reader.column_bytes(file_path)
+            projection.bytes_skipped += sum(sizes.get(column, 0) for column in skipped)
+    return projection
+
+
+def _referenced_columns(compiled_rules: CompiledRuleSet, join_keys: Sequence[str]) -> List[str]:
+    """
+    Get the source columns a rule set needs, including the join keys.
     
-    # In a real implementation, we would retrieve the actual metadata
-    # For now, we'll just return a placeholder
-    return ReportMetadata(
-        id=report_id,
-        input_file="input.csv",
-        reference_file="reference.csv",
-        output_file=report_file,
-        output_format=FileFormat.CSV,
-        rule_set_id="default",
-        status=ReportStatus.COMPLETED,
-        start_time=datetime.fromtimestamp(os.path.getctime(report_path)),
-        end_time=datetime.fromtimestamp(os.path.getmtime(report_path)),
-        processing_time_seconds=10.0,
-        created_by="user",
-        rows_processed=1000
-    )
+    Rules may refer to ``name_x``/``name_y`` when the input and reference
+    share a column, so the unsuffixed name is needed as well.
+    """
+    columns = set(compiled_rules.fields) | set(join_keys)
+    for field in compiled_rules.fields:
+        if field.endswith(("_x", "_y")):
+            columns.add(field[:-2])
+    return sorted(columns)
+
+
+def _transform_chunks(
+    chunks: Iterable[pd.DataFrame],
+    reference_index: ReferenceIndex,
+    rule_sets: Sequence[CompiledRuleSet],
+    workers: int
+) -> Iterator[Tuple[int, List[pd.DataFrame]]]:
+    """
+    Join each chunk with the reference data and apply each rule set.
+    
+    With more than one worker, chunks are read here, transformed by a
+    forked process pool and yielded back in input order. At most
+    PARALLEL_MAX_INFLIGHT_CHUNKS chunks (default: two per worker) are in
+    flight, which bounds memory use.
+    
+    Yields the number of input rows and the output rows of each rule set
+    for each chunk.
+    """
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for chunk in chunks:
+            yield len(chunk), _evaluate(reference_index.join(chunk), rule_sets)
+        return
+    
+    max_inflight = settings.PARALLEL_MAX_INFLIGHT_CHUNKS or 2 * workers
+    _chunk_worker_state["reference_index"] = reference_index
+    _chunk_worker_state["rule_sets"] = rule_sets
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            inflight = deque()
+            for chunk in chunks:
+                inflight.append((len(chunk), executor.submit(_transform_chunk, chunk)))
+                if len(inflight) >= max_inflight:
+                    rows, future = inflight.popleft()
+                    yield rows, future.result()
+            while inflight:
+                rows, future = inflight.popleft()
+                yield rows, future.result()
+    finally:
+        _chunk_worker_state.clear()
+
+
+def _transform_chunk(chunk: pd.DataFrame) -> List[pd.DataFrame]:
+    """Transform one chunk in a parallel chunk worker."""
+    reference_index = _chunk_worker_state["reference_index"]
+    rule_sets = _chunk_worker_state["rule_sets"]
+    return _evaluate(reference_index.join(chunk), rule_sets)
+
+
+def _evaluate(joined: pd.DataFrame, rule_sets: Sequence[CompiledRuleSet]) -> List[pd.DataFrame]:
+    return [compiled_rules.evaluate(joined) for compiled_rules in rule_sets]
+
+
+def get_report_metadata(report_id: str) -> Optional[ReportMetadata]:
+    """Get metadata for a specific report."""
+    return report_store.get(report_id)
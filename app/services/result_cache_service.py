@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.database import ensure_schema
+from app.middleware.metrics_middleware import REPORT_CACHE_EVICTIONS, REPORT_CACHE_HITS, REPORT_CACHE_MISSES
+from app.models.report import ReportMetadata, TransformationRule
+from app.services.catalog_service import file_catalog
+from app.services.file_service import compute_file_hash
+from app.services.incremental_service import rules_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    key TEXT PRIMARY KEY,
+    report_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    rows_processed INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_result_cache_last_used ON result_cache (last_used_at);
+"""
+
+_UPSERT = """
+INSERT INTO result_cache (key, report_id, file_name, size, rows_processed, created_at, last_used_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    report_id = excluded.report_id,
+    file_name = excluded.file_name,
+    size = excluded.size,
+    rows_processed = excluded.rows_processed,
+    created_at = excluded.created_at,
+    last_used_at = excluded.last_used_at
+"""
+
+
+class ReportResultCache:
+    """
+    Content-addressed cache of report outputs.
+
+    Each entry is a hard link to a finished report under
+    ``REPORTS_DIR/.cache``, keyed on the content of the input and reference
+    files, the rules and the output format. A hit links the cached file to
+    the new report's output path, so no data is copied. Entries expire after
+    REPORT_CACHE_TTL_SECONDS, and the least recently used entries are evicted
+    once their total size exceeds REPORT_CACHE_MAX_BYTES.
+    """
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(settings.REPORTS_DIR, ".cache")
+
+    def lookup(self, key: str, output_path: str) -> Optional[dict]:
+        """
+        Link the cached output for ``key`` to ``output_path``.
+
+        Returns the cache entry, or None on a miss.
+        """
+        connection = ensure_schema("result_cache", _SCHEMA)
+        row = connection.execute("SELECT * FROM result_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row["created_at"] < time.time() - settings.REPORT_CACHE_TTL_SECONDS:
+            REPORT_CACHE_MISSES.inc()
+            return None
+
+        try:
+            _link(os.path.join(self.directory, row["file_name"]), output_path)
+        except FileNotFoundError:
+            self._delete([row])
+            REPORT_CACHE_MISSES.inc()
+            return None
+
+        connection.execute("UPDATE result_cache SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        REPORT_CACHE_HITS.inc()
+        return dict(row)
+
+    def store(self, key: str, report_metadata: ReportMetadata, output_path: str) -> None:
+        """Add a finished report to the cache and evict entries over budget."""
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"{key}.{report_metadata.output_format.value}"
+        cache_path = os.path.join(self.directory, file_name)
+        temp_path = f"{cache_path}.{os.getpid()}.part"
+        _link(output_path, temp_path)
+        os.replace(temp_path, cache_path)
+
+        now = time.time()
+        connection = ensure_schema("result_cache", _SCHEMA)
+        connection.execute(_UPSERT, (
+            key,
+            report_metadata.id,
+            file_name,
+            os.path.getsize(cache_path),
+            report_metadata.rows_processed,
+            now,
+            now
+        ))
+        self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used ones until the cache fits its quota."""
+        connection = ensure_schema("result_cache", _SCHEMA)
+        expired = connection.execute(
+            "SELECT * FROM result_cache WHERE created_at < ?",
+            (time.time() - settings.REPORT_CACHE_TTL_SECONDS,)
+        ).fetchall()
+        self._delete(expired)
+
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+        if total <= settings.REPORT_CACHE_MAX_BYTES:
+            return
+        evicted = []
+        for row in connection.execute("SELECT * FROM result_cache ORDER BY last_used_at"):
+            if total <= settings.REPORT_CACHE_MAX_BYTES:
+                break
+            evicted.append(row)
+            total -= row["size"]
+        self._delete(evicted)
+
+    def _delete(self, rows: List) -> None:
+        if not rows:
+            return
+        connection = ensure_schema("result_cache", _SCHEMA)
+        connection.executemany("DELETE FROM result_cache WHERE key = ?", [(row["key"],) for row in rows])
+        for row in rows:
+            try:
+                os.remove(os.path.join(self.directory, row["file_name"]))
+            except FileNotFoundError:
+                pass
+        REPORT_CACHE_EVICTIONS.inc(len(rows))
+
+
+result_cache = ReportResultCache()
+
+
+def result_cache_key(
+    report_metadata: ReportMetadata,
+    input_file_path: str,
+    reference_file_path: str,
+    rules: List[TransformationRule]
+) -> str:
+    """
+    Key a report on the content of its inputs, its rules and its output format.
+    """
+    content = json.dumps([
+        _content_hash(input_file_path),
+        _content_hash(reference_file_path),
+        rules_hash(rules, report_metadata.join_keys, report_metadata.reference_unique),
+        report_metadata.output_format.value,
+    ])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _content_hash(file_path: str) -> str:
+    # Uploads are hashed as they are written; the recorded hash is used as
+    # long as the file's size and mtime show it has not changed since
+    stat = os.stat(file_path)
+    entry = file_catalog.get(os.path.basename(file_path))
+    if (entry is not None and entry.sha256 is not None and entry.file_size == stat.st_size
+            and entry.modified_ns == stat.st_mtime_ns):
+        return entry.sha256
+    return _hash_file_version(os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=1024)
+def _hash_file_version(file_path: str, mtime_ns: int, size: int) -> str:
+    # Memoized on mtime and size so an unchanged file is hashed once per process
+    return compute_file_hash(file_path)
+
+
+def _link(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # Hard links are not supported on every filesystem
+        shutil.copyfile(source, target)
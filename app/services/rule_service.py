@@ -1,44 +1,168 @@
 import os
 import re
+import threading
+from collections import Counter
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
 
+import pandas as pd
 import yaml
 from fastapi import HTTPException
 
 from app.core.config import settings
 from app.models.report import TransformationRule, TransformationRuleSet
+from app.services.expression_service import Expression, ExpressionError, parse
+
+
+class RuleSetRegistry:
+    """
+    In-memory registry of the rule sets stored in ``RULES_FILE``.
+
+    The YAML file is parsed once and re-read only when its mtime or size
+    changes, or after ``update_rule_set`` rewrites it. The rule set model and
+    the compiled rules of each version are built once and then reused, so
+    they are shared between callers and must not be modified.
+    """
+
+    def __init__(self):
+        self._fingerprint: Optional[Tuple[str, int, int]] = None
+        self._raw: Dict[str, Any] = {}
+        self._rule_sets: Dict[str, TransformationRuleSet] = {}
+        self._compiled: Dict[str, "CompiledRuleSet"] = {}
+        self._latest: Optional[str] = None
+        self._lock = threading.RLock()
+
+    def versions(self) -> Dict[str, Any]:
+        """Get the raw rule set data of every version, keyed by version."""
+        with self._lock:
+            self._refresh()
+            return dict(self._raw)
+
+    def latest_version(self) -> Optional[str]:
+        """Get the version with the most recent ``updated_at``."""
+        with self._lock:
+            self._refresh()
+            if self._latest is None and self._raw:
+                self._latest = max(
+                    self._raw,
+                    key=lambda version: (self.get(version).updated_at.timestamp(), version)
+                )
+            return self._latest
+
+    def get(self, version: str) -> TransformationRuleSet:
+        """Get the rule set of a version."""
+        with self._lock:
+            self._refresh()
+            rule_set = self._rule_sets.get(version)
+            if rule_set is None:
+                if version not in self._raw:
+                    raise HTTPException(status_code=404, detail=f"Rule set not found: {version}")
+                rule_set = _to_rule_set(version, self._raw[version])
+                self._rule_sets[version] = rule_set
+            return rule_set
+
+    def get_compiled(self, version: str) -> "CompiledRuleSet":
+        """Get the compiled rules of a version."""
+        with self._lock:
+            rule_set = self.get(version)
+            compiled = self._compiled.get(version)
+            if compiled is None:
+                compiled = compile_rules(rule_set.rules)
+                self._compiled[version] = compiled
+            return compiled
+
+    def invalidate(self) -> None:
+        """Drop everything cached so the file is parsed again on next use."""
+        with self._lock:
+            self._fingerprint = None
+            self._raw = {}
+            self._rule_sets = {}
+            self._compiled = {}
+            self._latest = None
+
+    def _refresh(self) -> None:
+        path = settings.RULES_FILE
+        try:
+            stat = os.stat(path)
+            fingerprint = (path, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            fingerprint = (path, 0, -1)
+        if fingerprint == self._fingerprint:
+            return
+
+        self.invalidate()
+        if fingerprint[2] >= 0:
+            with open(path, "r") as f:
+                self._raw = yaml.safe_load(f) or {}
+        self._fingerprint = fingerprint
+
+
+rule_registry = RuleSetRegistry()
 
 
 def get_rule_set(rule_set_id: Optional[str] = None) -> TransformationRuleSet:
     """
-    Get a rule set by ID. If no ID is provided, return the default rule set.
+    Get a rule set by ID. If no ID is provided, return the latest rule set.
     """
     # If no rules file exists, create the default one
-    if not os.path.exists(settings.RULES_FILE):
+    if not os.path.exists(settings.RULES_FILE) or (not rule_set_id and not rule_registry.versions()):
         _create_default_rules()
     
-    # Load all rule sets
-    with open(settings.RULES_FILE, "r") as f:
-        rule_sets = yaml.safe_load(f) or {}
+    return rule_registry.get(rule_set_id or rule_registry.latest_version())
+
+
+def get_compiled_rule_set(rule_set_id: Optional[str] = None) -> "CompiledRuleSet":
+    """
+    Get the compiled rules of a rule set. If no ID is provided, use the latest rule set.
+    """
+    return rule_registry.get_compiled(get_rule_set(rule_set_id).version)
+
+
+def update_rule_set(rule_set: TransformationRuleSet) -> TransformationRuleSet:
+    """
+    Update an existing rule set or create a new one.
+    """
+    # Reject rule sets whose rules reference each other in a cycle
+    try:
+        compile_rules(rule_set.rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # If no rule set ID is provided, use the latest one
-    if not rule_set_id:
-        if not rule_sets:
-            _create_default_rules()
-            with open(settings.RULES_FILE, "r") as f:
-                rule_sets = yaml.safe_load(f) or {}
+    with rule_registry._lock:
+        # Load existing rule sets
+        rule_sets = rule_registry.versions()
         
-        # Get the latest version
-        latest_version = max(rule_sets.keys())
-        rule_set_id = latest_version
-    
-    # Check if the rule set exists
-    if rule_set_id not in rule_sets:
-        raise HTTPException(status_code=404, detail=f"Rule set not found: {rule_set_id}")
+        # Create new version if not updating an existing one
+        version = rule_set.version
+        if not version or version not in rule_sets:
+            # Generate a new version based on timestamp
+            version = datetime.now().strftime("%Y%m%d%H%M%S")
+            rule_set.version = version
+        
+        # Update the rule set
+        rule_sets[version] = {
+            "rules": [
+                {
+                    "output_field": rule.output_field,
+                    "expression": rule.expression,
+                    "description": rule.description
+                }
+                for rule in rule_set.rules
+            ],
+            "updated_at": rule_set.updated_at.isoformat()
+        }
+        
+        # Save to file, replacing it atomically so readers never see a partial write
+        temp_path = f"{settings.RULES_FILE}.part"
+        with open(temp_path, "w") as f:
+            yaml.dump(rule_sets, f)
+        os.replace(temp_path, settings.RULES_FILE)
+        rule_registry.invalidate()
     
-    # Convert to model
-    rules_data = rule_sets[rule_set_id]
+    return rule_set
+
+
+def _to_rule_set(version: str, rules_data: Dict[str, Any]) -> TransformationRuleSet:
     rules = [
         TransformationRule(
             output_field=rule["output_field"],
@@ -50,49 +174,11 @@ def get_rule_set(rule_set_id: Optional[str] = None) -> TransformationRuleSet:
     
     return TransformationRuleSet(
         rules=rules,
-        version=rule_set_id,
+        version=version,
         updated_at=datetime.fromisoformat(rules_data["updated_at"])
     )
 
 
-def update_rule_set(rule_set: TransformationRuleSet) -> TransformationRuleSet:
-    """
-    Update an existing rule set or create a new one.
-    """
-    # Load existing rule sets
-    if os.path.exists(settings.RULES_FILE):
-        with open(settings.RULES_FILE, "r") as f:
-            rule_sets = yaml.safe_load(f) or {}
-    else:
-        rule_sets = {}
-    
-    # Create new version if not updating an existing one
-    version = rule_set.version
-    if not version or version not in rule_sets:
-        # Generate a new version based on timestamp
-        version = datetime.now().strftime("%Y%m%d%H%M%S")
-        rule_set.version = version
-    
-    # Update the rule set
-    rule_sets[version] = {
-        "rules": [
-            {
-                "output_field": rule.output_field,
-                "expression": rule.expression,
-                "description": rule.description
-            }
-            for rule in rule_set.rules
-        ],
-        "updated_at": rule_set.updated_at.isoformat()
-    }
-    
-    # Save to file
-    with open(settings.RULES_FILE, "w") as f:
-        yaml.dump(rule_sets, f)
-    
-    return rule_set
-
-
 def _create_default_rules() -> None:
     """
     Create the default transformation rules based on the requirements.
@@ -136,47 +222,135 @@ def _create_default_rules() -> None:
 
 def parse_expression(expression: str, row: Dict[str, Any]) -> Any:
     """
-    Parse and evaluate a transformation rule expression.
-    
-    This is a simplified expression parser that supports:
-    - Field references (e.g., field1, refdata1)
-    - Basic operations (+, -, *, /)
-    - Function calls (max, min, etc.)
+    Parse and evaluate a transformation rule expression for a single row.
     
-    In a production environment, this would be replaced with a more robust
-    expression parser or a rules engine.
-    """
-    # Replace field references with dictionary lookups
-    modified_expression = expression
-    for field in re.findall(r'[a-zA-Z_][a-zA-Z0-9_]*', expression):
-        if field in row and field not in ['max', 'min']:
-            # Get the value from the row
-            value = row[field]
-            
-            # If the value is a string, wrap it in quotes
-            if isinstance(value, str):
-                replacement = f"'{value}'"
-            else:
-                replacement = str(value)
-            
-            # Replace the field with its value
-            modified_expression = re.sub(r'\b' + field + r'\b', replacement, modified_expression)
-    
-    # Evaluate the expression
+    Supports field references (e.g., field1, refdata1), basic operations
+    (+, -, *, /) and function calls (max, min, etc.); see
+    ``app/services/expression_service.py``. Errors are returned as an
+    ``"Error: ..."`` string so one bad row does not fail the whole report.
+    """
     try:
-        # Define safe functions
-        safe_dict = {
-            'max': max,
-            'min': min,
-            'len': len,
-            'str': str,
-            'int': int,
-            'float': float
-        }
-        
-        # Evaluate the expression in a safe context
-        result = eval(modified_expression, {"__builtins__": {}}, safe_dict)
-        return result
-    except Exception as e:
-        # In a production environment, we would log this error
+        return parse(expression).evaluate_row(row)
+    except ExpressionError as e:
         return f"Error: {str(e)}"
+
+
+class CompiledRuleSet:
+    """
+    A rule set compiled into column-wise pandas/NumPy operations.
+
+    The rules form a DAG: identical sub-expressions across rules (e.g.
+    ``max(field5, refdata4)``) are computed once per chunk, and a rule may use
+    another rule's ``output_field`` as a field, in which case it is evaluated
+    after that rule. A rule that names its own output field reads the input
+    column of that name.
+    """
+
+    def __init__(self, rules: List[TransformationRule]):
+        self.rules = rules
+        self.fields: Set[str] = set()
+        outputs = {rule.output_field: i for i, rule in enumerate(rules)}
+
+        expressions: List[Optional[Expression]] = []
+        self._dependencies: List[Dict[str, Hashable]] = []
+        for i, rule in enumerate(rules):
+            try:
+                expression = parse(rule.expression)
+                names = expression.fields
+            except ExpressionError:
+                # Reported per row by parse_expression when the rule is applied
+                expression = None
+                names = set(re.findall(r'[a-zA-Z_][a-zA-Z0-9_]*', rule.expression))
+            dependencies = {
+                name: ("output", outputs[name]) for name in names
+                if name in outputs and outputs[name] != i
+            }
+            self.fields.update(name for name in names if name not in dependencies)
+            expressions.append(expression)
+            self._dependencies.append(dependencies)
+
+        self._order = _topological_order(rules, self._dependencies)
+
+        # Sub-expressions that occur more than once are evaluated once per chunk
+        counts = Counter(
+            key
+            for expression, dependencies in zip(expressions, self._dependencies) if expression is not None
+            for key in set(expression.subexpression_keys(dependencies))
+        )
+        shared = {key for key, count in counts.items() if count > 1}
+        self._evaluators = [
+            expression.compile_shared(shared, dependencies) if expression is not None else None
+            for expression, dependencies in zip(expressions, self._dependencies)
+        ]
+
+    @property
+    def output_fields(self) -> List[str]:
+        return [rule.output_field for rule in self.rules]
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply every rule to a chunk and return the output columns.
+
+        A rule whose vectorized form fails on the chunk (e.g. a missing field
+        or incompatible dtypes) falls back to row-wise evaluation, so the
+        error is reported on the rows it affects.
+        """
+        memo: Dict[Hashable, Any] = {}
+        results: Dict[int, pd.Series] = {}
+        for i in self._order:
+            rule = self.rules[i]
+            dependencies = self._dependencies[i]
+            try:
+                if self._evaluators[i] is None:
+                    raise ExpressionError(rule.expression)
+                result = self._evaluators[i](df, memo)
+            except ExpressionError:
+                rows = df.assign(**{name: memo[key] for name, key in dependencies.items()})
+                result = pd.Series(
+                    [parse_expression(rule.expression, row) for row in rows.to_dict("records")],
+                    index=df.index
+                )
+            if not isinstance(result, pd.Series):
+                result = pd.Series(result, index=df.index)
+            memo[("output", i)] = result
+            results[i] = result
+
+        output = pd.DataFrame(index=df.index)
+        for i, rule in enumerate(self.rules):
+            output[rule.output_field] = results[i]
+        return output
+
+
+def compile_rules(rules: List[TransformationRule]) -> CompiledRuleSet:
+    """
+    Compile a list of transformation rules into vectorized operations.
+    """
+    return CompiledRuleSet(rules)
+
+
+def _topological_order(rules: List[TransformationRule], dependencies: List[Dict[str, Hashable]]) -> List[int]:
+    """
+    Order rules so that every rule comes after the rules whose output it uses.
+
+    Raises ValueError if the references form a cycle.
+    """
+    order: List[int] = []
+    state: Dict[int, str] = {}
+
+    def visit(i: int, path: List[int]) -> None:
+        if state.get(i) == "done":
+            return
+        if state.get(i) == "visiting":
+            cycle = path[path.index(i):] + [i]
+            raise ValueError(
+                "Rule references form a cycle: " + " -> ".join(rules[j].output_field for j in cycle)
+            )
+        state[i] = "visiting"
+        for _, key in sorted(dependencies[i].items()):
+            visit(key[1], path + [i])
+        state[i] = "done"
+        order.append(i)
+
+    for i in range(len(rules)):
+        visit(i, [])
+    return order
@@ -1,89 +1,228 @@
+import copy
+import heapq
+import itertools
 import os
+import threading
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 import yaml
 from croniter import croniter
 
 from app.core.config import settings
-from app.models.report import ReportGenerationRequest, Schedule, ScheduleType
+from app.core.database import ensure_schema, get_database_path
+from app.models.report import MisfirePolicy, ReportGenerationRequest, Schedule, ScheduleType
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    id TEXT PRIMARY KEY,
+    enabled INTEGER NOT NULL,
+    next_run TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_schedules_next_run ON schedules (enabled, next_run);
+CREATE TABLE IF NOT EXISTS schedule_revision (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    revision INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO schedule_revision (id, revision) VALUES (0, 0);
+CREATE TABLE IF NOT EXISTS schedule_imports (
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (path, mtime_ns, size)
+);
+"""
+
+_BUMP_REVISION = "UPDATE schedule_revision SET revision = revision + 1"
+
+_UPSERT = """
+INSERT INTO schedules (id, enabled, next_run, data)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    enabled = excluded.enabled,
+    next_run = excluded.next_run,
+    data = excluded.data
+"""
+
+
+class ScheduleStore:
+    """
+    SQLite-backed schedule repository.
+
+    Each schedule is one row, so lookups are keyed and writes touch only the
+    schedule being changed. Read-modify-write updates run in an immediate
+    transaction, so concurrent writers (API requests, the scheduler, other
+    processes) never lose each other's changes. Schedules in the legacy
+    ``SCHEDULES_FILE`` YAML file are imported the first time the store is
+    used; each version of the file is imported once.
+
+    Every change to the schedules bumps a revision number, so a process can
+    tell cheaply whether the schedules changed since it last loaded them.
+    Recording a run does not bump it: only the node firing a schedule
+    records its runs, and that node already knows them.
+    """
+
+    def __init__(self):
+        self._imported: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def get(self, schedule_id: str) -> Optional[Schedule]:
+        """Get a schedule by ID."""
+        row = self._connection().execute("SELECT data FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+        return _to_schedule(row["data"]) if row else None
+
+    def list(self) -> List[Schedule]:
+        """Get all schedules, oldest first."""
+        rows = self._connection().execute("SELECT data FROM schedules ORDER BY rowid").fetchall()
+        return [_to_schedule(row["data"]) for row in rows]
+
+    def list_due(self, until: Optional[datetime] = None) -> List[Schedule]:
+        """Get the enabled schedules with a next run (up to ``until``), soonest first."""
+        query = "SELECT data FROM schedules WHERE enabled = 1 AND next_run IS NOT NULL"
+        params: tuple = ()
+        if until is not None:
+            query += " AND next_run <= ?"
+            params = (until.isoformat(),)
+        rows = self._connection().execute(query + " ORDER BY next_run", params).fetchall()
+        return [_to_schedule(row["data"]) for row in rows]
+
+    def revision(self) -> int:
+        """Get the revision number of the schedules."""
+        return self._connection().execute("SELECT revision FROM schedule_revision").fetchone()[0]
+
+    def save(self, schedule: Schedule) -> None:
+        """Add or replace a schedule."""
+        self.save_many([schedule])
+
+    def save_many(self, schedules: List[Schedule]) -> None:
+        """Add or replace several schedules in one transaction."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(_UPSERT, [_row(schedule) for schedule in schedules])
+            connection.execute(_BUMP_REVISION)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def update(
+        self,
+        schedule_id: str,
+        change: Callable[[Schedule], None],
+        bump_revision: bool = True
+    ) -> Optional[Schedule]:
+        """
+        Apply ``change`` to a schedule and save it, atomically.
+
+        Returns the updated schedule, or None if there is no such schedule.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT data FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+            schedule = _to_schedule(row["data"]) if row else None
+            if schedule is not None:
+                change(schedule)
+                connection.execute(_UPSERT, _row(schedule))
+                if bump_revision:
+                    connection.execute(_BUMP_REVISION)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return schedule
+
+    def delete(self, schedule_id: str) -> bool:
+        """Delete a schedule; returns whether it existed."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = connection.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,)).rowcount > 0
+            if deleted:
+                connection.execute(_BUMP_REVISION)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def _connection(self):
+        connection = ensure_schema("schedules", _SCHEMA)
+        key = (get_database_path(), os.path.realpath(settings.SCHEDULES_FILE))
+        if key not in self._imported:
+            with self._lock:
+                if key not in self._imported:
+                    self._import_legacy_file(connection)
+                    self._imported.add(key)
+        return connection
+
+    def _import_legacy_file(self, connection) -> None:
+        path = os.path.realpath(settings.SCHEDULES_FILE)
+        if not os.path.exists(path):
+            return
+        stat = os.stat(path)
+        version = (path, stat.st_mtime_ns, stat.st_size)
+        if connection.execute(
+            "SELECT 1 FROM schedule_imports WHERE path = ? AND mtime_ns = ? AND size = ?", version
+        ).fetchone():
+            return
+        with open(path) as f:
+            schedules = parse_schedules_yaml(f.read())
+        # Schedules already in the store win over the file
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT OR IGNORE INTO schedules (id, enabled, next_run, data) VALUES (?, ?, ?, ?)",
+                [_row(schedule) for schedule in schedules]
+            )
+            connection.execute("INSERT OR IGNORE INTO schedule_imports (path, mtime_ns, size) VALUES (?, ?, ?)", version)
+            connection.execute(_BUMP_REVISION)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+
+schedule_store = ScheduleStore()
 
 
 def get_schedules() -> List[Schedule]:
     """
     Get all schedules.
     """
-    # If no schedules file exists, create an empty one
-    if not os.path.exists(settings.SCHEDULES_FILE):
-        with open(settings.SCHEDULES_FILE, "w") as f:
-            yaml.dump({}, f)
-    
-    # Load schedules
-    with open(settings.SCHEDULES_FILE, "r") as f:
-        schedules_data = yaml.safe_load(f) or {}
-    
-    # Convert to models
-    schedules = []
-    for schedule_id, data in schedules_data.items():
-        schedule = Schedule(
-            id=schedule_id,
-            name=data["name"],
-            schedule_type=data["schedule_type"],
-            expression=data["expression"],
-            enabled=data["enabled"],
-            last_run=data.get("last_run"),
-            next_run=data.get("next_run"),
-            created_at=datetime.fromisoformat(data["created_at"]),
-            updated_at=datetime.fromisoformat(data["updated_at"])
-        )
-        
-        # Update next run time if it's a cron schedule
-        if schedule.schedule_type == ScheduleType.CRON and schedule.enabled:
-            base_time = schedule.last_run or datetime.now()
-            try:
-                cron = croniter(schedule.expression, base_time)
-                schedule.next_run = cron.get_next(datetime)
-            except Exception:
-                # Invalid cron expression
-                schedule.enabled = False
-        
-        schedules.append(schedule)
-    
-    return schedules
+    return schedule_store.list()
 
 
 def get_schedule(schedule_id: str) -> Optional[Schedule]:
     """
     Get a schedule by ID.
     """
-    schedules = get_schedules()
-    for schedule in schedules:
-        if schedule.id == schedule_id:
-            return schedule
-    return None
+    return schedule_store.get(schedule_id)
 
 
 def create_schedule(
     name: str,
     schedule_type: ScheduleType,
     expression: str,
-    report_request: ReportGenerationRequest
+    report_request: ReportGenerationRequest,
+    created_by: Optional[str] = None,
+    misfire_policy: MisfirePolicy = MisfirePolicy.RUN_ONCE,
+    max_concurrent_runs: int = 1
 ) -> Schedule:
     """
     Create a new schedule.
+
+    Raises ValueError if the expression is not valid for the schedule type
+    or the misfire policy does not fit ``max_concurrent_runs``.
     """
-    # Validate cron expression if it's a cron schedule
-    if schedule_type == ScheduleType.CRON:
-        try:
-            croniter(expression, datetime.now())
-        except Exception as e:
-            raise ValueError(f"Invalid cron expression: {str(e)}")
-    
     # Create new schedule
     schedule_id = str(uuid.uuid4())
     now = datetime.now()
-    
+
     schedule = Schedule(
         id=schedule_id,
         name=name,
@@ -91,24 +230,20 @@ def create_schedule(
         expression=expression,
         enabled=True,
         created_at=now,
-        updated_at=now
+        updated_at=now,
+        report_request=report_request,
+        created_by=created_by,
+        misfire_policy=misfire_policy,
+        max_concurrent_runs=max_concurrent_runs
     )
-    
-    # Calculate next run time
-    if schedule_type == ScheduleType.CRON:
-        cron = croniter(expression, now)
-        schedule.next_run = cron.get_next(datetime)
-    elif schedule_type == ScheduleType.INTERVAL:
-        # Expression is interval in seconds
-        interval_seconds = int(expression)
-        schedule.next_run = now.timestamp() + interval_seconds
-    elif schedule_type == ScheduleType.ONE_TIME:
-        # Expression is ISO datetime
-        schedule.next_run = datetime.fromisoformat(expression)
-    
+
+    # Calculate next run time (this also validates the expression)
+    check_run_limits(schedule)
+    schedule.next_run = compute_next_run(schedule, now)
+
     # Save schedule
-    _save_schedule(schedule, report_request)
-    
+    schedule_store.save(schedule)
+
     return schedule
 
 
@@ -118,104 +253,292 @@ def update_schedule(
     schedule_type: Optional[ScheduleType] = None,
     expression: Optional[str] = None,
     enabled: Optional[bool] = None,
-    report_request: Optional[ReportGenerationRequest] = None
+    report_request: Optional[ReportGenerationRequest] = None,
+    misfire_policy: Optional[MisfirePolicy] = None,
+    max_concurrent_runs: Optional[int] = None
 ) -> Optional[Schedule]:
     """
     Update an existing schedule.
+
+    Raises ValueError, leaving the schedule unchanged, if the new timing is
+    not valid for the schedule type or the misfire policy does not fit
+    ``max_concurrent_runs``.
     """
-    # Get existing schedule
-    schedule = get_schedule(schedule_id)
-    if not schedule:
-        return None
-    
-    # Update fields
-    if name is not None:
-        schedule.name = name
-    if schedule_type is not None:
-        schedule.schedule_type = schedule_type
-    if expression is not None:
-        schedule.expression = expression
-    if enabled is not None:
-        schedule.enabled = enabled
-    
-    # Update next run time
-    if schedule.enabled and (schedule_type is not None or expression is not None):
-        if schedule.schedule_type == ScheduleType.CRON:
-            try:
-                cron = croniter(schedule.expression, datetime.now())
-                schedule.next_run = cron.get_next(datetime)
-            except Exception:
-                # Invalid cron expression
-                schedule.enabled = False
-        elif schedule.schedule_type == ScheduleType.INTERVAL:
-            # Expression is interval in seconds
-            interval_seconds = int(schedule.expression)
-            schedule.next_run = datetime.now().timestamp() + interval_seconds
-        elif schedule.schedule_type == ScheduleType.ONE_TIME:
-            # Expression is ISO datetime
-            schedule.next_run = datetime.fromisoformat(schedule.expression)
-    
-    # Update timestamp
-    schedule.updated_at = datetime.now()
-    
-    # Save schedule
-    _save_schedule(schedule, report_request)
-    
-    return schedule
+    def change(schedule: Schedule) -> None:
+        was_enabled = schedule.enabled
+
+        # Update fields
+        if name is not None:
+            schedule.name = name
+        if schedule_type is not None:
+            schedule.schedule_type = schedule_type
+        if expression is not None:
+            schedule.expression = expression
+        if enabled is not None:
+            schedule.enabled = enabled
+        if report_request is not None:
+            schedule.report_request = report_request
+        if misfire_policy is not None:
+            schedule.misfire_policy = misfire_policy
+        if max_concurrent_runs is not None:
+            schedule.max_concurrent_runs = max_concurrent_runs
+        check_run_limits(schedule)
+
+        # Update next run time when the timing changes or the schedule is re-enabled
+        if schedule.enabled and (schedule_type is not None or expression is not None or not was_enabled):
+            schedule.next_run = compute_next_run(schedule, datetime.now())
+
+        # Update timestamp
+        schedule.updated_at = datetime.now()
+
+    return schedule_store.update(schedule_id, change)
+
+
+def record_run(
+    schedule_id: str,
+    last_run: Optional[datetime],
+    next_run: Optional[datetime],
+    report_id: Optional[str]
+) -> None:
+    """
+    Record that a schedule fired: its last run, the next due time and the
+    report it started. A schedule without a next due time (a one-time
+    schedule that has fired) is disabled.
+    """
+    def change(schedule: Schedule) -> None:
+        schedule.last_run = last_run
+        schedule.next_run = next_run
+        if next_run is None:
+            schedule.enabled = False
+        if report_id is not None:
+            schedule.last_report_id = report_id
+
+    schedule_store.update(schedule_id, change, bump_revision=False)
 
 
 def delete_schedule(schedule_id: str) -> bool:
     """
     Delete a schedule.
     """
-    # Load schedules
-    if not os.path.exists(settings.SCHEDULES_FILE):
-        return False
-    
-    with open(settings.SCHEDULES_FILE, "r") as f:
-        schedules_data = yaml.safe_load(f) or {}
-    
-    # Check if schedule exists
-    if schedule_id not in schedules_data:
-        return False
-    
-    # Delete schedule
-    del schedules_data[schedule_id]
-    
-    # Save schedules
-    with open(settings.SCHEDULES_FILE, "w") as f:
-        yaml.dump(schedules_data, f)
-    
-    return True
-
-
-def _save_schedule(schedule: Schedule, report_request: Optional[ReportGenerationRequest] = None) -> None:
-    """
-    Save a schedule to the schedules file.
-    """
-    # Load existing schedules
-    if os.path.exists(settings.SCHEDULES_FILE):
-        with open(settings.SCHEDULES_FILE, "r") as f:
-            schedules_data = yaml.safe_load(f) or {}
-    else:
-        schedules_data = {}
-    
-    # Update or add schedule
-    schedules_data[schedule.id] = {
-        "name": schedule.name,
-        "schedule_type": schedule.schedule_type,
-        "expression": schedule.expression,
-        "enabled": schedule.enabled,
-        "last_run": schedule.last_run.isoformat() if schedule.last_run else None,
-        "next_run": schedule.next_run.isoformat() if schedule.next_run else None,
-        "created_at": schedule.created_at.isoformat(),
-        "updated_at": schedule.updated_at.isoformat()
-    }
-    
-    # Add report request if provided
-    if report_request:
-        schedules_data[schedule.id]["report_request"] = report_request.dict()
-    
-    # Save to file
-    with open(settings.SCHEDULES_FILE, "w") as f:
-        yaml.dump(schedules_data, f)
+    return schedule_store.delete(schedule_id)
+
+
+def import_schedules(content: str) -> List[Schedule]:
+    """
+    Add or replace the schedules in a YAML document in the format of the
+    legacy schedules file (a mapping of schedule ID to fields).
+    """
+    schedules = parse_schedules_yaml(content)
+    for schedule in schedules:
+        check_run_limits(schedule)
+    schedule_store.save_many(schedules)
+    return schedules
+
+
+def export_schedules() -> str:
+    """Dump all schedules as YAML in the format of the legacy schedules file."""
+    return yaml.safe_dump(
+        {schedule.id: schedule.model_dump(mode="json", exclude={"id"}) for schedule in get_schedules()},
+        sort_keys=False
+    )
+
+
+def parse_schedules_yaml(content: str) -> List[Schedule]:
+    """
+    Parse schedules from YAML. Schedules stored before next_run was
+    recorded get one now; those whose expression is not valid are imported
+    disabled.
+    """
+    schedules_data: Dict[str, dict] = yaml.safe_load(content) or {}
+    if not isinstance(schedules_data, dict):
+        raise ValueError("Schedules YAML must map schedule IDs to schedules")
+    schedules = []
+    for schedule_id, data in schedules_data.items():
+        schedule = Schedule(id=str(schedule_id), **data)
+        schedule.last_run = to_local_naive(schedule.last_run)
+        schedule.next_run = to_local_naive(schedule.next_run)
+        if schedule.enabled and schedule.next_run is None and schedule.last_run is None:
+            try:
+                schedule.next_run = compute_next_run(schedule, datetime.now())
+            except ValueError:
+                # Invalid expression
+                schedule.enabled = False
+        schedules.append(schedule)
+    return schedules
+
+
+def check_run_limits(schedule: Schedule) -> None:
+    """
+    Raise ValueError if the misfire policy cannot work within the schedule's
+    ``max_concurrent_runs``: catch-up runs are started together, and those
+    beyond the limit are skipped, so ``run_all`` with a limit of 1 would
+    only ever catch up one run.
+    """
+    if schedule.misfire_policy == MisfirePolicy.RUN_ALL and schedule.max_concurrent_runs < 2:
+        raise ValueError(
+            "The run_all misfire policy needs max_concurrent_runs of at least 2; "
+            "catch-up runs beyond the limit are skipped"
+        )
+
+
+def compute_next_run(schedule: Schedule, after: datetime) -> Optional[datetime]:
+    """
+    Get the first due time of a schedule after ``after``.
+
+    A one-time schedule is due at its time even if that has passed, until it
+    has run. Raises ValueError if the expression is not valid for the
+    schedule type.
+    """
+    if schedule.schedule_type == ScheduleType.CRON:
+        return _cron_iter(schedule.expression, after).get_next(datetime)
+    if schedule.schedule_type == ScheduleType.INTERVAL:
+        # Expression is interval in seconds
+        return after + _interval(schedule)
+    # Expression is ISO datetime
+    if schedule.last_run is not None:
+        return None
+    try:
+        return to_local_naive(datetime.fromisoformat(schedule.expression))
+    except ValueError as e:
+        raise ValueError(f"Invalid one-time expression: {str(e)}")
+
+
+def due_runs(schedule: Schedule, due: datetime, now: datetime) -> Tuple[List[datetime], Optional[datetime]]:
+    """
+    Work out which runs to start for a schedule that became due at ``due``,
+    and its next due time after ``now``.
+
+    A run started within the schedule's grace period is on time. Otherwise
+    runs were missed, and the misfire policy decides: ``run_once`` starts one
+    catch-up run, ``run_all`` one per missed due time (at most
+    SCHEDULER_MAX_CATCH_UP_RUNS, the latest ones) and ``skip`` none.
+    """
+    if schedule.schedule_type == ScheduleType.ONE_TIME:
+        late = now - due > timedelta(seconds=schedule.misfire_grace_seconds)
+        return ([] if late and schedule.misfire_policy == MisfirePolicy.SKIP else [due]), None
+
+    first = due
+    if schedule.schedule_type == ScheduleType.INTERVAL:
+        # Jump straight to the runs that are kept instead of stepping through
+        # every interval
+        interval = _interval(schedule)
+        count = int((now - due) / interval) + 1
+        first = due + interval * max(count - settings.SCHEDULER_MAX_CATCH_UP_RUNS, 0)
+
+    missed: List[datetime] = []
+    for next_run in iter_runs(schedule, first):
+        if next_run > now:
+            break
+        missed.append(next_run)
+        if len(missed) > settings.SCHEDULER_MAX_CATCH_UP_RUNS:
+            missed.pop(0)
+
+    if now - due <= timedelta(seconds=schedule.misfire_grace_seconds) and missed == [due]:
+        return missed, next_run
+    if schedule.misfire_policy == MisfirePolicy.SKIP:
+        return [], next_run
+    if schedule.misfire_policy == MisfirePolicy.RUN_ONCE:
+        return missed[-1:], next_run
+    return missed, next_run
+
+
+def iter_runs(schedule: Schedule, first: datetime) -> Iterator[datetime]:
+    """
+    Yield a schedule's due times from ``first``, which must be one of them.
+
+    Cron and interval schedules go on forever; a one-time schedule yields
+    ``first`` only. Raises ValueError on the first ``next`` if the
+    expression is not valid.
+    """
+    yield first
+    if schedule.schedule_type == ScheduleType.CRON:
+        cron = _cron_iter(schedule.expression, first)
+        while True:
+            yield cron.get_next(datetime)
+    elif schedule.schedule_type == ScheduleType.INTERVAL:
+        interval = _interval(schedule)
+        run = first
+        while True:
+            run += interval
+            yield run
+
+
+def upcoming_runs(limit: int, until: Optional[datetime] = None) -> List[Tuple[datetime, Schedule]]:
+    """
+    Get the next ``limit`` due times across all enabled schedules, in order,
+    as (due time, schedule) pairs; optionally only those up to ``until``.
+
+    Each schedule's runs start from its stored next run and are generated
+    lazily, merged on a heap, so the cost grows with ``limit`` and the
+    number of schedules rather than with how often any one schedule fires.
+    Schedules whose expression is not valid are left out.
+    """
+    until = to_local_naive(until)
+    streams = []
+    for schedule in schedule_store.list_due(until):
+        try:
+            if schedule.schedule_type == ScheduleType.CRON:
+                _parse_cron(schedule.expression)
+            elif schedule.schedule_type == ScheduleType.INTERVAL:
+                _interval(schedule)
+        except ValueError:
+            continue
+        streams.append(_tagged_runs(schedule))
+
+    runs = heapq.merge(*streams, key=lambda item: item[0])
+    if until is not None:
+        runs = itertools.takewhile(lambda item: item[0] <= until, runs)
+    return list(itertools.islice(runs, limit))
+
+
+def _tagged_runs(schedule: Schedule) -> Iterator[Tuple[datetime, Schedule]]:
+    for run in iter_runs(schedule, schedule.next_run):
+        yield run, schedule
+
+
+def to_local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a timezone-aware datetime to naive local time; naive ones are taken as local already."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+@lru_cache(maxsize=1024)
+def _parse_cron(expression: str) -> croniter:
+    # Parsing expands every field of the expression, which is most of the
+    # cost of a croniter; parsed expressions are shared as templates
+    try:
+        return croniter(expression, datetime(2000, 1, 1))
+    except Exception as e:
+        raise ValueError(f"Invalid cron expression: {str(e)}")
+
+
+def _cron_iter(expression: str, start: datetime) -> croniter:
+    """Get an iterator over a cron expression's times after ``start``."""
+    # croniter keeps its position, so each caller gets its own copy
+    cron = copy.copy(_parse_cron(expression))
+    cron.set_current(start, force=True)
+    return cron
+
+
+def _interval(schedule: Schedule) -> timedelta:
+    try:
+        seconds = int(schedule.expression)
+    except ValueError:
+        raise ValueError(f"Invalid interval expression: {schedule.expression}")
+    if seconds <= 0:
+        raise ValueError(f"Invalid interval expression: {schedule.expression}")
+    return timedelta(seconds=seconds)
+
+
+def _to_schedule(data: str) -> Schedule:
+    return Schedule.model_validate_json(data)
+
+
+def _row(schedule: Schedule) -> tuple:
+    return (
+        schedule.id,
+        int(schedule.enabled),
+        schedule.next_run.isoformat() if schedule.next_run else None,
+        schedule.model_dump_json()
+    )
@@ -0,0 +1,270 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.middleware.metrics_middleware import SCHEDULE_RUNS
+from app.models.report import ReportGenerationRequest, ReportMetadata, ReportStatus, Schedule
+from app.services.coordination_service import coordination_store, node_id
+from app.services.job_service import ReportJobQueue, report_queue
+from app.services.metadata_service import report_store
+from app.services.report_service import create_report_metadata, find_cached_report, group_shared_scans
+from app.services.schedule_service import due_runs, get_schedule, get_schedules, record_run, schedule_store
+
+logger = structlog.get_logger()
+
+
+class ReportScheduler:
+    """
+    In-process timer that starts the reports of due schedules.
+
+    Due times are kept in a min-heap and the runner sleeps until the earliest
+    one, or until a schedule is added or changed. Each run goes through the
+    same path as ``POST /reports/generate``: the request is validated, served
+    from the result cache if possible and otherwise submitted to the report
+    queue's worker pool. A schedule never has more than
+    ``max_concurrent_runs`` reports pending or processing at once; runs
+    beyond that are skipped, including the catch-up runs of a ``run_all``
+    schedule (see ``check_run_limits``).
+
+    Schedules that come due together are fired together, and their reports
+    that read the same input and reference are submitted as one job, so the
+    data is read and joined once for all of them
+    (SCHEDULER_BATCH_SHARED_SCANS).
+
+    With several nodes, only the one holding the scheduler lease fires
+    schedules (see ``ClusterCoordinator``), and each firing is claimed in the
+    coordination store first so it is dispatched once even while the lease
+    changes hands. A firing claimed by another node is looked at again once
+    that claim could have expired.
+    """
+
+    def __init__(self, queue: ReportJobQueue):
+        self.queue = queue
+        # (time to fire, schedule ID, due time)
+        self._heap: List[Tuple[datetime, str, datetime]] = []
+        self._due: Dict[str, datetime] = {}
+        self._active: Dict[str, List[str]] = {}
+        self._pending: List[ReportMetadata] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._leader = True
+        self._revision: Optional[int] = None
+
+    @property
+    def leader(self) -> bool:
+        """Whether this node fires schedules."""
+        return self._leader
+
+    async def set_leader(self, leader: bool) -> None:
+        """
+        Start or stop firing schedules. A node reloads the schedules when it
+        becomes the leader, and while it leads whenever their revision shows
+        they were changed (possibly through other nodes).
+        """
+        was_leader, self._leader = self._leader, leader
+        if not leader or self._wakeup is None:
+            self._wake()
+        elif not was_leader or await run_in_threadpool(schedule_store.revision) != self._revision:
+            await self.reload()
+
+    async def start(self) -> None:
+        """Load the schedules and start the runner task."""
+        self._wakeup = asyncio.Event()
+        await self.reload()
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """Stop the runner; reports already submitted are left to the queue."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self._submit_pending()
+        self._task = None
+        self._wakeup = None
+
+    async def reload(self) -> None:
+        """Rebuild the timer heap from the stored schedules."""
+        # Read first, so a change made while loading shows as a new revision
+        self._revision = await run_in_threadpool(schedule_store.revision)
+        schedules = await run_in_threadpool(get_schedules)
+        self._heap = []
+        self._due = {}
+        for schedule in schedules:
+            self._push(schedule)
+        self._wake()
+
+    def reschedule(self, schedule: Schedule) -> None:
+        """Pick up a created or updated schedule."""
+        self._due.pop(schedule.id, None)
+        self._push(schedule)
+        self._wake()
+
+    def unschedule(self, schedule_id: str) -> None:
+        """Forget a deleted schedule."""
+        self._due.pop(schedule_id, None)
+        self._active.pop(schedule_id, None)
+
+    def _push(self, schedule: Schedule, not_before: Optional[datetime] = None) -> None:
+        if not schedule.enabled or schedule.next_run is None:
+            return
+        # Superseded heap entries stay in the heap and are skipped when
+        # popped, since they no longer match _due
+        fire_at = max(schedule.next_run, not_before) if not_before is not None else schedule.next_run
+        self._due[schedule.id] = schedule.next_run
+        heapq.heappush(self._heap, (fire_at, schedule.id, schedule.next_run))
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            delay = None
+            if not self._leader:
+                # Sleep until this node becomes the leader
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self._heap:
+                delay = (self._heap[0][0] - datetime.now()).total_seconds()
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Fire everything that is due now, then submit the reports together
+            now = datetime.now()
+            while self._heap and self._heap[0][0] <= now:
+                _, schedule_id, due = heapq.heappop(self._heap)
+                if self._due.get(schedule_id) != due:
+                    continue
+                del self._due[schedule_id]
+                try:
+                    await self._fire(schedule_id, due)
+                except Exception as e:
+                    logger.error("schedule_fire_failed", schedule_id=schedule_id, error=str(e))
+            await self._submit_pending()
+
+    async def _fire(self, schedule_id: str, due: datetime) -> None:
+        # The claim comes first, so the schedule read below is never older than it
+        if settings.COORDINATION_ENABLED and not await self._claim(schedule_id, due):
+            return
+        schedule = await run_in_threadpool(get_schedule, schedule_id)
+        if schedule is None or not schedule.enabled:
+            return
+        if schedule.next_run != due:
+            # Changed or fired elsewhere since it was loaded
+            self._push(schedule)
+            return
+
+        now = datetime.now()
+        runs, next_run = due_runs(schedule, due, now)
+        if not runs:
+            SCHEDULE_RUNS.labels(outcome="missed").inc()
+            logger.info("schedule_run_missed", schedule_id=schedule_id, due=due.isoformat())
+
+        report_id = None
+        for _ in runs:
+            report_id = await self._start_run(schedule) or report_id
+
+        await run_in_threadpool(record_run, schedule_id, now if runs else schedule.last_run, next_run, report_id)
+        if next_run is not None:
+            self._push(schedule.model_copy(update={"next_run": next_run}))
+
+    async def _claim(self, schedule_id: str, due: datetime) -> bool:
+        """
+        Claim a firing in the coordination store. If another node has it, the
+        schedule stays on the heap: at its next due time once that node
+        records the run, or for another attempt after the claim expires, in
+        case that node died first.
+        """
+        ttl = settings.LEADER_LEASE_SECONDS
+        if await run_in_threadpool(coordination_store.claim_firing, schedule_id, due, node_id(), ttl):
+            return True
+        logger.info("schedule_firing_claimed_elsewhere", schedule_id=schedule_id, due=due.isoformat())
+        schedule = await run_in_threadpool(get_schedule, schedule_id)
+        if schedule is not None:
+            retry_at = datetime.now() + timedelta(seconds=ttl) if schedule.next_run == due else None
+            self._push(schedule, not_before=retry_at)
+        return False
+
+    async def _start_run(self, schedule: Schedule) -> Optional[str]:
+        active = [
+            report_id for report_id in self._active.get(schedule.id, [])
+            if await run_in_threadpool(_is_running, report_id)
+        ]
+        self._active[schedule.id] = active
+        if len(active) >= schedule.max_concurrent_runs:
+            SCHEDULE_RUNS.labels(outcome="skipped").inc()
+            logger.info("schedule_run_skipped", schedule_id=schedule.id, running=len(active))
+            return None
+
+        request = schedule.report_request or ReportGenerationRequest()
+        try:
+            report_metadata = await run_in_threadpool(
+                create_report_metadata, request, schedule.created_by or "scheduler"
+            )
+            cached = await run_in_threadpool(find_cached_report, report_metadata)
+            if cached is not None:
+                await run_in_threadpool(report_store.save, cached)
+                report_metadata = cached
+            else:
+                # Submitted with the other runs due now; saved already so
+                # it counts towards max_concurrent_runs
+                await run_in_threadpool(report_store.save, report_metadata)
+                self._pending.append(report_metadata)
+                active.append(report_metadata.id)
+                return report_metadata.id
+        except Exception as e:
+            SCHEDULE_RUNS.labels(outcome="failed").inc()
+            logger.warning("schedule_run_failed", schedule_id=schedule.id, error=str(getattr(e, "detail", e)))
+            return None
+
+        SCHEDULE_RUNS.labels(outcome="started").inc()
+        return report_metadata.id
+
+    async def _submit_pending(self) -> None:
+        pending, self._pending = self._pending, []
+        if settings.SCHEDULER_BATCH_SHARED_SCANS:
+            batches = group_shared_scans(pending)
+        else:
+            batches = [[report_metadata] for report_metadata in pending]
+        for reports in batches:
+            try:
+                await self._submit(reports)
+            except Exception as e:
+                # The runs are already recorded on their schedules, so their reports fail visibly
+                SCHEDULE_RUNS.labels(outcome="failed").inc(len(reports))
+                logger.warning("schedule_run_failed", report_ids=[report.id for report in reports], error=str(e))
+                for report_metadata in reports:
+                    report_metadata.status = ReportStatus.FAILED
+                    report_metadata.end_time = datetime.now()
+                    report_metadata.error_message = str(e)
+                    await run_in_threadpool(report_store.save, report_metadata)
+                continue
+            SCHEDULE_RUNS.labels(outcome="started").inc(len(reports))
+            if len(reports) > 1:
+                logger.info("schedule_runs_batched", report_ids=[report.id for report in reports])
+
+    async def _submit(self, reports: List[ReportMetadata]) -> None:
+        if len(reports) == 1:
+            await self.queue.submit(reports[0])
+        else:
+            await self.queue.submit_batch(reports)
+
+
+def _is_running(report_id: str) -> bool:
+    report_metadata = report_store.get(report_id)
+    return report_metadata is not None and report_metadata.status in (ReportStatus.PENDING, ReportStatus.PROCESSING)
+
+
+report_scheduler = ReportScheduler(report_queue)
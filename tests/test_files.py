@@ -1,3 +1,6 @@
+import asyncio
+import gzip
+import hashlib
 import os
 from io import BytesIO
 
@@ -5,6 +8,9 @@ import pytest
 from fastapi.testclient import TestClient
 
 from app.core.config import settings
+from app.services import file_service
+from app.services.file_service import get_latest_file
+from app.services.profile_service import load_profile, profile_path
 from tests.test_auth import get_token_headers
 
 
@@ -38,7 +44,7 @@ def test_upload_file(test_app: TestClient, test_csv_file):
     
     response = test_app.get(f"/api/v1/files/download/{uploaded_filename}", headers=headers)
     assert response.status_code == 200
-    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["content-type"].startswith("text/csv")
 
 
 def test_upload_invalid_file_type(test_app: TestClient, test_csv_file):
@@ -72,3 +78,210 @@ def test_download_nonexistent_file(test_app: TestClient):
     response = test_app.get("/api/v1/files/download/nonexistent.csv", headers=headers)
     assert response.status_code == 404
     assert "File not found" in response.json()["detail"]
+
+
+def test_upload_streams_hash_and_size_limit(test_app: TestClient, monkeypatch):
+    """Test that uploads report their hash and row estimate and respect the size limit."""
+    headers = get_token_headers(test_app)
+    content = b"field1,field2\nA,X\nB,Y\nC,Z"
+    monkeypatch.setattr(settings, "UPLOAD_READ_BYTES", 5)
+    
+    response = test_app.post(
+        "/api/v1/files/upload/input",
+        files={"file": ("rows.csv", BytesIO(content), "text/csv")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["sha256"] == hashlib.sha256(content).hexdigest()
+    assert response.json()["row_count_estimate"] == 3
+    assert response.json()["file_size"] == len(content)
+    
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", len(content) - 1)
+    uploads_before = set(os.listdir(settings.UPLOAD_DIR))
+    response = test_app.post(
+        "/api/v1/files/upload/input",
+        files={"file": ("rows.csv", BytesIO(content), "text/csv")},
+        headers=headers
+    )
+    assert response.status_code == 413
+    assert set(os.listdir(settings.UPLOAD_DIR)) == uploads_before
+
+
+def test_upload_reads_columns_off_the_event_loop(test_app: TestClient, monkeypatch):
+    """Test that reading an upload's columns for the catalog does not block the event loop."""
+    read_columns = file_service._read_columns
+    on_event_loop = []
+    
+    def recording_read_columns(file_path):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return read_columns(file_path)
+    
+    monkeypatch.setattr(file_service, "_read_columns", recording_read_columns)
+    response = test_app.post(
+        "/api/v1/files/upload/input",
+        files={"file": ("columns.csv", BytesIO(b"field1,field2\nA,X\n"), "text/csv")},
+        headers=get_token_headers(test_app)
+    )
+    assert response.status_code == 200
+    assert on_event_loop == [False]
+
+
+def test_file_catalog_names_lists_and_deletes(test_app: TestClient):
+    """Test that uploads get unique names and are listed and deleted through the catalog."""
+    headers = get_token_headers(test_app)
+    content = b"field1,field2\nA,X\n"
+    
+    filenames = []
+    for _ in range(2):
+        response = test_app.post(
+            "/api/v1/files/upload/reference",
+            files={"file": ("same.csv", BytesIO(content), "text/csv")},
+            headers=headers
+        )
+        assert response.status_code == 200
+        filenames.append(response.json()["filename"])
+    assert filenames[0] != filenames[1]
+    
+    response = test_app.get("/api/v1/files/list/reference", params={"limit": 1}, headers=headers)
+    assert response.status_code == 200
+    assert [f["filename"] for f in response.json()] == [filenames[1]]
+    assert response.json()[0]["columns"] == ["field1", "field2"]
+    assert response.json()[0]["sha256"] is not None
+    assert int(response.headers["X-Total-Count"]) >= 2
+    assert get_latest_file("reference").endswith(filenames[1])
+    
+    response = test_app.delete(f"/api/v1/files/{filenames[1]}", headers=headers)
+    assert response.status_code == 403
+    
+    login = test_app.post("/api/v1/auth/login", data={"username": "admin", "password": "admin"})
+    admin_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    response = test_app.delete(f"/api/v1/files/{filenames[1]}", headers=admin_headers)
+    assert response.status_code == 204
+    assert not os.path.exists(os.path.join(settings.UPLOAD_DIR, filenames[1]))
+    assert get_latest_file("reference").endswith(filenames[0])
+    
+    response = test_app.get(f"/api/v1/files/download/{filenames[1]}", headers=headers)
+    assert response.status_code == 404
+
+
+def test_uploads_are_profiled_for_dtypes_and_rule_validation(test_app: TestClient):
+    """Test that uploads get a profile sidecar used to validate rules without reading the data."""
+    headers = get_token_headers(test_app)
+    uploads = {}
+    for file_type, content in (
+        ("input", b"refkey1,refkey2,field1,field2\nA,1,1,x\nA,2,,y\nB,1,3,z\n"),
+        ("reference", b"refkey1,refkey2,field1,field3\nA,1,r,10\nB,1,s,20\n"),
+    ):
+        response = test_app.post(
+            f"/api/v1/files/upload/{file_type}",
+            files={"file": ("data.csv", BytesIO(content), "text/csv")},
+            headers=headers
+        )
+        assert response.status_code == 200
+        uploads[file_type] = response.json()["filename"]
+    
+    input_path = os.path.join(settings.UPLOAD_DIR, uploads["input"])
+    assert os.path.exists(profile_path(input_path))
+    profile = load_profile(input_path)
+    assert profile.row_count == 3
+    assert profile.dtypes == {"refkey1": "object", "refkey2": "int64", "field1": "float64", "field2": "object"}
+    assert profile.null_counts["field1"] == 1
+    assert profile.key_cardinality == {"refkey1": 2, "refkey2": 2, "refkey1+refkey2": 3}
+    
+    response = test_app.get("/api/v1/files/list/input", params={"limit": 1}, headers=headers)
+    assert response.json()[0]["profiled"] is True
+    assert response.json()[0]["row_count"] == 3
+    
+    params = {"input_file": uploads["input"], "reference_file": uploads["reference"]}
+    for expression, valid in (("field1_x + field3", True), ("field1 + field3", False), ("field2 + missing", False)):
+        response = test_app.post(
+            "/api/v1/rules/validate",
+            json={"output_field": "out", "expression": expression},
+            params=params,
+            headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json()["valid"] is valid
+    
+    # A profile stops applying once the file changes
+    with open(input_path, "ab") as f:
+        f.write(b"C,1,4,w\n")
+    assert load_profile(input_path) is None
+
+
+def test_download_supports_ranges_etags_and_compression(test_app: TestClient):
+    """Test byte-range, conditional and compressed downloads."""
+    headers = get_token_headers(test_app)
+    content = b"field1,field2\n" + b"".join(b"A%d,X%d\n" % (i, i) for i in range(1000))
+    response = test_app.post(
+        "/api/v1/files/upload/input",
+        files={"file": ("big.csv", BytesIO(content), "text/csv")},
+        headers=headers
+    )
+    url = f"/api/v1/files/download/{response.json()['filename']}"
+    
+    response = test_app.get(url, headers={**headers, "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["accept-ranges"] == "bytes"
+    etag = response.headers["etag"]
+    assert etag == f'"{hashlib.sha256(content).hexdigest()}"'
+    
+    # Resume from an offset and fetch a suffix
+    response = test_app.get(url, headers={**headers, "Range": "bytes=100-199", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.content == content[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+    response = test_app.get(url, headers={**headers, "Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == content[-10:]
+    
+    # A stale If-Range gets the whole file; a range past the end is rejected
+    response = test_app.get(url, headers={**headers, "Range": "bytes=100-", "If-Range": '"stale"', "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == content
+    response = test_app.get(url, headers={**headers, "Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(content)}"
+    
+    response = test_app.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    
+    response = test_app.get(url, headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == content
+    
+    # The compressed representation's ETag is revalidated too
+    gzip_etag = response.headers["etag"]
+    response = test_app.get(url, headers={**headers, "Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == gzip_etag
+
+
+def test_compressed_uploads_are_stored_as_is(test_app: TestClient):
+    """Test that compressed text uploads keep their compression suffix and content."""
+    headers = get_token_headers(test_app)
+    compressed = gzip.compress(b"refkey1,refkey2,field1\nA,1,x\nB,2,y\n")
+    response = test_app.post(
+        "/api/v1/files/upload/input",
+        files={"file": ("daily.csv.gz", BytesIO(compressed), "application/gzip")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    filename = response.json()["filename"]
+    assert filename.endswith(".csv.gz")
+    with open(os.path.join(settings.UPLOAD_DIR, filename), "rb") as f:
+        assert f.read() == compressed
+    assert load_profile(os.path.join(settings.UPLOAD_DIR, filename)).row_count == 2
+    
+    response = test_app.post(
+        "/api/v1/files/upload/input",
+        files={"file": ("daily.parquet.gz", BytesIO(compressed), "application/gzip")},
+        headers=headers
+    )
+    assert response.status_code == 400
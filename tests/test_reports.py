@@ -1,4 +1,10 @@
+import asyncio
+import bz2
+import gzip
+import lzma
 import os
+import time
+from datetime import datetime
 from io import StringIO
 
 import pandas as pd
@@ -6,7 +12,18 @@ import pytest
 from fastapi.testclient import TestClient
 
 from app.core.config import settings
-from app.models.report import FileFormat
+from app.models.report import FileCatalogEntry, FileFormat, ReportGenerationRequest, ReportMetadata, ReportStatus
+from app.services.catalog_service import file_catalog
+from app.services.file_service import compute_file_hash
+from app.services.job_service import QueueFullError, ReportJobQueue
+from app.services.output_service import open_report_writer
+from app.services.reference_service import ReferenceCache, ReferenceIndex, load_reference, reference_cache
+from app.services import report_service, result_cache_service
+from app.services.reader_service import CsvReader, get_reader
+from app.services.report_service import (_process_files, create_report_metadata, generate_report, get_report_metadata,
+                                         group_shared_scans, run_report, run_report_batch)
+from app.services.result_cache_service import result_cache_key
+from app.services.rule_service import compile_rules, get_rule_set
 from tests.test_auth import get_token_headers
 
 
@@ -53,6 +70,17 @@ def test_reference_file():
     yield filename
 
 
+def wait_for_report(test_app: TestClient, report_id: str, headers: dict, timeout: float = 30.0) -> dict:
+    """Poll report metadata until the job has finished."""
+    deadline = time.time() + timeout
+    while True:
+        response = test_app.get(f"/api/v1/reports/{report_id}", headers=headers)
+        assert response.status_code == 200
+        if response.json()["status"] in ("completed", "failed") or time.time() > deadline:
+            return response.json()
+        time.sleep(0.1)
+
+
 def test_generate_report(test_app: TestClient, test_input_file, test_reference_file):
     """Test generating a report."""
     headers = get_token_headers(test_app)
@@ -65,21 +93,29 @@ def test_generate_report(test_app: TestClient, test_input_file, test_reference_f
     }
     
     response = test_app.post("/api/v1/reports/generate", json=request, headers=headers)
-    assert response.status_code == 200
+    assert response.status_code == 202
     
     report_id = response.json()["id"]
-    assert response.json()["status"] == "completed"
+    assert response.json()["status"] == "pending"
     assert response.json()["input_file"] == os.path.basename(test_input_file)
     assert response.json()["reference_file"] == os.path.basename(test_reference_file)
     
-    response = test_app.get(f"/api/v1/reports/{report_id}", headers=headers)
+    report = wait_for_report(test_app, report_id, headers)
+    assert report["id"] == report_id
+    assert report["status"] == "completed"
+    assert report["rows_processed"] == 3
+    assert report["projection"]["input_columns_skipped"] == ["field4"]
+    assert "refkey1" in report["projection"]["reference_columns_read"]
+    
+    response = test_app.get("/api/v1/reports", params={"created_by": "user", "status": "completed"}, headers=headers)
     assert response.status_code == 200
-    assert response.json()["id"] == report_id
+    assert response.json()["total"] >= 1
+    assert report_id in [report["id"] for report in response.json()["reports"]]
     
     response = test_app.get(f"/api/v1/reports/{report_id}/download", headers=headers)
     assert response.status_code == 200
     
-    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["content-type"].startswith("text/csv")
 
 
 def test_generate_report_invalid_file(test_app: TestClient):
@@ -96,3 +132,416 @@ def test_generate_report_invalid_file(test_app: TestClient):
     response = test_app.post("/api/v1/reports/generate", json=request, headers=headers)
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("output_format", list(FileFormat))
+def test_report_writer_streams_chunks(tmp_path, output_format):
+    """Test that streamed chunks produce the same file as a single write."""
+    chunks = [
+        pd.DataFrame({"outfield1": ["AX", "BY"], "outfield2": [1.5, None]}),
+        pd.DataFrame({"outfield1": ["CZ"], "outfield2": [3.0]}),
+    ]
+    path = str(tmp_path / f"report.{output_format.value}")
+    
+    with open_report_writer(path, output_format, ["outfield1", "outfield2"]) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    
+    assert not os.path.exists(f"{path}.part")
+    readers = {
+        FileFormat.CSV: pd.read_csv,
+        FileFormat.EXCEL: pd.read_excel,
+        FileFormat.JSON: pd.read_json,
+        FileFormat.PARQUET: pd.read_parquet,
+        FileFormat.FEATHER: pd.read_feather,
+    }
+    result = readers[output_format](path)
+    expected = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_report_queue_backpressure_and_drain():
+    """Test that a full queue rejects jobs and shutdown drains accepted ones."""
+    def make_job(report_id: str) -> ReportMetadata:
+        return ReportMetadata(
+            id=report_id,
+            input_file="missing_input.csv",
+            reference_file="missing_reference.csv",
+            output_file=f"report_{report_id}.csv",
+            output_format=FileFormat.CSV,
+            rule_set_id="default",
+            status=ReportStatus.PENDING,
+            start_time=datetime.now(),
+            created_by="user"
+        )
+    
+    async def scenario():
+        queue = ReportJobQueue(workers=1, max_depth=1)
+        await queue.start()
+        accepted = await queue.submit(make_job("queued"))
+        assert accepted.status == ReportStatus.PENDING
+        with pytest.raises(QueueFullError):
+            await queue.submit(make_job("rejected"))
+        await queue.shutdown(timeout=30)
+        return queue
+    
+    asyncio.run(scenario())
+    assert get_report_metadata("queued").status == ReportStatus.FAILED
+    assert get_report_metadata("rejected") is None
+
+
+def test_reference_cache_reuses_parsed_reference(tmp_path):
+    """Test that unchanged reference files are parsed once and changes invalidate."""
+    path = tmp_path / "reference.csv"
+    pd.DataFrame({"refkey1": ["k1"], "refkey2": ["kA"], "refdata1": ["d1"]}).to_csv(path, index=False)
+    reference_cache.clear()
+    
+    first = load_reference(str(path))
+    assert load_reference(str(path)) is first
+    assert list(first.payload.index.names) == ["refkey1", "refkey2"]
+    
+    pd.DataFrame({"refkey1": ["k1"], "refkey2": ["kA"], "refdata1": ["changed"]}).to_csv(path, index=False)
+    os.utime(path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert load_reference(str(path)).payload.loc[("k1", "kA"), "refdata1"] == "changed"
+
+
+def test_reference_cache_evicts_least_recently_used():
+    """Test that the cache stays within its byte budget."""
+    cache = ReferenceCache(max_bytes=100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"
+    cache.put("c", "C", 40)
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.current_bytes == 80
+    
+    cache.put("huge", "H", 1000)
+    assert cache.get("huge") is None
+
+
+def test_reference_index_join_matches_merge():
+    """Test that the prebuilt join index gives the same rows as a left merge."""
+    reference = pd.DataFrame({
+        "refkey1": ["k1", "k2", "k3"],
+        "refkey2": ["kA", "kB", "kC"],
+        "refdata1": ["d1", "d2", "d3"],
+        "shared": [1, 2, 3],
+    })
+    chunk = pd.DataFrame({
+        "field1": ["A", "B", "C", "D"],
+        "refkey1": ["k2", "k1", "missing", "k2"],
+        "refkey2": ["kB", "kA", "kA", "kB"],
+        "shared": ["x", "y", "z", "w"],
+    })
+    
+    index = ReferenceIndex(reference, ["refkey1", "refkey2"])
+    assert index.unique
+    expected = pd.merge(chunk, reference, on=["refkey1", "refkey2"], how="left")
+    pd.testing.assert_frame_equal(index.join(chunk).reset_index(drop=True), expected)
+
+
+def test_reference_index_duplicate_keys():
+    """Test duplicate reference keys expand rows unless declared unique."""
+    reference = pd.DataFrame({"refkey1": ["k1", "k1"], "refdata1": ["d1", "d2"]})
+    chunk = pd.DataFrame({"refkey1": ["k1", "k2"]})
+    
+    joined = ReferenceIndex(reference, ["refkey1"]).join(chunk)
+    assert joined["refdata1"].tolist()[:2] == ["d1", "d2"]
+    assert len(joined) == 3
+    
+    with pytest.raises(ValueError, match="duplicate"):
+        ReferenceIndex(reference, ["refkey1"], unique=True)
+
+
+def test_parallel_chunk_processing_matches_serial(tmp_path, monkeypatch, test_input_file, test_reference_file):
+    """Test that parallel chunk workers write the same report as serial processing."""
+    rules = get_rule_set("default").rules
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 1)
+    monkeypatch.setattr(settings, "PARALLEL_MIN_FILE_BYTES", 0)
+    
+    outputs = {}
+    for workers in (1, 2):
+        monkeypatch.setattr(settings, "PARALLEL_CHUNK_WORKERS", workers)
+        output_path = str(tmp_path / f"report_{workers}.csv")
+        rows, _ = _process_files(test_input_file, test_reference_file, output_path, FileFormat.CSV, rules)
+        assert rows == 3
+        with open(output_path) as f:
+            outputs[workers] = f.read()
+    
+    assert outputs[1] == outputs[2]
+
+
+@pytest.mark.parametrize("input_format", ["parquet", "feather"])
+def test_columnar_input_and_output(tmp_path, input_format, test_input_file, test_reference_file):
+    """Test that Parquet/Feather inputs produce the same report as CSV."""
+    rules = get_rule_set("default").rules
+    writers = {"parquet": pd.DataFrame.to_parquet, "feather": pd.DataFrame.to_feather}
+    
+    input_df = pd.read_csv(test_input_file)
+    input_df["unused"] = "x" * 100
+    input_path = str(tmp_path / f"input.{input_format}")
+    reference_path = str(tmp_path / f"reference.{input_format}")
+    writers[input_format](input_df, input_path)
+    writers[input_format](pd.read_csv(test_reference_file), reference_path)
+    
+    csv_path = str(tmp_path / "report.csv")
+    columnar_path = str(tmp_path / f"report.{input_format}")
+    _process_files(test_input_file, test_reference_file, csv_path, FileFormat.CSV, rules)
+    rows, projection = _process_files(input_path, reference_path, columnar_path, FileFormat(input_format), rules)
+    
+    assert rows == 3
+    assert projection.input_columns_skipped == ["field4", "unused"]
+    assert projection.bytes_skipped > 0
+    expected = pd.read_csv(csv_path)
+    result = pd.read_parquet(columnar_path) if input_format == "parquet" else pd.read_feather(columnar_path)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("input_format", ["json", "ndjson", "xlsx"])
+def test_json_and_excel_inputs_stream_in_chunks(
+    tmp_path, monkeypatch, input_format, test_input_file, test_reference_file
+):
+    """Test that JSON and XLSX inputs are read in chunks and match the CSV report."""
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 2)
+    rules = get_rule_set("default").rules
+    writers = {
+        "json": lambda df, path: df.to_json(path, orient="records", indent=2),
+        "ndjson": lambda df, path: df.to_json(path, orient="records", lines=True),
+        "xlsx": lambda df, path: df.to_excel(path, index=False),
+    }
+    
+    input_path = str(tmp_path / f"input.{input_format}")
+    reference_path = str(tmp_path / f"reference.{input_format}")
+    writers[input_format](pd.read_csv(test_input_file), input_path)
+    writers[input_format](pd.read_csv(test_reference_file), reference_path)
+    
+    reader = get_reader(input_path)
+    assert [len(chunk) for chunk in reader.iter_chunks(input_path, 2, columns=["field1", "refkey1"])] == [2, 1]
+    assert list(reader.read(input_path, columns=["field1", "refkey1"]).columns) == ["field1", "refkey1"]
+    
+    expected_path = str(tmp_path / "expected.csv")
+    result_path = str(tmp_path / "report.csv")
+    _process_files(test_input_file, test_reference_file, expected_path, FileFormat.CSV, rules)
+    rows, projection = _process_files(input_path, reference_path, result_path, FileFormat.CSV, rules)
+    
+    assert rows == 3
+    assert projection.input_columns_skipped == ["field4"]
+    # Excel stores whole floats as integers, so only the values are compared
+    pd.testing.assert_frame_equal(pd.read_csv(result_path), pd.read_csv(expected_path), check_dtype=False)
+
+
+@pytest.mark.parametrize("input_name", ["csv.gz", "json.bz2", "ndjson.xz"])
+def test_compressed_inputs_are_decompressed_while_streaming(
+    tmp_path, monkeypatch, input_name, test_input_file, test_reference_file
+):
+    """Test that compressed inputs are read in chunks and match the uncompressed report."""
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 2)
+    rules = get_rule_set("default").rules
+    openers = {"gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+    writers = {
+        "csv": lambda df: df.to_csv(index=False),
+        "json": lambda df: df.to_json(orient="records"),
+        "ndjson": lambda df: df.to_json(orient="records", lines=True),
+    }
+    input_format, compression = input_name.split(".")
+    
+    paths = []
+    for source in (test_input_file, test_reference_file):
+        path = str(tmp_path / f"{os.path.basename(source)}.{input_name}")
+        with openers[compression](path, "wt") as f:
+            f.write(writers[input_format](pd.read_csv(source)))
+        paths.append(path)
+    
+    reader = get_reader(paths[0])
+    assert [len(chunk) for chunk in reader.iter_chunks(paths[0], 2)] == [2, 1]
+    assert "field4" in reader.columns(paths[0])
+    
+    expected_path = str(tmp_path / "expected.csv")
+    result_path = str(tmp_path / "report.csv")
+    _process_files(test_input_file, test_reference_file, expected_path, FileFormat.CSV, rules)
+    rows, _ = _process_files(*paths, result_path, FileFormat.CSV, rules)
+    assert rows == 3
+    pd.testing.assert_frame_equal(pd.read_csv(result_path), pd.read_csv(expected_path))
+
+
+@pytest.mark.parametrize("output_format", [FileFormat.CSV, FileFormat.JSON])
+def test_incremental_report_appends_new_input_rows(
+    tmp_path, monkeypatch, output_format, test_input_file, test_reference_file
+):
+    """Test that an incremental run only processes the appended tail of the input."""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "REPORTS_DIR", str(tmp_path / "reports"))
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'reports.db'}")
+    os.makedirs(settings.UPLOAD_DIR)
+    os.makedirs(settings.REPORTS_DIR)
+    input_path = os.path.join(settings.UPLOAD_DIR, "input_daily.csv")
+    reference_path = os.path.join(settings.UPLOAD_DIR, "reference_daily.csv")
+    input_df = pd.read_csv(test_input_file)
+    input_df.to_csv(input_path, index=False)
+    pd.read_csv(test_reference_file).to_csv(reference_path, index=False)
+    
+    request = ReportGenerationRequest(
+        input_file="input_daily.csv",
+        reference_file="reference_daily.csv",
+        output_format=output_format,
+        rule_set_id="default",
+        incremental=True
+    )
+    
+    first = run_report(create_report_metadata(request, "user"))
+    assert first.status == ReportStatus.COMPLETED
+    assert first.incremental_stats.full_rebuild_reason == "no previous run"
+    
+    # Append two rows, one of them for a key the reference does not have
+    input_df.iloc[[0, 1]].assign(refkey1=["key1", "key9"]).to_csv(input_path, mode="a", header=False, index=False)
+    second = run_report(create_report_metadata(request, "user"))
+    assert second.status == ReportStatus.COMPLETED
+    assert second.rows_processed == 2
+    assert second.incremental_stats.rows_reused == 3
+    assert second.incremental_stats.base_report_id == first.id
+    assert second.incremental_stats.full_rebuild_reason is None
+    assert file_catalog.get(second.output_file).row_count == 5
+    
+    full_path = str(tmp_path / f"full.{output_format.value}")
+    _process_files(input_path, reference_path, full_path, output_format, get_rule_set("default").rules)
+    with open(full_path) as expected, open(os.path.join(settings.REPORTS_DIR, second.output_file)) as result:
+        assert result.read() == expected.read()
+    
+    # A changed reference file forces a full rebuild
+    with open(reference_path, "a") as f:
+        f.write("key4,data4,keyD,dataD,dataW,35.0\n")
+    third = run_report(create_report_metadata(request, "user"))
+    assert third.rows_processed == 5
+    assert third.incremental_stats.full_rebuild_reason == "reference file changed"
+
+
+def test_identical_report_requests_reuse_cached_output(
+    tmp_path, monkeypatch, test_input_file, test_reference_file
+):
+    """Test that an identical request is served from the result cache and that the cache is bounded."""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "REPORTS_DIR", str(tmp_path / "reports"))
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'reports.db'}")
+    os.makedirs(settings.UPLOAD_DIR)
+    os.makedirs(settings.REPORTS_DIR)
+    for source, name in ((test_input_file, "input_a.csv"), (test_input_file, "input_b.csv"),
+                         (test_reference_file, "reference_a.csv")):
+        pd.read_csv(source).to_csv(os.path.join(settings.UPLOAD_DIR, name), index=False)
+    
+    request = ReportGenerationRequest(input_file="input_a.csv", reference_file="reference_a.csv", rule_set_id="default")
+    first = generate_report(request, "user")
+    assert first.cached_from is None
+    
+    # Same content under another name is a hit, linked rather than regenerated
+    second = generate_report(request.model_copy(update={"input_file": "input_b.csv"}), "user")
+    assert second.id != first.id
+    assert second.cached_from == first.id
+    assert second.rows_processed == 3
+    first_path = os.path.join(settings.REPORTS_DIR, first.output_file)
+    second_path = os.path.join(settings.REPORTS_DIR, second.output_file)
+    assert os.path.samefile(first_path, second_path)
+    # Outputs are catalogued with their hash, so downloads need not read them first
+    assert file_catalog.get(first.output_file).sha256 == compute_file_hash(first_path)
+    assert file_catalog.get(second.output_file).sha256 == compute_file_hash(first_path)
+    
+    # A different output format is a miss; the quota only has room for one entry
+    monkeypatch.setattr(settings, "REPORT_CACHE_MAX_BYTES", os.path.getsize(first_path))
+    third = generate_report(request.model_copy(update={"output_format": FileFormat.JSON}), "user")
+    assert third.cached_from is None
+    assert generate_report(request, "user").cached_from is None
+    
+    # Uploads are keyed on the hash the catalog recorded, unless the file changed since
+    input_path = os.path.join(settings.UPLOAD_DIR, "input_c.csv")
+    pd.read_csv(test_input_file).to_csv(input_path, index=False)
+    stat = os.stat(input_path)
+    file_catalog.add(FileCatalogEntry(
+        filename="input_c.csv",
+        file_type="input",
+        file_size=stat.st_size,
+        uploaded_at=datetime.now(),
+        sha256=compute_file_hash(input_path),
+        modified_ns=stat.st_mtime_ns
+    ))
+    hashed = []
+    monkeypatch.setattr(result_cache_service, "compute_file_hash", lambda path: hashed.append(path) or "")
+    reference_path = os.path.join(settings.UPLOAD_DIR, "reference_a.csv")
+    rules = get_rule_set("default").rules
+    assert result_cache_key(first, input_path, reference_path, rules) == first.cache_key
+    assert hashed == []
+    os.utime(input_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    result_cache_key(first, input_path, reference_path, rules)
+    assert hashed == [os.path.realpath(input_path)]
+    
+    # Expired entries are not served
+    monkeypatch.setattr(settings, "REPORT_CACHE_TTL_SECONDS", -1)
+    assert generate_report(request, "user").cached_from is None
+
+
+def test_batched_reports_share_one_scan(tmp_path, monkeypatch, test_input_file, test_reference_file):
+    """Test that reports sharing input and reference are written from one pass, each as if run alone."""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "REPORTS_DIR", str(tmp_path / "reports"))
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'reports.db'}")
+    os.makedirs(settings.UPLOAD_DIR)
+    os.makedirs(settings.REPORTS_DIR)
+    pd.read_csv(test_input_file).to_csv(os.path.join(settings.UPLOAD_DIR, "input_shared.csv"), index=False)
+    pd.read_csv(test_reference_file).to_csv(os.path.join(settings.UPLOAD_DIR, "reference_shared.csv"), index=False)
+    
+    # A second rule set that only needs some of the columns
+    default = get_rule_set("default")
+    subset = default.model_copy(update={"version": "subset", "rules": default.rules[:2]})
+    compiled = {"default": compile_rules(default.rules), "subset": compile_rules(subset.rules)}
+    monkeypatch.setattr(report_service, "get_rule_set", lambda rule_set_id=None: subset if rule_set_id == "subset" else default)
+    monkeypatch.setattr(report_service, "get_compiled_rule_set", lambda rule_set_id=None: compiled[rule_set_id or "default"])
+    
+    scans = []
+    iter_chunks = CsvReader.iter_chunks
+    
+    def counting_iter_chunks(self, file_path, *args, **kwargs):
+        scans.append(os.path.basename(file_path))
+        return iter_chunks(self, file_path, *args, **kwargs)
+    
+    monkeypatch.setattr(CsvReader, "iter_chunks", counting_iter_chunks)
+    
+    def make_report(output_format, rule_set_id, incremental=False):
+        report_metadata = create_report_metadata(ReportGenerationRequest(
+            input_file="input_shared.csv",
+            reference_file="reference_shared.csv",
+            output_format=output_format,
+            incremental=incremental
+        ), "user")
+        return report_metadata.model_copy(update={"rule_set_id": rule_set_id})
+    
+    reports = [
+        make_report(FileFormat.CSV, "default"),
+        make_report(FileFormat.JSON, "default"),
+        make_report(FileFormat.CSV, "subset"),
+    ]
+    incremental = make_report(FileFormat.CSV, "default", incremental=True)
+    assert group_shared_scans([reports[0], incremental, reports[1], reports[2]]) == [reports, [incremental]]
+    
+    results = run_report_batch(reports)
+    assert scans == ["input_shared.csv"]
+    assert [result.status for result in results] == [ReportStatus.COMPLETED] * 3
+    assert [result.id for result in results] == [report.id for report in reports]
+    assert all(result.rows_processed == 3 for result in results)
+    
+    for result in results:
+        expected_path = str(tmp_path / f"expected_{result.id}.{result.output_format.value}")
+        _process_files(
+            os.path.join(settings.UPLOAD_DIR, "input_shared.csv"),
+            os.path.join(settings.UPLOAD_DIR, "reference_shared.csv"),
+            expected_path,
+            result.output_format,
+            compiled[result.rule_set_id]
+        )
+        with open(expected_path) as expected, open(os.path.join(settings.REPORTS_DIR, result.output_file)) as output:
+            assert output.read() == expected.read()
+    
+    # A failed pass fails every report in it
+    os.remove(os.path.join(settings.UPLOAD_DIR, "reference_shared.csv"))
+    failed = run_report_batch(reports)
+    assert [result.status for result in failed] == [ReportStatus.FAILED] * 3
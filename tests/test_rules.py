@@ -1,10 +1,15 @@
 import os
 
+import pandas as pd
 import pytest
 from fastapi.testclient import TestClient
 
 from app.core.config import settings
 from app.models.report import TransformationRule, TransformationRuleSet
+from app.services import expression_service
+from app.services.expression_service import ExpressionError, parse, validate_expression
+from app.services.rule_service import (compile_rules, get_compiled_rule_set, get_rule_set, parse_expression,
+                                       rule_registry, update_rule_set)
 from tests.test_auth import get_token_headers
 
 
@@ -77,3 +82,151 @@ def test_validate_rule(test_app: TestClient):
     response = test_app.post("/api/v1/rules/validate", json=rule, headers=headers)
     assert response.status_code == 200
     assert response.json()["valid"] is False
+
+
+def test_compiled_rules_match_row_wise_evaluation():
+    """Test that vectorized rule evaluation matches the row-wise parser."""
+    rules = [
+        TransformationRule(output_field="concat", expression="field1 + field2"),
+        TransformationRule(output_field="product", expression="field3 * max(field5, refdata4)"),
+        TransformationRule(output_field="minimum", expression="min(field5, refdata4)"),
+        TransformationRule(output_field="difference", expression="field5 - refdata4 / 2"),
+    ]
+    df = pd.DataFrame({
+        "field1": ["A", "B", "C"],
+        "field2": ["X", "Y", "Z"],
+        "field3": [1, 2, 3],
+        "field5": [10.0, 20.0, 30.0],
+        "refdata4": [5.0, 25.0, 15.0],
+    })
+    
+    output = compile_rules(rules).evaluate(df)
+    
+    for rule in rules:
+        expected = [parse_expression(rule.expression, row) for _, row in df.iterrows()]
+        assert output[rule.output_field].tolist() == expected
+
+
+def test_row_wise_fallback_matches_vectorized_edge_cases():
+    """Test that mixed types, missing values and division by zero give the same values either way."""
+    rules = [
+        TransformationRule(output_field="label", expression="field1 + 1"),
+        TransformationRule(output_field="with_missing", expression="field1 + field5"),
+        TransformationRule(output_field="ratio", expression="field5 / field3"),
+        TransformationRule(output_field="maximum", expression="max(field5, refdata4)"),
+        TransformationRule(output_field="minimum", expression="min(refdata4, field5)"),
+    ]
+    df = pd.DataFrame({
+        "field1": ["A", "B", "C"],
+        "field3": [0, 2, 0],
+        "field5": [10.0, float("nan"), 0.0],
+        "refdata4": [float("nan"), 5.0, 15.0],
+    })
+
+    output = compile_rules(rules).evaluate(df)
+
+    for rule in rules:
+        expected = pd.Series(
+            [parse_expression(rule.expression, row) for row in df.to_dict("records")], dtype=object
+        )
+        assert not expected.astype(str).str.startswith("Error:").any()
+        assert output[rule.output_field].astype(object).fillna("<missing>").tolist() == \
+            expected.fillna("<missing>").tolist()
+
+
+def test_compiled_rules_fall_back_for_invalid_expressions():
+    """Test that rules that cannot be vectorized still report per-row errors."""
+    rules = [TransformationRule(output_field="bad", expression="missing_field + 1")]
+    df = pd.DataFrame({"field1": ["A", "B"]})
+    
+    output = compile_rules(rules).evaluate(df)
+    assert all(str(value).startswith("Error:") for value in output["bad"])
+
+
+def test_expressions_are_validated_and_evaluated_safely():
+    """Test that expressions are whitelisted and values are never spliced into code."""
+    expression = validate_expression("field1 + max(field2, 3) * -2", fields=["field1", "field2"])
+    assert expression.fields == {"field1", "field2"}
+    assert expression.evaluate_row({"field1": 1, "field2": 5}) == -9
+    assert parse_expression("field1 + field2", {"field1": "O'Brien", "field2": "'s"}) == "O'Brien's"
+    
+    for invalid in ["invalid expression", "__import__('os')", "field1.upper()", "field1 ** 2", "max", "lambda: 1"]:
+        with pytest.raises(ExpressionError):
+            parse(invalid)
+    with pytest.raises(ExpressionError, match="Unknown field"):
+        validate_expression("field1 + other", fields=["field1"])
+    
+    vectorized = parse("field1 + field2").evaluate(pd.DataFrame({"field1": ["a", "b"], "field2": ["c", None]}))
+    assert vectorized.iloc[0] == "ac"
+    assert pd.isna(vectorized.iloc[1])
+
+
+def test_compiled_rules_share_subexpressions_and_reference_outputs(monkeypatch):
+    """Test that repeated sub-expressions run once and rules can use other rules' outputs."""
+    calls = []
+    vector_max = expression_service._FUNCTIONS["max"]["vector"]
+    monkeypatch.setitem(
+        expression_service._FUNCTIONS["max"], "vector",
+        lambda *args: calls.append(args) or vector_max(*args)
+    )
+    rules = [
+        TransformationRule(output_field="total", expression="base * 2"),
+        TransformationRule(output_field="outfield4", expression="field3 * max(field5, refdata4)"),
+        TransformationRule(output_field="outfield5", expression="max(field5, refdata4)"),
+        TransformationRule(output_field="base", expression="outfield5 + 1"),
+        TransformationRule(output_field="field3", expression="field3 + 1"),
+    ]
+    df = pd.DataFrame({"field3": [1, 2], "field5": [10.0, 20.0], "refdata4": [5.0, 25.0]})
+    
+    compiled = compile_rules(rules)
+    output = compiled.evaluate(df)
+    
+    assert len(calls) == 1
+    assert compiled.fields == {"field3", "field5", "refdata4"}
+    assert list(output.columns) == ["total", "outfield4", "outfield5", "base", "field3"]
+    # outfield4 reads the "field3" rule's output; that rule reads the input column
+    assert output["outfield4"].tolist() == [20.0, 75.0]
+    assert output["base"].tolist() == [11.0, 26.0]
+    assert output["total"].tolist() == [22.0, 52.0]
+    assert output["field3"].tolist() == [2, 3]
+    
+    with pytest.raises(ValueError, match="cycle: a -> b -> a"):
+        compile_rules([
+            TransformationRule(output_field="a", expression="b + 1"),
+            TransformationRule(output_field="b", expression="a + 1"),
+        ])
+
+
+def test_rule_registry_caches_until_file_changes(tmp_path, monkeypatch):
+    """Test that rule sets are parsed once and reloaded when the file changes."""
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        "v9:\n"
+        "  rules: [{output_field: a, expression: field1}]\n"
+        "  updated_at: '2024-01-01T00:00:00'\n"
+        "v10:\n"
+        "  rules: [{output_field: b, expression: field2}]\n"
+        "  updated_at: '2024-02-01T00:00:00'\n"
+    )
+    monkeypatch.setattr(settings, "RULES_FILE", str(rules_file))
+    rule_registry.invalidate()
+    
+    # "latest" follows updated_at, not the string order of the versions
+    latest = get_rule_set()
+    assert latest.version == "v10"
+    assert get_rule_set("v10") is latest
+    assert get_compiled_rule_set("v10") is get_compiled_rule_set()
+    
+    update_rule_set(TransformationRuleSet(
+        rules=[TransformationRule(output_field="c", expression="field3")],
+        version="v9"
+    ))
+    assert get_rule_set().version == "v9"
+    assert get_compiled_rule_set("v9").output_fields == ["c"]
+    
+    content = rules_file.read_text().replace("output_field: b", "output_field: d")
+    rules_file.write_text(content)
+    os.utime(rules_file, ns=(0, os.stat(rules_file).st_mtime_ns + 1))
+    assert get_rule_set("v10").rules[0].output_field == "d"
+    
+    rule_registry.invalidate()
@@ -1,11 +1,23 @@
+import asyncio
+import multiprocessing
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 import pytest
+import yaml
 from fastapi.testclient import TestClient
 
 from app.core.config import settings
-from app.models.report import ScheduleType
+from app.models.report import (FileFormat, MisfirePolicy, ReportGenerationRequest, ReportMetadata, ReportStatus,
+                               Schedule, ScheduleType)
+from app.services import scheduler_service
+from app.services.cluster_service import ClusterCoordinator
+from app.services.coordination_service import SCHEDULER_LEASE, coordination_store
+from app.services.metadata_service import report_store
+from app.services.schedule_service import (_parse_cron, compute_next_run, create_schedule, delete_schedule,
+                                           due_runs, get_schedule, record_run, schedule_store,
+                                           to_local_naive, update_schedule)
+from app.services.scheduler_service import ReportScheduler
 from tests.test_auth import get_token_headers
 
 
@@ -93,3 +105,422 @@ def test_get_nonexistent_schedule(test_app: TestClient):
     response = test_app.get("/api/v1/schedules/nonexistent", headers=headers)
     assert response.status_code == 404
     assert "Schedule not found" in response.json()["detail"]
+
+
+def test_run_all_needs_room_for_catch_up_runs(test_app: TestClient, test_schedule_file):
+    """Test that run_all is rejected when max_concurrent_runs would skip its catch-up runs."""
+    headers = get_token_headers(test_app)
+    request = {"name": "Catch up", "schedule_type": "interval", "expression": "3600", "misfire_policy": "run_all"}
+    
+    response = test_app.post("/api/v1/schedules", params=request, headers=headers)
+    assert response.status_code == 400
+    assert "max_concurrent_runs" in response.json()["detail"]
+    
+    response = test_app.post("/api/v1/schedules", params={**request, "max_concurrent_runs": 2}, headers=headers)
+    assert response.status_code == 200
+    schedule_id = response.json()["id"]
+    
+    response = test_app.put(f"/api/v1/schedules/{schedule_id}", params={"max_concurrent_runs": 1}, headers=headers)
+    assert response.status_code == 400
+    assert get_schedule(schedule_id).max_concurrent_runs == 2
+    assert test_app.delete(f"/api/v1/schedules/{schedule_id}", headers=headers).status_code == 200
+
+
+def test_due_runs_apply_misfire_policies(monkeypatch):
+    """Test on-time runs, catch-up of missed runs and normalised datetimes."""
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    schedule = Schedule(
+        id="s",
+        name="every ten seconds",
+        schedule_type=ScheduleType.INTERVAL,
+        expression="10",
+        misfire_grace_seconds=5
+    )
+    
+    assert due_runs(schedule, now - timedelta(seconds=2), now) == ([now - timedelta(seconds=2)], now + timedelta(seconds=8))
+    
+    due = now - timedelta(seconds=35)
+    missed = [due + timedelta(seconds=seconds) for seconds in (0, 10, 20, 30)]
+    for policy, expected in ((MisfirePolicy.RUN_ALL, missed), (MisfirePolicy.RUN_ONCE, missed[-1:]), (MisfirePolicy.SKIP, [])):
+        schedule.misfire_policy = policy
+        assert due_runs(schedule, due, now) == (expected, due + timedelta(seconds=40))
+    
+    monkeypatch.setattr(settings, "SCHEDULER_MAX_CATCH_UP_RUNS", 2)
+    schedule.misfire_policy = MisfirePolicy.RUN_ALL
+    assert due_runs(schedule, due, now)[0] == missed[-2:]
+    
+    cron = schedule.model_copy(update={"schedule_type": ScheduleType.CRON, "expression": "0 * * * *"})
+    assert due_runs(cron, now - timedelta(hours=3), now) == (
+        [now - timedelta(hours=1), now], now + timedelta(hours=1)
+    )
+    
+    one_time = Schedule(id="o", name="once", schedule_type=ScheduleType.ONE_TIME, expression="2026-01-01T10:00:00+00:00")
+    assert compute_next_run(one_time, now) == to_local_naive(datetime(2026, 1, 1, 10, tzinfo=timezone.utc))
+    assert compute_next_run(one_time, now).tzinfo is None
+    assert due_runs(one_time, now - timedelta(hours=2), now)[1] is None
+
+
+def test_scheduler_fires_due_schedules_with_concurrency_limit(tmp_path, monkeypatch):
+    """Test that the scheduler submits due reports and respects max_concurrent_runs."""
+    monkeypatch.setattr(settings, "SCHEDULES_FILE", str(tmp_path / "schedules.yaml"))
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    for name, content in (
+        ("input_scheduled.csv", "refkey1,refkey2,field1\nA,1,x\n"),
+        ("reference_scheduled.csv", "refkey1,refkey2,refdata1\nA,1,y\n"),
+    ):
+        with open(os.path.join(settings.UPLOAD_DIR, name), "w") as f:
+            f.write(content)
+    
+    class RecordingQueue:
+        def __init__(self):
+            self.submitted = []
+        
+        async def submit(self, report_metadata):
+            report_store.save(report_metadata)
+            self.submitted.append(report_metadata)
+            return report_metadata
+    
+    request = ReportGenerationRequest(
+        input_file="input_scheduled.csv",
+        reference_file="reference_scheduled.csv",
+        output_format=FileFormat.JSON
+    )
+    schedule = create_schedule("fast", ScheduleType.INTERVAL, "1", request, created_by="user")
+    assert isinstance(schedule.next_run, datetime)
+    queue = RecordingQueue()
+    
+    async def scenario():
+        scheduler = ReportScheduler(queue)
+        await scheduler.start()
+        try:
+            # The first report never finishes, so later runs are skipped
+            await asyncio.sleep(2.5)
+            assert len(queue.submitted) == 1
+            
+            finished = queue.submitted[0].model_copy(update={"status": ReportStatus.COMPLETED})
+            report_store.save(finished)
+            await asyncio.sleep(1.2)
+            assert len(queue.submitted) == 2
+        finally:
+            await scheduler.shutdown()
+    
+    asyncio.run(scenario())
+    stored = get_schedule(schedule.id)
+    assert stored.last_report_id == queue.submitted[-1].id
+    assert stored.last_run is not None and stored.next_run > stored.last_run
+    assert queue.submitted[0].created_by == "user"
+    assert delete_schedule(schedule.id)
+
+
+def test_schedule_store_imports_legacy_yaml_and_round_trips(test_app: TestClient, tmp_path, monkeypatch):
+    """Test that legacy YAML schedules are imported once and can be exported and re-imported."""
+    legacy_file = tmp_path / "schedules.yaml"
+    legacy_file.write_text(
+        "legacy-nightly:\n"
+        "  name: Nightly\n"
+        "  schedule_type: cron\n"
+        "  expression: 0 2 * * *\n"
+        "  enabled: true\n"
+        "  created_at: '2025-01-01T00:00:00'\n"
+        "  updated_at: '2025-01-01T00:00:00'\n"
+        "  report_request:\n"
+        "    output_format: json\n"
+    )
+    monkeypatch.setattr(settings, "SCHEDULES_FILE", str(legacy_file))
+    
+    schedule = get_schedule("legacy-nightly")
+    assert schedule.name == "Nightly"
+    assert schedule.report_request.output_format == FileFormat.JSON
+    assert schedule.next_run is not None
+    
+    # Row-level updates and deletes; a deleted schedule is not imported again
+    assert update_schedule("legacy-nightly", name="Nightly v2").name == "Nightly v2"
+    assert delete_schedule("legacy-nightly")
+    schedule_store._imported.clear()
+    assert get_schedule("legacy-nightly") is None
+    
+    headers = get_token_headers(test_app)
+    schedule = create_schedule("Exported", ScheduleType.INTERVAL, "60", ReportGenerationRequest())
+    response = test_app.get("/api/v1/schedules/export", headers=headers)
+    assert response.status_code == 200
+    exported = yaml.safe_load(response.text)
+    assert exported[schedule.id]["name"] == "Exported"
+    
+    assert delete_schedule(schedule.id)
+    login = test_app.post("/api/v1/auth/login", data={"username": "admin", "password": "admin"})
+    admin_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    response = test_app.post("/api/v1/schedules/import", content=response.text, headers=admin_headers)
+    assert response.status_code == 200
+    assert get_schedule(schedule.id).name == "Exported"
+    
+    response = test_app.post("/api/v1/schedules/import", content="- not a mapping", headers=admin_headers)
+    assert response.status_code == 400
+    assert delete_schedule(schedule.id)
+
+
+def test_upcoming_runs_merge_schedules_and_reuse_parsed_cron(test_app: TestClient):
+    """Test the upcoming runs endpoint and that cron expressions are parsed once."""
+    headers = get_token_headers(test_app)
+    cron = create_schedule("Quarter hourly", ScheduleType.CRON, "*/15 * * * *", ReportGenerationRequest())
+    interval = create_schedule("Every ten minutes", ScheduleType.INTERVAL, "600", ReportGenerationRequest())
+    # Due long ago, so no other schedule's runs come before them
+    schedule_store.save(cron.model_copy(update={"next_run": datetime(2000, 1, 1, 0, 0)}))
+    schedule_store.save(interval.model_copy(update={"next_run": datetime(2000, 1, 1, 0, 5)}))
+    
+    hits = _parse_cron.cache_info().hits
+    response = test_app.get(
+        "/api/v1/schedules/upcoming",
+        params={"limit": 6, "until": "2000-01-01T00:30:00"},
+        headers=headers
+    )
+    assert response.status_code == 200
+    runs = [(run["name"], run["run_at"][11:16]) for run in response.json()]
+    assert runs == [
+        ("Quarter hourly", "00:00"),
+        ("Every ten minutes", "00:05"),
+        ("Quarter hourly", "00:15"),
+        ("Every ten minutes", "00:15"),
+        ("Every ten minutes", "00:25"),
+        ("Quarter hourly", "00:30"),
+    ]
+    assert _parse_cron.cache_info().hits > hits
+    
+    # An invalid expression is rejected and the schedule keeps running
+    response = test_app.put(f"/api/v1/schedules/{cron.id}", params={"expression": "not cron"}, headers=headers)
+    assert response.status_code == 400
+    schedule = get_schedule(cron.id)
+    assert schedule.enabled and schedule.expression == "*/15 * * * *"
+    
+    assert delete_schedule(cron.id)
+    assert delete_schedule(interval.id)
+
+
+def _contend(node, barrier, results):
+    """Act as one node: race for the scheduler lease and for the same firings."""
+    settings.NODE_ID = node
+    barrier.wait()
+    leader = coordination_store.acquire_lease(SCHEDULER_LEASE, node, 60)
+    due = datetime(2026, 1, 1)
+    fired = [
+        minute for minute in range(50)
+        if coordination_store.claim_firing("nightly", due + timedelta(minutes=minute), node, 60)
+    ]
+    results.put((node, leader, fired))
+
+
+def _crash_with_job(report_metadata):
+    """Claim a job and die without releasing it."""
+    coordination_store.claim_job(report_metadata, "crashed-node")
+    os._exit(1)
+
+
+def test_nodes_elect_one_leader_and_requeue_jobs_of_crashed_nodes(tmp_path, monkeypatch):
+    """Test leader election, firing claims and job re-queueing across processes."""
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'cluster.db'}")
+    monkeypatch.setattr(settings, "COORDINATION_ENABLED", True)
+    context = multiprocessing.get_context("fork")
+    
+    barrier = context.Barrier(4)
+    results = context.Queue()
+    processes = [context.Process(target=_contend, args=(f"node-{i}", barrier, results)) for i in range(4)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join()
+    
+    leaders = [node for node, leader, _ in outcomes if leader]
+    assert len(leaders) == 1
+    assert coordination_store.lease_holder(SCHEDULER_LEASE) == leaders[0]
+    fired = sorted(minute for _, _, minutes in outcomes for minute in minutes)
+    assert fired == list(range(50))
+    
+    # A job claimed by a process that died is re-queued once its claim is stale
+    monkeypatch.setattr(settings, "JOB_CLAIM_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "NODE_ID", "survivor")
+    coordination_store.release_lease(SCHEDULER_LEASE, leaders[0])
+    
+    class RecordingQueue:
+        def __init__(self):
+            self.submitted = []
+        
+        async def submit(self, report_metadata):
+            coordination_store.claim_job(report_metadata, "survivor")
+            self.submitted.append(report_metadata)
+            return report_metadata
+    
+    report_metadata = ReportMetadata(
+        id="orphaned-report",
+        status=ReportStatus.PENDING,
+        start_time=datetime.now(),
+        input_file="input.csv",
+        reference_file="reference.csv",
+        output_file="report.csv",
+        output_format=FileFormat.CSV,
+        rule_set_id="default",
+        created_by="user"
+    )
+    crashed = context.Process(target=_crash_with_job, args=(report_metadata,))
+    crashed.start()
+    crashed.join()
+    
+    queue = RecordingQueue()
+    coordinator = ClusterCoordinator(queue, ReportScheduler(queue))
+    
+    async def scenario():
+        await coordinator.heartbeat()
+        assert coordinator.scheduler.leader
+        assert queue.submitted == []
+        await asyncio.sleep(0.3)
+        await coordinator.heartbeat()
+        assert [report.id for report in queue.submitted] == ["orphaned-report"]
+        
+        # The survivor keeps its claim alive; once it stops, the job has used its attempts
+        await coordinator.heartbeat()
+        assert len(queue.submitted) == 1
+        monkeypatch.setattr(settings, "NODE_ID", "another-node")
+        await asyncio.sleep(0.3)
+        coordination_store.release_lease(SCHEDULER_LEASE, "survivor")
+        await coordinator.heartbeat()
+        assert len(queue.submitted) == 1
+    
+    asyncio.run(scenario())
+    report_store.flush()
+    failed = report_store.get("orphaned-report")
+    assert failed.status == ReportStatus.FAILED
+    assert "abandoned" in failed.error_message
+    assert coordination_store.stale_jobs(0) == []
+
+
+def test_firing_claimed_by_a_crashed_node_is_taken_over(tmp_path, monkeypatch):
+    """Test that a schedule whose firing another node claimed keeps firing once the claim expires."""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'cluster.db'}")
+    monkeypatch.setattr(settings, "SCHEDULES_FILE", str(tmp_path / "schedules.yaml"))
+    monkeypatch.setattr(settings, "COORDINATION_ENABLED", True)
+    monkeypatch.setattr(settings, "LEADER_LEASE_SECONDS", 0.3)
+    os.makedirs(settings.UPLOAD_DIR)
+    for name in ("input_claimed.csv", "reference_claimed.csv"):
+        with open(os.path.join(settings.UPLOAD_DIR, name), "w") as f:
+            f.write("refkey1,refkey2,field1\nA,1,x\n")
+    
+    class RecordingQueue:
+        def __init__(self):
+            self.submitted = []
+        
+        async def submit(self, report_metadata):
+            self.submitted.append(report_metadata)
+            return report_metadata
+    
+    request = ReportGenerationRequest(input_file="input_claimed.csv", reference_file="reference_claimed.csv")
+    schedule = create_schedule("claimed", ScheduleType.CRON, "0 0 * * *", request)
+    due = datetime.now() - timedelta(seconds=1)
+    schedule_store.save(schedule.model_copy(update={"next_run": due}))
+    # A node claimed the firing and died before recording the run
+    assert coordination_store.claim_firing(schedule.id, due, "crashed-node", 60)
+    queue = RecordingQueue()
+    
+    async def scenario():
+        scheduler = ReportScheduler(queue)
+        await scheduler.start()
+        try:
+            await asyncio.sleep(0.1)
+            assert queue.submitted == []
+            await asyncio.sleep(0.5)
+            assert len(queue.submitted) == 1
+        finally:
+            await scheduler.shutdown()
+    
+    asyncio.run(scenario())
+    stored = get_schedule(schedule.id)
+    assert stored.last_report_id == queue.submitted[0].id
+    assert stored.next_run > due
+
+
+def test_leader_reloads_schedules_only_when_they_change(tmp_path, monkeypatch):
+    """Test that heartbeats reload the schedules only on taking the lead or after a change."""
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'cluster.db'}")
+    monkeypatch.setattr(settings, "SCHEDULES_FILE", str(tmp_path / "schedules.yaml"))
+    schedule = create_schedule("nightly", ScheduleType.CRON, "0 0 * * *", ReportGenerationRequest())
+    loads = []
+    monkeypatch.setattr(scheduler_service, "get_schedules", lambda: loads.append(1) or schedule_store.list())
+    
+    async def scenario():
+        scheduler = ReportScheduler(None)
+        await scheduler.start()
+        try:
+            await scheduler.set_leader(True)
+            assert len(loads) == 1
+            
+            # Recording a run is known to the leader already; other changes are not
+            record_run(schedule.id, datetime.now(), schedule.next_run, "report")
+            await scheduler.set_leader(True)
+            assert len(loads) == 1
+            update_schedule(schedule.id, name="renamed")
+            await scheduler.set_leader(True)
+            assert len(loads) == 2
+            
+            await scheduler.set_leader(False)
+            await scheduler.set_leader(True)
+            assert len(loads) == 3
+        finally:
+            await scheduler.shutdown()
+    
+    asyncio.run(scenario())
+
+
+def test_scheduler_batches_runs_sharing_input(tmp_path, monkeypatch):
+    """Test that schedules due together on the same input are submitted as one job."""
+    monkeypatch.setattr(settings, "SCHEDULES_FILE", str(tmp_path / "schedules.yaml"))
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    for name, content in (
+        ("input_nightly.csv", "refkey1,refkey2,field1\nN,1,nightly\n"),
+        ("reference_nightly.csv", "refkey1,refkey2,refdata1\nN,1,nightly\n"),
+    ):
+        with open(os.path.join(settings.UPLOAD_DIR, name), "w") as f:
+            f.write(content)
+    
+    class BatchRecordingQueue:
+        def __init__(self):
+            self.jobs = []
+        
+        async def submit(self, report_metadata):
+            return (await self.submit_batch([report_metadata]))[0]
+        
+        async def submit_batch(self, reports):
+            self.jobs.append(reports)
+            return reports
+    
+    due = datetime.now() - timedelta(seconds=1)
+    schedules = []
+    for output_format in (FileFormat.CSV, FileFormat.JSON, FileFormat.EXCEL):
+        request = ReportGenerationRequest(
+            input_file="input_nightly.csv",
+            reference_file="reference_nightly.csv",
+            output_format=output_format,
+            incremental=output_format == FileFormat.EXCEL
+        )
+        schedule = create_schedule(f"nightly {output_format.value}", ScheduleType.CRON, "0 0 * * *", request)
+        schedule_store.save(schedule.model_copy(update={"next_run": due}))
+        schedules.append(schedule)
+    queue = BatchRecordingQueue()
+    
+    async def scenario():
+        scheduler = ReportScheduler(queue)
+        await scheduler.start()
+        try:
+            await asyncio.sleep(0.5)
+        finally:
+            await scheduler.shutdown()
+    
+    asyncio.run(scenario())
+    # The incremental report resumes its own output, so it runs alone
+    assert sorted(sorted(report.output_format.value for report in job) for job in queue.jobs) == [
+        ["csv", "json"], ["xlsx"]
+    ]
+    reports = {report.output_format: report for job in queue.jobs for report in job}
+    for schedule in schedules:
+        stored = get_schedule(schedule.id)
+        assert stored.last_report_id == reports[stored.report_request.output_format].id
+        assert delete_schedule(schedule.id)